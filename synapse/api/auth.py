@@ -35,6 +35,7 @@ from synapse.api.errors import (
 from synapse.config.server import is_threepid_reserved
 from synapse.types import UserID
 from synapse.util.caches import CACHE_SIZE_FACTOR, register_cache
+from synapse.util.caches.expiringcache import ExpiringCache
 from synapse.util.caches.lrucache import LruCache
 from synapse.util.metrics import Measure
 
@@ -53,6 +54,10 @@ AuthEventTypes = (
 # guests always get this device id.
 GUEST_DEVICE_ID = "guest_device"
 
+# how long we remember that an access token was rejected, so that clients
+# hammering us with a bad token don't each cost a database lookup.
+INVALID_TOKEN_CACHE_EXPIRY_MS = 5 * 60 * 1000
+
 
 class _InvalidMacaroonException(Exception):
     pass
@@ -73,6 +78,13 @@ class Auth(object):
         self.token_cache = LruCache(CACHE_SIZE_FACTOR * 10000)
         register_cache("cache", "token_cache", self.token_cache)
 
+        self._invalid_token_cache = ExpiringCache(
+            cache_name="invalid_token_cache",
+            clock=self.clock,
+            max_len=int(CACHE_SIZE_FACTOR * 10000),
+            expiry_ms=INVALID_TOKEN_CACHE_EXPIRY_MS,
+        )
+
         self._account_validity = hs.config.account_validity
 
     @defer.inlineCallbacks
@@ -312,6 +324,9 @@ class Auth(object):
         """
 
         if rights == "access":
+            if token in self._invalid_token_cache:
+                raise InvalidClientTokenError()
+
             # first look in the database
             r = yield self._look_up_user_by_access_token(token)
             if r:
@@ -375,6 +390,10 @@ class Auth(object):
             else:
                 raise RuntimeError("Unknown rights setting %s", rights)
             return ret
+        except InvalidClientTokenError:
+            if rights == "access":
+                self._remember_invalid_token(token)
+            raise
         except (
             _InvalidMacaroonException,
             pymacaroons.exceptions.MacaroonException,
@@ -382,8 +401,23 @@ class Auth(object):
             ValueError,
         ) as e:
             logger.warning("Invalid macaroon in auth: %s %s", type(e), e)
+            if rights == "access":
+                self._remember_invalid_token(token)
             raise InvalidClientTokenError("Invalid macaroon passed.")
 
+    def _remember_invalid_token(self, token):
+        """Record that the given access token has been rejected, so that
+        further requests using it can be turned away without a database hit.
+
+        Args:
+            token (str): the rejected access token
+        """
+        self._invalid_token_cache[token] = True
+
+        # the store will have cached the miss as well: drop it so that a flood
+        # of junk tokens can't push genuine ones out of that cache.
+        self.store.get_user_by_access_token.invalidate((token,))
+
     def _parse_and_validate_macaroon(self, token, rights="access"):
         """Takes a macaroon and tries to parse and validate it. This is cached
         if and only if rights == access and there isn't an expiry.
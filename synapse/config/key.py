@@ -85,6 +85,12 @@ class KeyConfig(Config):
             config.get("key_refresh_interval", "1d")
         )
 
+        # whether to do signature and content hash checks in the reactor's
+        # threadpool rather than on the main thread
+        self.verify_signatures_in_threadpool = config.get(
+            "verify_signatures_in_threadpool", False
+        )
+
         # if neither trusted_key_servers nor perspectives are given, use the default.
         if "perspectives" not in config and "trusted_key_servers" not in config:
             key_servers = [{"server_name": "matrix.org"}]
@@ -171,6 +177,14 @@ class KeyConfig(Config):
         #
         #key_refresh_interval: 1d
 
+        # Whether to check the signatures and content hashes of events and
+        # requests received over federation in a background thread, rather than
+        # on the main thread. This stops large batches of events (for example
+        # when joining a big room) from blocking the handling of other requests,
+        # at the cost of some overhead for each batch. Defaults to 'false'.
+        #
+        #verify_signatures_in_threadpool: true
+
         # The trusted servers to download signing keys from.
         #
         # When we need to fetch a signing key, each server is tried in parallel.
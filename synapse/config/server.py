@@ -196,6 +196,27 @@ class ServerConfig(Config):
                 "Invalid range(s) provided in " "federation_ip_range_blacklist: %s" % e
             )
 
+        # the maximum number of idle connections we keep open to each remote
+        # server, and how long we keep them for.
+        self.federation_client_max_idle_connections_per_host = config.get(
+            "federation_client_max_idle_connections_per_host", 5
+        )
+        self.federation_client_idle_connection_timeout = self.parse_duration(
+            config.get("federation_client_idle_connection_timeout", "2m")
+        )
+
+        # how often we record that an access token has been used from a given
+        # IP address.
+        self.client_ip_last_seen_granularity = self.parse_duration(
+            config.get("client_ip_last_seen_granularity", "2m")
+        )
+
+        # whether to encode the responses of endpoints with large responses
+        # (e.g. /sync) on the reactor's threadpool
+        self.encode_large_responses_in_threadpool = config.get(
+            "encode_large_responses_in_threadpool", False
+        )
+
         if self.public_baseurl is not None:
             if self.public_baseurl[-1] != "/":
                 self.public_baseurl += "/"
@@ -489,6 +510,34 @@ class ServerConfig(Config):
           - 'fe80::/64'
           - 'fc00::/7'
 
+        # Outbound federation requests re-use HTTP connections to each remote
+        # server, so that busy destinations do not need a new TCP connection and
+        # TLS handshake for every request.
+        #
+        # 'federation_client_max_idle_connections_per_host' is the number of idle
+        # connections which will be kept open to each server; defaults to 5.
+        #
+        # 'federation_client_idle_connection_timeout' is how long an idle
+        # connection is kept open before it is closed; defaults to 2m.
+        #
+        #federation_client_max_idle_connections_per_host: 10
+        #federation_client_idle_connection_timeout: 5m
+
+        # Synapse records the last time each access token was used from each IP
+        # address, which is shown in the admin API and the devices list. To
+        # avoid a database write on every request, a new sighting is only
+        # recorded if the previous one is older than this. Busy servers may
+        # want to increase it to cut down on writes. Defaults to 2m.
+        #
+        #client_ip_last_seen_granularity: 10m
+
+        # Set to true to encode the JSON responses of endpoints which can return
+        # very large responses (/sync and /initialSync) on a thread, so that
+        # encoding them doesn't hold up other requests on the same process.
+        # Other responses are always encoded inline. Defaults to false.
+        #
+        #encode_large_responses_in_threadpool: true
+
         # List of ports that Synapse should listen on, their purpose and their
         # configuration.
         #
@@ -13,7 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from ._base import Config
+from ._base import Config, ConfigError
 
 
 class WorkerConfig(Config):
@@ -39,6 +39,18 @@ class WorkerConfig(Config):
         # The port on the main synapse for TCP replication
         self.worker_replication_port = config.get("worker_replication_port", None)
 
+        # How the main synapse should frame the replication commands it sends
+        # us: "text" (one command per line), or "compact"/"compressed" for
+        # length-prefixed batches of commands. See docs/tcp_replication.rst.
+        self.worker_replication_framing = config.get(
+            "worker_replication_framing", "text"
+        )
+        if self.worker_replication_framing not in ("text", "compact", "compressed"):
+            raise ConfigError(
+                "worker_replication_framing must be one of 'text', 'compact' or "
+                "'compressed'"
+            )
+
         # The port on the main synapse for HTTP replication endpoint
         self.worker_replication_http_port = config.get("worker_replication_http_port")
 
@@ -46,6 +58,16 @@ class WorkerConfig(Config):
 
         self.worker_main_http_uri = config.get("worker_main_http_uri", None)
 
+        # Pushers can be sharded by user across several pusher workers: this is
+        # the number of pusher workers, and which of them this one is.
+        self.worker_pusher_shards = config.get("worker_pusher_shards", 1)
+        self.worker_pusher_shard_index = config.get("worker_pusher_shard_index", 0)
+        if not 0 <= self.worker_pusher_shard_index < self.worker_pusher_shards:
+            raise ConfigError(
+                "worker_pusher_shard_index must be at least 0 and less than "
+                "worker_pusher_shards"
+            )
+
         # This option is really only here to support `--manhole` command line
         # argument.
         manhole = config.get("worker_manhole")
@@ -14,8 +14,10 @@
 # limitations under the License.
 
 import logging
+import time
 
 import idna
+from prometheus_client import Histogram
 from service_identity import VerificationError
 from service_identity.pyopenssl import verify_hostname, verify_ip_address
 from zope.interface import implementer
@@ -33,8 +35,18 @@ from twisted.internet.ssl import (
 from twisted.python.failure import Failure
 from twisted.web.iweb import IPolicyForHTTPS
 
+from synapse.util.caches.lrucache import LruCache
+
 logger = logging.getLogger(__name__)
 
+tls_handshake_timer = Histogram(
+    "synapse_http_federation_tls_handshake_seconds",
+    "Time taken for outbound federation TLS handshakes",
+)
+
+# the number of remote servers we remember a TLS session for
+TLS_SESSION_CACHE_SIZE = 1000
+
 
 _TLS_VERSION_MAP = {
     "1": TLSVersion.TLSv1_0,
@@ -85,6 +97,10 @@ class ClientTLSOptionsFactory(object):
 
     get_options decides whether we should do SSL certificate verification and
     constructs an SSLClientConnectionCreator factory accordingly.
+
+    The TLS session from the last connection to each server is kept, so that new
+    connections to the same server can resume it rather than doing a full
+    handshake.
     """
 
     def __init__(self, config):
@@ -114,6 +130,9 @@ class ClientTLSOptionsFactory(object):
         self._no_verify_ssl_context = self._no_verify_ssl.getContext()
         self._no_verify_ssl_context.set_info_callback(self._context_info_cb)
 
+        # (host, should_verify) -> OpenSSL.SSL.Session
+        self._tls_sessions = LruCache(TLS_SESSION_CACHE_SIZE)
+
     def get_options(self, host):
         # Check if certificate verification has been enabled
         should_verify = self._config.federation_verify_certificates
@@ -129,7 +148,9 @@ class ClientTLSOptionsFactory(object):
             self._verify_ssl_context if should_verify else self._no_verify_ssl_context
         )
 
-        return SSLClientConnectionCreator(host, ssl_context, should_verify)
+        return SSLClientConnectionCreator(
+            host, ssl_context, should_verify, self._tls_sessions
+        )
 
     @staticmethod
     def _context_info_cb(ssl_connection, where, ret):
@@ -160,16 +181,32 @@ class SSLClientConnectionCreator(object):
     """Creates openssl connection objects for client connections.
 
     Replaces twisted.internet.ssl.ClientTLSOptions
+
+    Args:
+        hostname (str): the server we are connecting to
+        ctx (OpenSSL.SSL.Context): the context to create the connection with
+        verify_certs (bool): whether to check the server's certificate
+        session_cache (LruCache|None): cache of TLS sessions to resume, keyed on
+            (hostname, verify_certs). None to disable session resumption.
     """
 
-    def __init__(self, hostname, ctx, verify_certs):
+    def __init__(self, hostname, ctx, verify_certs, session_cache=None):
         self._ctx = ctx
-        self._verifier = ConnectionVerifier(hostname, verify_certs)
+        self._session_cache = session_cache
+        self._session_key = (hostname, verify_certs)
+        self._verifier = ConnectionVerifier(
+            hostname, verify_certs, on_handshake_done=self._on_handshake_done
+        )
 
     def clientConnectionForTLS(self, tls_protocol):
         context = self._ctx
         connection = SSL.Connection(context, None)
 
+        if self._session_cache is not None:
+            session = self._session_cache.get(self._session_key)
+            if session is not None:
+                connection.set_session(session)
+
         # as per twisted.internet.ssl.ClientTLSOptions, we set the application
         # data to our TLSMemoryBIOProtocol...
         connection.set_app_data(tls_protocol)
@@ -180,6 +217,10 @@ class SSLClientConnectionCreator(object):
         setattr(tls_protocol, "_synapse_tls_verifier", self._verifier)
         return connection
 
+    def _on_handshake_done(self, ssl_connection):
+        if self._session_cache is not None:
+            self._session_cache[self._session_key] = ssl_connection.get_session()
+
 
 class ConnectionVerifier(object):
     """Set the SNI, and do cert verification
@@ -190,8 +231,10 @@ class ConnectionVerifier(object):
 
     # This code is based on twisted.internet.ssl.ClientTLSOptions.
 
-    def __init__(self, hostname, verify_certs):
+    def __init__(self, hostname, verify_certs, on_handshake_done=None):
         self._verify_certs = verify_certs
+        self._on_handshake_done = on_handshake_done
+        self._handshake_start = None
 
         if isIPAddress(hostname) or isIPv6Address(hostname):
             self._hostnameBytes = hostname.encode("ascii")
@@ -208,16 +251,27 @@ class ConnectionVerifier(object):
         self._hostnameASCII = self._hostnameBytes.decode("ascii")
 
     def verify_context_info_cb(self, ssl_connection, where):
-        if where & SSL.SSL_CB_HANDSHAKE_START and not self._is_ip_address:
-            ssl_connection.set_tlsext_host_name(self._hostnameBytes)
-
-        if where & SSL.SSL_CB_HANDSHAKE_DONE and self._verify_certs:
-            try:
-                if self._is_ip_address:
-                    verify_ip_address(ssl_connection, self._hostnameASCII)
-                else:
-                    verify_hostname(ssl_connection, self._hostnameASCII)
-            except VerificationError:
-                f = Failure()
-                tls_protocol = ssl_connection.get_app_data()
-                tls_protocol.failVerification(f)
+        if where & SSL.SSL_CB_HANDSHAKE_START:
+            self._handshake_start = time.time()
+            if not self._is_ip_address:
+                ssl_connection.set_tlsext_host_name(self._hostnameBytes)
+
+        if where & SSL.SSL_CB_HANDSHAKE_DONE:
+            if self._handshake_start is not None:
+                tls_handshake_timer.observe(time.time() - self._handshake_start)
+                self._handshake_start = None
+
+            if self._verify_certs:
+                try:
+                    if self._is_ip_address:
+                        verify_ip_address(ssl_connection, self._hostnameASCII)
+                    else:
+                        verify_hostname(ssl_connection, self._hostnameASCII)
+                except VerificationError:
+                    f = Failure()
+                    tls_protocol = ssl_connection.get_app_data()
+                    tls_protocol.failVerification(f)
+                    return
+
+            if self._on_handshake_done is not None:
+                self._on_handshake_done(ssl_connection)
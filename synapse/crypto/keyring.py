@@ -37,6 +37,7 @@ from signedjson.sign import (
 from unpaddedbase64 import decode_base64
 
 from twisted.internet import defer
+from twisted.python.failure import Failure
 
 from synapse.api.errors import (
     Codes,
@@ -47,6 +48,7 @@ from synapse.api.errors import (
 from synapse.logging.context import (
     LoggingContext,
     PreserveLoggingContext,
+    defer_to_thread,
     make_deferred_yieldable,
     preserve_fn,
     run_in_background,
@@ -54,6 +56,8 @@ from synapse.logging.context import (
 from synapse.storage.keys import FetchKeyResult
 from synapse.util import unwrapFirstError
 from synapse.util.async_helpers import yieldable_gather_results
+from synapse.util.caches import CACHE_SIZE_FACTOR, register_cache
+from synapse.util.caches.lrucache import LruCache
 from synapse.util.metrics import Measure
 from synapse.util.retryutils import NotRetryingDestination
 
@@ -103,6 +107,8 @@ class KeyLookupError(ValueError):
 class Keyring(object):
     def __init__(self, hs, key_fetchers=None):
         self.clock = hs.get_clock()
+        self._reactor = hs.get_reactor()
+        self._verify_in_threadpool = hs.config.verify_signatures_in_threadpool
 
         if key_fetchers is None:
             key_fetchers = (
@@ -112,6 +118,14 @@ class Keyring(object):
             )
         self._key_fetchers = key_fetchers
 
+        # in-memory cache of verify keys which we have already fetched, so that
+        # requests for well-known keys can be verified without going through the
+        # key lookup machinery (and the locks on each server) at all.
+        #
+        # (server_name, key_id) -> FetchKeyResult
+        self._verify_key_cache = LruCache(CACHE_SIZE_FACTOR * 10000)
+        register_cache("cache", "verify_key_cache", self._verify_key_cache)
+
         # map from server name to Deferred. Has an entry for each server with
         # an ongoing key download; the Deferred completes once the download
         # completes.
@@ -185,7 +199,11 @@ class Keyring(object):
         """
         # a list of VerifyJsonRequests which are awaiting a key lookup
         key_lookups = []
-        handle = preserve_fn(_handle_key_deferred)
+        handle = preserve_fn(self._handle_key_deferred)
+
+        # a list of (VerifyJsonRequest, VerifyKey, Deferred) tuples for requests
+        # which can be satisfied with keys we already have in memory
+        cached_verifications = []
 
         def process(verify_request):
             """Process an entry in the request list
@@ -210,6 +228,14 @@ class Keyring(object):
                 verify_request.minimum_valid_until_ts,
             )
 
+            # if we already have a suitable key in memory, there is no need for a
+            # key lookup: the request gets verified with the rest of the batch.
+            verify_key = self._get_cached_verify_key(verify_request)
+            if verify_key is not None:
+                d = defer.Deferred()
+                cached_verifications.append((verify_request, verify_key, d))
+                return d
+
             # add the key request to the queue, but don't start it off yet.
             key_lookups.append(verify_request)
 
@@ -222,11 +248,120 @@ class Keyring(object):
 
         results = [process(r) for r in verify_requests]
 
+        if cached_verifications:
+            self._verify_with_cached_keys(cached_verifications)
+
         if key_lookups:
             run_in_background(self._start_key_lookups, key_lookups)
 
         return results
 
+    def _verify_with_cached_keys(self, cached_verifications):
+        """Verifies a batch of json objects whose keys are already known
+
+        Args:
+            cached_verifications (list[tuple[VerifyJsonRequest, VerifyKey, Deferred]]):
+                the requests to verify, the key to use for each, and a deferred
+                to resolve with the result.
+        """
+        if self._verify_in_threadpool:
+            run_in_background(
+                self._verify_with_cached_keys_in_thread, cached_verifications
+            )
+            return
+
+        with Measure(self.clock, "verify_json_with_cached_keys"):
+            failures = _verify_json_requests(
+                (verify_request, verify_key)
+                for verify_request, verify_key, _ in cached_verifications
+            )
+        _resolve_verifications(cached_verifications, failures)
+
+    @defer.inlineCallbacks
+    def _verify_with_cached_keys_in_thread(self, cached_verifications):
+        """Does the work of _verify_with_cached_keys in the reactor's threadpool
+
+        The deferreds are still resolved on the main thread.
+        """
+        try:
+            with Measure(self.clock, "verify_json_with_cached_keys"):
+                failures = yield defer_to_thread(
+                    self._reactor,
+                    _verify_json_requests,
+                    [
+                        (verify_request, verify_key)
+                        for verify_request, verify_key, _ in cached_verifications
+                    ],
+                )
+        except Exception:
+            failures = [Failure()] * len(cached_verifications)
+
+        _resolve_verifications(cached_verifications, failures)
+
+    def _get_cached_verify_key(self, verify_request):
+        """Looks for a key which can satisfy the request in the in-memory cache
+
+        Args:
+            verify_request (VerifyJsonRequest):
+
+        Returns:
+            nacl.signing.VerifyKey|None: the key, if one of the request's key_ids
+                is cached and valid until at least the minimum_valid_until_ts of
+                the request.
+        """
+        for key_id in verify_request.key_ids:
+            result = self._verify_key_cache.get((verify_request.server_name, key_id))
+            if (
+                result is not None
+                and result.valid_until_ts >= verify_request.minimum_valid_until_ts
+            ):
+                return result.verify_key
+        return None
+
+    def _add_to_verify_key_cache(self, server_name, key_id, fetch_key_result):
+        """Records a fetched key in the in-memory cache
+
+        If we already have a copy of the key which is valid for longer, that copy
+        is kept instead.
+
+        Args:
+            server_name (str):
+            key_id (str):
+            fetch_key_result (FetchKeyResult):
+        """
+        # old keys may be stored without a valid_until_ts; treat them as `0`.
+        valid_until_ts = fetch_key_result.valid_until_ts or 0
+        existing = self._verify_key_cache.get((server_name, key_id))
+        if existing is not None and existing.valid_until_ts >= valid_until_ts:
+            return
+
+        self._verify_key_cache[(server_name, key_id)] = FetchKeyResult(
+            verify_key=fetch_key_result.verify_key, valid_until_ts=valid_until_ts
+        )
+
+    @defer.inlineCallbacks
+    def _handle_key_deferred(self, verify_request):
+        """Waits for the key to become available, and then performs a verification
+
+        Args:
+            verify_request (VerifyJsonRequest):
+
+        Returns:
+            Deferred[None]
+
+        Raises:
+            SynapseError if there was a problem performing the verification
+        """
+        with PreserveLoggingContext():
+            _, key_id, verify_key = yield verify_request.key_ready
+
+        if self._verify_in_threadpool:
+            yield defer_to_thread(
+                self._reactor, _verify_json_with_key, verify_request, verify_key
+            )
+        else:
+            _verify_json_with_key(verify_request, verify_key)
+
     @defer.inlineCallbacks
     def _start_key_lookups(self, verify_requests):
         """Sets off the key fetches for each verify request
@@ -398,6 +533,11 @@ class Keyring(object):
 
         results = yield fetcher.get_keys(missing_keys)
 
+        for server_name, result_keys in results.items():
+            for key_id, fetch_key_result in result_keys.items():
+                if fetch_key_result:
+                    self._add_to_verify_key_cache(server_name, key_id, fetch_key_result)
+
         completed = list()
         for verify_request in remaining_requests:
             server_name = verify_request.server_name
@@ -846,23 +986,58 @@ class ServerKeyFetcher(BaseV2KeyFetcher):
         return keys
 
 
-@defer.inlineCallbacks
-def _handle_key_deferred(verify_request):
-    """Waits for the key to become available, and then performs a verification
+def _verify_json_requests(verifications):
+    """Checks the signatures on a batch of json objects
+
+    This does not touch any deferreds, so is safe to call from outside the
+    reactor thread.
 
     Args:
-        verify_request (VerifyJsonRequest):
+        verifications (iterable[tuple[VerifyJsonRequest, VerifyKey]]): the requests
+            to check, and the key to check each one with.
 
     Returns:
-        Deferred[None]
+        list[Failure|None]: for each request, None if the signature is valid,
+            otherwise a Failure wrapping the SynapseError.
+    """
+    failures = []
+    for verify_request, verify_key in verifications:
+        try:
+            _verify_json_with_key(verify_request, verify_key)
+        except SynapseError:
+            failures.append(Failure())
+        else:
+            failures.append(None)
+    return failures
 
-    Raises:
-        SynapseError if there was a problem performing the verification
+
+def _resolve_verifications(verifications, failures):
+    """Resolves the deferreds for a batch of verifications
+
+    Args:
+        verifications (list[tuple[VerifyJsonRequest, VerifyKey, Deferred]]):
+        failures (list[Failure|None]): the result of each verification, as
+            returned by _verify_json_requests.
     """
-    server_name = verify_request.server_name
     with PreserveLoggingContext():
-        _, key_id, verify_key = yield verify_request.key_ready
+        for (_, _, d), failure in zip(verifications, failures):
+            if failure is None:
+                d.callback(None)
+            else:
+                d.errback(failure)
 
+
+def _verify_json_with_key(verify_request, verify_key):
+    """Checks the signature on the json object in a verify request
+
+    Args:
+        verify_request (VerifyJsonRequest):
+        verify_key (nacl.signing.VerifyKey): key to check the signature with
+
+    Raises:
+        SynapseError if the signature is not valid
+    """
+    server_name = verify_request.server_name
     json_object = verify_request.json_object
 
     try:
@@ -19,11 +19,12 @@ from distutils.util import strtobool
 
 import six
 
+from canonicaljson import json
 from unpaddedbase64 import encode_base64
 
 from synapse.api.errors import UnsupportedRoomVersionError
 from synapse.api.room_versions import KNOWN_ROOM_VERSIONS, EventFormatVersions
-from synapse.util.caches import intern_dict
+from synapse.util.caches import intern_dict, intern_string
 from synapse.util.frozenutils import freeze
 
 # Whether we should use frozen_dict in FrozenEvent. Using frozen_dicts prevents
@@ -141,22 +142,182 @@ def _event_dict_property(key):
     return property(getter, setter, delete)
 
 
+def _intern_event_refs(refs):
+    """Interns the event IDs in a list of `prev_events` or `auth_events`, and
+    returns them as a tuple, which is smaller than a list.
+
+    Args:
+        refs (list): either a list of event IDs, or (for V1 events) a list of
+            [event_id, hashes] pairs.
+
+    Returns:
+        tuple
+    """
+    # We haven't necessarily validated the event yet, so leave anything
+    # unexpected alone.
+    if not isinstance(refs, (list, tuple)):
+        return refs
+
+    result = []
+    for ref in refs:
+        if isinstance(ref, six.string_types):
+            ref = intern_string(ref)
+        elif (
+            isinstance(ref, (list, tuple))
+            and ref
+            and isinstance(ref[0], six.string_types)
+        ):
+            ref = (intern_string(ref[0]),) + tuple(ref[1:])
+        result.append(ref)
+
+    return tuple(result)
+
+
+def _compact_event_dict(event_dict):
+    """Interns the well known keys and values of an event dict, to reduce the
+    memory used by cached events.
+    """
+    # We intern these strings because they turn up a lot (especially when
+    # caching).
+    event_dict = intern_dict(event_dict)
+
+    for key in ("prev_events", "auth_events"):
+        if key in event_dict:
+            event_dict[key] = _intern_event_refs(event_dict[key])
+
+    return event_dict
+
+
+# The attributes which events created by `EventBase.from_json` only set once
+# their JSON has been decoded.
+_LAZY_ATTRIBUTES = frozenset(
+    ("_event_dict", "signatures", "unsigned", "type", "state_key")
+)
+
+
 class EventBase(object):
-    def __init__(
-        self,
-        event_dict,
-        signatures={},
-        unsigned={},
+    # We hold a lot of events in memory (e.g. in the event cache), so we use
+    # __slots__ to avoid every one of them carrying a __dict__.
+    __slots__ = [
+        "signatures",
+        "unsigned",
+        "rejected_reason",
+        "_event_dict",
+        "internal_metadata",
+        "type",
+        "state_key",
+        "_json",
+        "_membership",
+        "_is_state",
+    ]
+
+    def __init__(self, event_dict, internal_metadata_dict={}, rejected_reason=None):
+        self.rejected_reason = rejected_reason
+        self.internal_metadata = _EventInternalMetadata(internal_metadata_dict)
+        self._json = None
+        self._membership = None
+
+        self._set_event_dict(event_dict)
+
+    @classmethod
+    def from_json(
+        cls,
+        event_json,
+        event_id,
         internal_metadata_dict={},
         rejected_reason=None,
+        type=None,
+        state_key=None,
+        membership=None,
     ):
-        self.signatures = signatures
-        self.unsigned = unsigned
-        self.rejected_reason = rejected_reason
+        """Creates an event from its JSON encoding, which is only decoded once
+        we need a field that wasn't passed in.
+
+        Events are often fetched just to check their type, state key or
+        membership (e.g. when working out who is in a room), so this saves
+        decoding the rest of the event and keeps the cached event small.
+
+        Args:
+            event_json (str): the JSON encoding of the event, as returned by
+                `get_pdu_json`.
+            event_id (str)
+            internal_metadata_dict (dict)
+            rejected_reason (str|None)
+            type (str|None): the type of the event, if known.
+            state_key (str|None): the state key of the event, or None if it
+                is not a state event.
+            membership (str|None): the membership of the event, if known to
+                be a membership event.
+
+        Returns:
+            EventBase
+        """
+        event = cls.__new__(cls)
+        event.rejected_reason = rejected_reason
+        event.internal_metadata = _EventInternalMetadata(internal_metadata_dict)
+        event._json = event_json
+        event._membership = membership
 
-        self._event_dict = event_dict
+        event._set_event_id(event_id)
+        if type is not None:
+            event.type = type
+        if state_key is not None:
+            event.state_key = state_key
 
-        self.internal_metadata = _EventInternalMetadata(internal_metadata_dict)
+        # so that is_state() doesn't need to decode the JSON.
+        event._is_state = state_key is not None
+
+        return event
+
+    def _set_event_id(self, event_id):
+        raise NotImplementedError()
+
+    def _set_event_dict(self, event_dict):
+        """Sets the fields of this event from its dict form.
+
+        Args:
+            event_dict (dict)
+
+        Returns:
+            dict: the event dict, less the signatures and unsigned data
+        """
+        event_dict = dict(event_dict)
+
+        # Signatures is a dict of dicts, and this is faster than doing a
+        # copy.deepcopy
+        self.signatures = {
+            name: {sig_id: sig for sig_id, sig in sigs.items()}
+            for name, sigs in event_dict.pop("signatures", {}).items()
+        }
+
+        self.unsigned = dict(event_dict.pop("unsigned", {}))
+
+        event_dict = _compact_event_dict(event_dict)
+
+        self.type = event_dict["type"]
+        if "state_key" in event_dict:
+            self.state_key = event_dict["state_key"]
+        self._is_state = event_dict.get("state_key") is not None
+
+        if USE_FROZEN_DICTS:
+            self._event_dict = freeze(event_dict)
+        else:
+            self._event_dict = event_dict
+
+        return event_dict
+
+    def __getattr__(self, name):
+        # This is only called for attributes which haven't been set, which for
+        # events created by `from_json` includes those we haven't decoded yet.
+        if name in _LAZY_ATTRIBUTES and self._json is not None:
+            # Only clear the JSON once it has been decoded, so that a failure
+            # doesn't leave us with neither.
+            event_dict = json.loads(self._json)
+            self._json = None
+            self._set_event_dict(event_dict)
+            return getattr(self, name)
+
+        raise AttributeError(name)
 
     auth_events = _event_dict_property("auth_events")
     depth = _event_dict_property("depth")
@@ -172,10 +333,12 @@ class EventBase(object):
 
     @property
     def membership(self):
+        if self._membership is not None:
+            return self._membership
         return self.content["membership"]
 
     def is_state(self):
-        return hasattr(self, "state_key") and self.state_key is not None
+        return self._is_state
 
     def get_dict(self):
         d = dict(self._event_dict)
@@ -237,41 +400,17 @@ class EventBase(object):
 
 
 class FrozenEvent(EventBase):
-    format_version = EventFormatVersions.V1  # All events of this type are V1
-
-    def __init__(self, event_dict, internal_metadata_dict={}, rejected_reason=None):
-        event_dict = dict(event_dict)
-
-        # Signatures is a dict of dicts, and this is faster than doing a
-        # copy.deepcopy
-        signatures = {
-            name: {sig_id: sig for sig_id, sig in sigs.items()}
-            for name, sigs in event_dict.pop("signatures", {}).items()
-        }
+    __slots__ = ["event_id"]
 
-        unsigned = dict(event_dict.pop("unsigned", {}))
-
-        # We intern these strings because they turn up a lot (especially when
-        # caching).
-        event_dict = intern_dict(event_dict)
+    format_version = EventFormatVersions.V1  # All events of this type are V1
 
-        if USE_FROZEN_DICTS:
-            frozen_dict = freeze(event_dict)
-        else:
-            frozen_dict = event_dict
+    def _set_event_id(self, event_id):
+        self.event_id = event_id
 
+    def _set_event_dict(self, event_dict):
+        event_dict = super(FrozenEvent, self)._set_event_dict(event_dict)
         self.event_id = event_dict["event_id"]
-        self.type = event_dict["type"]
-        if "state_key" in event_dict:
-            self.state_key = event_dict["state_key"]
-
-        super(FrozenEvent, self).__init__(
-            frozen_dict,
-            signatures=signatures,
-            unsigned=unsigned,
-            internal_metadata_dict=internal_metadata_dict,
-            rejected_reason=rejected_reason,
-        )
+        return event_dict
 
     def __str__(self):
         return self.__repr__()
@@ -285,44 +424,26 @@ class FrozenEvent(EventBase):
 
 
 class FrozenEventV2(EventBase):
+    __slots__ = ["_event_id"]
+
     format_version = EventFormatVersions.V2  # All events of this type are V2
 
     def __init__(self, event_dict, internal_metadata_dict={}, rejected_reason=None):
-        event_dict = dict(event_dict)
-
-        # Signatures is a dict of dicts, and this is faster than doing a
-        # copy.deepcopy
-        signatures = {
-            name: {sig_id: sig for sig_id, sig in sigs.items()}
-            for name, sigs in event_dict.pop("signatures", {}).items()
-        }
-
-        assert "event_id" not in event_dict
-
-        unsigned = dict(event_dict.pop("unsigned", {}))
-
-        # We intern these strings because they turn up a lot (especially when
-        # caching).
-        event_dict = intern_dict(event_dict)
-
-        if USE_FROZEN_DICTS:
-            frozen_dict = freeze(event_dict)
-        else:
-            frozen_dict = event_dict
-
         self._event_id = None
-        self.type = event_dict["type"]
-        if "state_key" in event_dict:
-            self.state_key = event_dict["state_key"]
 
         super(FrozenEventV2, self).__init__(
-            frozen_dict,
-            signatures=signatures,
-            unsigned=unsigned,
+            event_dict,
             internal_metadata_dict=internal_metadata_dict,
             rejected_reason=rejected_reason,
         )
 
+    def _set_event_id(self, event_id):
+        self._event_id = event_id
+
+    def _set_event_dict(self, event_dict):
+        assert "event_id" not in event_dict
+        return super(FrozenEventV2, self)._set_event_dict(event_dict)
+
     @property
     def event_id(self):
         # We have to import this here as otherwise we get an import loop which
@@ -341,7 +462,7 @@ class FrozenEventV2(EventBase):
         Returns:
             list[str]: The list of event IDs of this event's prev_events
         """
-        return self.prev_events
+        return list(self.prev_events)
 
     def auth_event_ids(self):
         """Returns the list of auth event IDs. The order matches the order
@@ -350,7 +471,7 @@ class FrozenEventV2(EventBase):
         Returns:
             list[str]: The list of event IDs of this event's auth_events
         """
-        return self.auth_events
+        return list(self.auth_events)
 
     def __str__(self):
         return self.__repr__()
@@ -367,6 +488,8 @@ class FrozenEventV2(EventBase):
 class FrozenEventV3(FrozenEventV2):
     """FrozenEventV3, which differs from FrozenEventV2 only in the event_id format"""
 
+    __slots__ = []
+
     format_version = EventFormatVersions.V3  # All events of this type are V3
 
     @property
@@ -15,14 +15,16 @@
 
 import re
 
-from six import string_types
+from six import iteritems, string_types
 
+from canonicaljson import encode_canonical_json, json
 from frozendict import frozendict
 
 from twisted.internet import defer
 
 from synapse.api.constants import EventTypes, RelationTypes
-from synapse.util.async_helpers import yieldable_gather_results
+from synapse.util.caches import get_cache_factor_for
+from synapse.util.caches.descriptors import Cache
 
 from . import EventBase
 
@@ -332,11 +334,71 @@ def serialize_event(
     return d
 
 
+# The top level keys of a serialized event which can differ between requests,
+# as they're from (or copied from) `unsigned`.
+_PER_REQUEST_KEYS = frozenset(
+    (
+        "unsigned",
+        "age",
+        "redacted_because",
+        "replaces_state",
+        "prev_content",
+        "invite_room_state",
+    )
+)
+
+# simplejson (which canonicaljson uses, other than on PyPy) lets us embed
+# already encoded JSON when encoding a response.
+_RawJSON = getattr(json, "RawJSON", None)
+
+
+class _SerializedEvent(dict):
+    """A serialized event, which also holds the cached JSON encoding of the
+    fields which are the same for every request.
+
+    To everything else this is just the serialized event. JSON encoders which
+    support simplejson's `for_json` (such as
+    `synapse.util.frozenutils.compact_json_encoder`) use the cached encoding
+    of any of those fields which haven't been replaced since. Their values
+    must not be changed in place.
+
+    Args:
+        serialized_event (dict): the serialized event
+        encoded_fields (dict[str, RawJSON]): the cached encoding of some of
+            its fields
+    """
+
+    __slots__ = ("_encoded_fields",)
+
+    def __init__(self, serialized_event, encoded_fields):
+        super(_SerializedEvent, self).__init__(serialized_event)
+
+        # map from field to the value it had when we were built, and its
+        # cached encoding
+        self._encoded_fields = {
+            k: (serialized_event[k], raw)
+            for k, raw in iteritems(encoded_fields)
+            if k in serialized_event
+        }
+
+    def for_json(self):
+        result = dict(self)
+        for k, (value, raw) in iteritems(self._encoded_fields):
+            if result.get(k) is value:
+                result[k] = raw
+        return result
+
+
 class EventClientSerializer(object):
     """Serializes events that are to be sent to clients.
 
     This is used for bundling extra information with any events to be sent to
     clients.
+
+    Events tend to be sent to lots of clients (e.g. everyone in a large room),
+    so we cache the encoded JSON of the parts of a serialized event that don't
+    change between requests, which then get spliced into each response when
+    it is encoded.
     """
 
     def __init__(self, hs):
@@ -345,6 +407,48 @@ class EventClientSerializer(object):
             hs.config.experimental_msc1849_support_enabled
         )
 
+        self._encoded_event_cache = None
+        if _RawJSON is not None:
+            self._encoded_event_cache = Cache(
+                "*encodedEventCache*",
+                max_entries=int(10000 * get_cache_factor_for("encodedEventCache")),
+                keylen=4,
+            )
+
+    def _serialize_event(self, event, time_now, **kwargs):
+        """Serializes an event, attaching the cached JSON encoding of the
+        fields which are the same for every request.
+
+        Args:
+            event (EventBase)
+            time_now (int): The current time in milliseconds
+            **kwargs: Arguments to pass to `serialize_event`
+
+        Returns:
+            dict
+        """
+        serialized_event = serialize_event(event, time_now, **kwargs)
+
+        if self._encoded_event_cache is None or kwargs.get("only_event_fields"):
+            return serialized_event
+
+        key = (
+            event.event_id,
+            event.internal_metadata.is_redacted(),
+            kwargs.get("as_client_event", True),
+            kwargs.get("event_format", format_event_for_client_v1),
+        )
+        encoded_fields = self._encoded_event_cache.get(key, None)
+        if encoded_fields is None:
+            encoded_fields = {
+                k: _RawJSON(encode_canonical_json(v).decode("utf-8"))
+                for k, v in iteritems(serialized_event)
+                if k not in _PER_REQUEST_KEYS
+            }
+            self._encoded_event_cache.prefill(key, encoded_fields)
+
+        return _SerializedEvent(serialized_event, encoded_fields)
+
     @defer.inlineCallbacks
     def serialize_event(self, event, time_now, bundle_aggregations=True, **kwargs):
         """Serializes a single event.
@@ -363,7 +467,7 @@ class EventClientSerializer(object):
             return event
 
         event_id = event.event_id
-        serialized_event = serialize_event(event, time_now, **kwargs)
+        serialized_event = self._serialize_event(event, time_now, **kwargs)
 
         # If MSC1849 is enabled then we need to look if there are any relations
         # we need to bundle in with the event.
@@ -376,49 +480,116 @@ class EventClientSerializer(object):
                 event_id, RelationTypes.REFERENCE, direction="f"
             )
 
-            if annotations.chunk:
-                r = serialized_event["unsigned"].setdefault("m.relations", {})
-                r[RelationTypes.ANNOTATION] = annotations.to_dict()
-
-            if references.chunk:
-                r = serialized_event["unsigned"].setdefault("m.relations", {})
-                r[RelationTypes.REFERENCE] = references.to_dict()
-
             edit = None
             if event.type == EventTypes.Message:
                 edit = yield self.store.get_applicable_edit(event_id)
 
-            if edit:
-                # If there is an edit replace the content, preserving existing
-                # relations.
-
-                relations = event.content.get("m.relates_to")
-                serialized_event["content"] = edit.content.get("m.new_content", {})
-                if relations:
-                    serialized_event["content"]["m.relates_to"] = relations
-                else:
-                    serialized_event["content"].pop("m.relates_to", None)
-
-                r = serialized_event["unsigned"].setdefault("m.relations", {})
-                r[RelationTypes.REPLACE] = {
-                    "event_id": edit.event_id,
-                    "origin_server_ts": edit.origin_server_ts,
-                    "sender": edit.sender,
-                }
+            self._bundle_aggregations(
+                event, serialized_event, annotations, references, edit
+            )
 
         return serialized_event
 
-    def serialize_events(self, events, time_now, **kwargs):
+    @defer.inlineCallbacks
+    def serialize_events(self, events, time_now, bundle_aggregations=True, **kwargs):
         """Serializes multiple events.
 
+        Any relations to bundle in are fetched for all the events at once.
+
         Args:
             event (iter[EventBase])
             time_now (int): The current time in milliseconds
+            bundle_aggregations (bool): Whether to bundle in related events
             **kwargs: Arguments to pass to `serialize_event`
 
         Returns:
             Deferred[list[dict]]: The list of serialized events
         """
-        return yieldable_gather_results(
-            self.serialize_event, events, time_now=time_now, **kwargs
+        events = list(events)
+
+        to_bundle = []
+        if self.experimental_msc1849_support_enabled and bundle_aggregations:
+            to_bundle = [
+                event
+                for event in events
+                if isinstance(event, EventBase)
+                and not event.internal_metadata.is_redacted()
+            ]
+
+        if not to_bundle:
+            return [
+                self._serialize_event(event, time_now, **kwargs)
+                if isinstance(event, EventBase)
+                else event
+                for event in events
+            ]
+
+        event_ids = [event.event_id for event in to_bundle]
+        annotations = yield self.store.get_aggregation_groups_for_events(event_ids)
+        references = yield self.store.get_relations_for_events(
+            event_ids, RelationTypes.REFERENCE, direction="f"
+        )
+        edits = yield self.store.get_applicable_edits(
+            [event.event_id for event in to_bundle if event.type == EventTypes.Message]
         )
+
+        results = []
+        for event in events:
+            if not isinstance(event, EventBase):
+                results.append(event)
+                continue
+
+            serialized_event = self._serialize_event(event, time_now, **kwargs)
+
+            event_id = event.event_id
+            if event_id in annotations:
+                self._bundle_aggregations(
+                    event,
+                    serialized_event,
+                    annotations[event_id],
+                    references[event_id],
+                    edits.get(event_id),
+                )
+
+            results.append(serialized_event)
+
+        return results
+
+    def _bundle_aggregations(
+        self, event, serialized_event, annotations, references, edit
+    ):
+        """Adds the given relations to a serialized event.
+
+        Args:
+            event (EventBase)
+            serialized_event (dict): The serialized form of `event`, which is
+                updated in place.
+            annotations (PaginationChunk): The annotation groups for the event
+            references (PaginationChunk): The references to the event
+            edit (EventBase|None): The most recent edit of the event, if any
+        """
+        if annotations.chunk:
+            r = serialized_event["unsigned"].setdefault("m.relations", {})
+            r[RelationTypes.ANNOTATION] = annotations.to_dict()
+
+        if references.chunk:
+            r = serialized_event["unsigned"].setdefault("m.relations", {})
+            r[RelationTypes.REFERENCE] = references.to_dict()
+
+        if edit:
+            # If there is an edit replace the content, preserving existing
+            # relations.
+
+            relations = event.content.get("m.relates_to")
+            serialized_event["content"] = edit.content.get("m.new_content", {})
+            if relations:
+                serialized_event["content"]["m.relates_to"] = relations
+            else:
+                serialized_event["content"].pop("m.relates_to", None)
+
+            r = serialized_event["unsigned"].setdefault("m.relations", {})
+            r[RelationTypes.REPLACE] = {
+                "event_id": edit.event_id,
+                "origin_server_ts": edit.origin_server_ts,
+                "sender": edit.sender,
+            }
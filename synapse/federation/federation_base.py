@@ -30,8 +30,10 @@ from synapse.http.servlet import assert_params_in_dict
 from synapse.logging.context import (
     LoggingContext,
     PreserveLoggingContext,
+    defer_to_thread,
     make_deferred_yieldable,
     preserve_fn,
+    run_in_background,
 )
 from synapse.types import get_domain_from_id
 from synapse.util import unwrapFirstError
@@ -48,6 +50,8 @@ class FederationBase(object):
         self.spam_checker = hs.get_spam_checker()
         self.store = hs.get_datastore()
         self._clock = hs.get_clock()
+        self._reactor = hs.get_reactor()
+        self._verify_in_threadpool = hs.config.verify_signatures_in_threadpool
 
     @defer.inlineCallbacks
     def _check_sigs_and_hash_and_fetch(
@@ -147,40 +151,11 @@ class FederationBase(object):
 
         def callback(_, pdu):
             with PreserveLoggingContext(ctx):
-                if not check_event_content_hash(pdu):
-                    # let's try to distinguish between failures because the event was
-                    # redacted (which are somewhat expected) vs actual ball-tampering
-                    # incidents.
-                    #
-                    # This is just a heuristic, so we just assume that if the keys are
-                    # about the same between the redacted and received events, then the
-                    # received event was probably a redacted copy (but we then use our
-                    # *actual* redacted copy to be on the safe side.)
-                    redacted_event = prune_event(pdu)
-                    if set(redacted_event.keys()) == set(pdu.keys()) and set(
-                        six.iterkeys(redacted_event.content)
-                    ) == set(six.iterkeys(pdu.content)):
-                        logger.info(
-                            "Event %s seems to have been redacted; using our redacted "
-                            "copy",
-                            pdu.event_id,
-                        )
-                    else:
-                        logger.warning(
-                            "Event %s content has been tampered, redacting",
-                            pdu.event_id,
-                        )
-                    return redacted_event
-
-                if self.spam_checker.check_event_for_spam(pdu):
-                    logger.warn(
-                        "Event contains spam, redacting %s: %s",
-                        pdu.event_id,
-                        pdu.get_pdu_json(),
-                    )
-                    return prune_event(pdu)
-
-                return pdu
+                if self._verify_in_threadpool:
+                    return run_in_background(self._check_hash_in_thread, pdu)
+                return self._handle_content_hash_result(
+                    pdu, check_event_content_hash(pdu)
+                )
 
         def errback(failure, pdu):
             failure.trap(SynapseError)
@@ -199,6 +174,60 @@ class FederationBase(object):
 
         return deferreds
 
+    @defer.inlineCallbacks
+    def _check_hash_in_thread(self, pdu):
+        """Checks the content hash of an event in the reactor's threadpool
+
+        Returns:
+            Deferred[FrozenEvent]: see _handle_content_hash_result
+        """
+        hash_ok = yield defer_to_thread(self._reactor, check_event_content_hash, pdu)
+        return self._handle_content_hash_result(pdu, hash_ok)
+
+    def _handle_content_hash_result(self, pdu, hash_ok):
+        """Applies the result of a content hash check to an event
+
+        Args:
+            pdu (FrozenEvent): the event which was checked
+            hash_ok (bool): whether the content hash matched
+
+        Returns:
+            FrozenEvent: the original event if the hash matched and it passes the
+                spam checker, otherwise a redacted copy.
+        """
+        if not hash_ok:
+            # let's try to distinguish between failures because the event was
+            # redacted (which are somewhat expected) vs actual ball-tampering
+            # incidents.
+            #
+            # This is just a heuristic, so we just assume that if the keys are
+            # about the same between the redacted and received events, then the
+            # received event was probably a redacted copy (but we then use our
+            # *actual* redacted copy to be on the safe side.)
+            redacted_event = prune_event(pdu)
+            if set(redacted_event.keys()) == set(pdu.keys()) and set(
+                six.iterkeys(redacted_event.content)
+            ) == set(six.iterkeys(pdu.content)):
+                logger.info(
+                    "Event %s seems to have been redacted; using our redacted copy",
+                    pdu.event_id,
+                )
+            else:
+                logger.warning(
+                    "Event %s content has been tampered, redacting", pdu.event_id
+                )
+            return redacted_event
+
+        if self.spam_checker.check_event_for_spam(pdu):
+            logger.warn(
+                "Event contains spam, redacting %s: %s",
+                pdu.event_id,
+                pdu.get_pdu_json(),
+            )
+            return prune_event(pdu)
+
+        return pdu
+
 
 class PduToCheckSig(
     namedtuple(
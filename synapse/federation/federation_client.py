@@ -362,21 +362,15 @@ class FederationClient(FederationBase):
             else:
                 raise e
 
-        result = yield self.transport_layer.get_room_state(
-            destination, room_id, event_id=event_id
-        )
-
         room_version = yield self.store.get_room_version(room_id)
         format_ver = room_version_to_event_format(room_version)
 
-        pdus = [
-            event_from_pdu_json(p, format_ver, outlier=True) for p in result["pdus"]
-        ]
+        result = yield self.transport_layer.get_room_state(
+            destination, room_id, event_id=event_id, event_format_version=format_ver
+        )
 
-        auth_chain = [
-            event_from_pdu_json(p, format_ver, outlier=True)
-            for p in result.get("auth_chain", [])
-        ]
+        pdus = result["pdus"]
+        auth_chain = result["auth_chain"]
 
         seen_events = yield self.store.get_events(
             [ev.event_id for ev in itertools.chain(pdus, auth_chain)]
@@ -663,24 +657,25 @@ class FederationClient(FederationBase):
         @defer.inlineCallbacks
         def send_request(destination):
             time_now = self._clock.time_msec()
-            _, content = yield self.transport_layer.send_join(
+            # the events are parsed as they are received, so that we don't have to
+            # hold the whole of a potentially huge response in memory.
+            content = yield self.transport_layer.send_join(
                 destination=destination,
                 room_id=pdu.room_id,
                 event_id=pdu.event_id,
                 content=pdu.get_pdu_json(time_now),
+                event_format_version=event_format_version,
             )
 
-            logger.debug("Got content: %s", content)
-
-            state = [
-                event_from_pdu_json(p, event_format_version, outlier=True)
-                for p in content.get("state", [])
-            ]
+            state = content["state"]
+            auth_chain = content["auth_chain"]
 
-            auth_chain = [
-                event_from_pdu_json(p, event_format_version, outlier=True)
-                for p in content.get("auth_chain", [])
-            ]
+            logger.debug(
+                "Got %i state events and %i auth events from %s",
+                len(state),
+                len(auth_chain),
+                destination,
+            )
 
             pdus = {p.event_id: p for p in itertools.chain(state, auth_chain)}
 
@@ -14,6 +14,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import logging
+from collections import OrderedDict
 
 import six
 from six import iteritems
@@ -46,6 +47,7 @@ from synapse.logging.context import nested_logging_context
 from synapse.logging.utils import log_function
 from synapse.replication.http.federation import (
     ReplicationFederationSendEduRestServlet,
+    ReplicationFederationSendEdusRestServlet,
     ReplicationGetQueryRestServlet,
 )
 from synapse.types import get_domain_from_id
@@ -256,8 +258,10 @@ class FederationServer(FederationBase):
         )
 
         if hasattr(transaction, "edus"):
-            for edu in (Edu(**x) for x in transaction.edus):
-                yield self.received_edu(origin, edu.edu_type, edu.content)
+            edus = [Edu(**x) for x in transaction.edus]
+            yield self.received_edus(
+                origin, [(edu.edu_type, edu.content) for edu in edus]
+            )
 
         response = {"pdus": pdu_results}
 
@@ -267,9 +271,15 @@ class FederationServer(FederationBase):
         return (200, response)
 
     @defer.inlineCallbacks
-    def received_edu(self, origin, edu_type, content):
-        received_edus_counter.inc()
-        yield self.registry.on_edu(edu_type, origin, content)
+    def received_edus(self, origin, edus):
+        """Handles the EDUs from an incoming transaction as a batch
+
+        Args:
+            origin (str): the server which sent the EDUs
+            edus (list[tuple[str, dict]]): (edu_type, content) for each EDU
+        """
+        received_edus_counter.inc(len(edus))
+        yield self.registry.on_edus(origin, edus)
 
     @defer.inlineCallbacks
     @log_function
@@ -815,6 +825,20 @@ class FederationHandlerRegistry(object):
         except Exception:
             logger.exception("Failed to handle edu %r", edu_type)
 
+    @defer.inlineCallbacks
+    def on_edus(self, origin, edus):
+        """Handles a batch of EDUs from the same server
+
+        EDUs of the same type are coalesced where possible (see coalesce_edus), so
+        that each handler is called as few times as possible.
+
+        Args:
+            origin (str): the server which sent the EDUs
+            edus (list[tuple[str, dict]]): (edu_type, content) for each EDU
+        """
+        for edu_type, content in coalesce_edus(edus):
+            yield self.on_edu(edu_type, origin, content)
+
     def on_query(self, query_type, args):
         handler = self.query_handlers.get(query_type)
         if not handler:
@@ -839,6 +863,7 @@ class ReplicationFederationHandlerRegistry(FederationHandlerRegistry):
 
         self._get_query_client = ReplicationGetQueryRestServlet.make_client(hs)
         self._send_edu = ReplicationFederationSendEduRestServlet.make_client(hs)
+        self._send_edus = ReplicationFederationSendEdusRestServlet.make_client(hs)
 
         super(ReplicationFederationHandlerRegistry, self).__init__()
 
@@ -856,6 +881,28 @@ class ReplicationFederationHandlerRegistry(FederationHandlerRegistry):
 
         return self._send_edu(edu_type=edu_type, origin=origin, content=content)
 
+    @defer.inlineCallbacks
+    def on_edus(self, origin, edus):
+        """Overrides FederationHandlerRegistry
+
+        Any EDUs which we don't have a handler for are sent to the master in a
+        single request.
+        """
+        to_send = []
+        for edu_type, content in coalesce_edus(edus):
+            if not self.config.use_presence and edu_type == "m.presence":
+                continue
+
+            if edu_type in self.edu_handlers:
+                yield super(ReplicationFederationHandlerRegistry, self).on_edu(
+                    edu_type, origin, content
+                )
+            else:
+                to_send.append((edu_type, content))
+
+        if to_send:
+            yield self._send_edus(origin=origin, edus=to_send)
+
     def on_query(self, query_type, args):
         """Overrides FederationHandlerRegistry
         """
@@ -864,3 +911,77 @@ class ReplicationFederationHandlerRegistry(FederationHandlerRegistry):
             return handler(args)
 
         return self._get_query_client(query_type=query_type, args=args)
+
+
+def coalesce_edus(edus):
+    """Groups a list of EDUs by type, merging EDUs of the same type where possible
+
+    The EDU types are returned in the order in which each type first appears, and
+    EDUs of a type which can't be merged keep their original order.
+
+    Args:
+        edus (list[tuple[str, dict]]): (edu_type, content) for each EDU
+
+    Returns:
+        list[tuple[str, dict]]: (edu_type, content) for each EDU to be handled
+    """
+    contents_by_type = OrderedDict()
+    for edu_type, content in edus:
+        contents_by_type.setdefault(edu_type, []).append(content)
+
+    results = []
+    for edu_type, contents in iteritems(contents_by_type):
+        merge = _EDU_MERGERS.get(edu_type)
+        if merge is not None and len(contents) > 1:
+            try:
+                contents = merge(contents)
+            except Exception as e:
+                # leave malformed EDUs for the handler to complain about
+                logger.info("Unable to merge %r EDUs: %r", edu_type, e)
+
+        results.extend((edu_type, content) for content in contents)
+
+    return results
+
+
+def _merge_presence_edus(contents):
+    """Merges m.presence EDUs into one, keeping only the latest update for each user
+    """
+    latest = OrderedDict()
+    for content in contents:
+        for push in content.get("push", []):
+            user_id = push.get("user_id")
+            latest.pop(user_id, None)
+            latest[user_id] = push
+    return [{"push": list(latest.values())}]
+
+
+def _merge_receipt_edus(contents):
+    """Merges m.receipt EDUs into one. Later receipts for the same user, room and
+    receipt type replace earlier ones.
+    """
+    merged = {}
+    for content in contents:
+        for room_id, room_receipts in iteritems(content):
+            merged_room = merged.setdefault(room_id, {})
+            for receipt_type, users in iteritems(room_receipts):
+                merged_room.setdefault(receipt_type, {}).update(users)
+    return [merged]
+
+
+def _merge_typing_edus(contents):
+    """Drops all but the latest m.typing EDU for each user in each room"""
+    latest = OrderedDict()
+    for content in contents:
+        key = (content["room_id"], content["user_id"])
+        latest.pop(key, None)
+        latest[key] = content
+    return list(latest.values())
+
+
+# map from EDU type to a function which merges a list of EDU contents of that type
+_EDU_MERGERS = {
+    "m.presence": _merge_presence_edus,
+    "m.receipt": _merge_receipt_edus,
+    "m.typing": _merge_typing_edus,
+}
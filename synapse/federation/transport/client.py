@@ -18,6 +18,8 @@ import logging
 
 from six.moves import urllib
 
+import ijson
+
 from twisted.internet import defer
 
 from synapse.api.constants import Membership
@@ -26,6 +28,8 @@ from synapse.api.urls import (
     FEDERATION_V1_PREFIX,
     FEDERATION_V2_PREFIX,
 )
+from synapse.federation.federation_base import event_from_pdu_json
+from synapse.http.matrixfederationclient import ByteParser
 from synapse.logging.utils import log_function
 
 logger = logging.getLogger(__name__)
@@ -39,7 +43,7 @@ class TransportLayerClient(object):
         self.client = hs.get_http_client()
 
     @log_function
-    def get_room_state(self, destination, room_id, event_id):
+    def get_room_state(self, destination, room_id, event_id, event_format_version):
         """ Requests all state for a given room from the given server at the
         given event.
 
@@ -48,9 +52,12 @@ class TransportLayerClient(object):
                 to get the state from.
             context (str): The name of the context we want the state of
             event_id (str): The event we want the context at.
+            event_format_version (int): The event format version of the room
 
         Returns:
-            Deferred: Results in a dict received from the remote homeserver.
+            Deferred[dict[str, list[FrozenEvent]]]: Results in a dict with keys
+                "pdus" and "auth_chain", each a list of events (marked as
+                outliers) which were parsed as the response was received.
         """
         logger.debug("get_room_state dest=%s, room=%s", destination, room_id)
 
@@ -60,6 +67,7 @@ class TransportLayerClient(object):
             path=path,
             args={"event_id": event_id},
             try_trailing_slash_on_400=True,
+            parser=EventListsParser(event_format_version, ("pdus", "auth_chain")),
         )
 
     @log_function
@@ -267,11 +275,32 @@ class TransportLayerClient(object):
 
     @defer.inlineCallbacks
     @log_function
-    def send_join(self, destination, room_id, event_id, content):
+    def send_join(self, destination, room_id, event_id, content, event_format_version):
+        """Sends a signed join event to a remote server
+
+        Args:
+            destination (str): the server to send the join to
+            room_id (str):
+            event_id (str):
+            content (dict): the join event, in federation format
+            event_format_version (int): The event format version of the room
+
+        Returns:
+            Deferred[dict[str, list[FrozenEvent]]]: Results in a dict with keys
+                "state" and "auth_chain", each a list of events (marked as
+                outliers) which were parsed as the response was received.
+        """
         path = _create_v1_path("/send_join/%s/%s", room_id, event_id)
 
+        # the v1 API returns a [code, body] pair, so the lists we want are inside
+        # the second item of the top-level list.
         response = yield self.client.put_json(
-            destination=destination, path=path, data=content
+            destination=destination,
+            path=path,
+            data=content,
+            parser=EventListsParser(
+                event_format_version, ("state", "auth_chain"), prefix="item."
+            ),
         )
 
         return response
@@ -991,3 +1020,78 @@ def _create_v2_path(path, *args):
         str
     """
     return _create_path(FEDERATION_V2_PREFIX, path, *args)
+
+
+class EventListsParser(ByteParser):
+    """Incrementally parses lists of events out of a JSON response body.
+
+    Each event is turned into a FrozenEvent as soon as it has been received, so
+    that we never need to hold the whole body, or the whole decoded JSON tree, in
+    memory at once. Any other fields in the response are ignored.
+
+    Args:
+        event_format_version (int): The event format version of the events
+        list_names (iterable[str]): the names of the fields which hold the lists
+            of events
+        prefix (str): the ijson prefix of the object holding those fields
+    """
+
+    def __init__(self, event_format_version, list_names, prefix=""):
+        self._event_lists = {}
+        item_prefixes = {}
+
+        for list_name in list_names:
+            events = self._event_lists[list_name] = []
+            item_prefixes[prefix + list_name + ".item"] = events
+
+        # We parse the body once, and pick out the items of each list as they
+        # go past.
+        self._coro = ijson.parse_coro(
+            _event_lists_builder(event_format_version, item_prefixes), use_float=True
+        )
+
+    def write(self, data):
+        self._coro.send(data)
+
+    def finish(self):
+        self._coro.close()
+        return self._event_lists
+
+
+@ijson.coroutine
+def _event_lists_builder(event_format_version, item_prefixes):
+    """An ijson parse target which turns the items of the given lists into
+    events
+
+    Args:
+        event_format_version (int): The event format version of the events
+        item_prefixes (dict[str, list[FrozenEvent]]): map from the ijson prefix
+            of the items of each list to the list to append the events to
+    """
+    while True:
+        prefix, event, value = yield
+
+        events = item_prefixes.get(prefix)
+        if events is None:
+            continue
+
+        if event not in ("start_map", "start_array"):
+            # a scalar item: let event_from_pdu_json complain about it
+            events.append(
+                event_from_pdu_json(value, event_format_version, outlier=True)
+            )
+            continue
+
+        # build up the item until we get to its end, which is the next event
+        # at the same prefix.
+        builder = ijson.ObjectBuilder()
+        builder.event(event, value)
+        while True:
+            item_prefix, event, value = yield
+            builder.event(event, value)
+            if item_prefix == prefix and event in ("end_map", "end_array"):
+                break
+
+        events.append(
+            event_from_pdu_json(builder.value, event_format_version, outlier=True)
+        )
@@ -280,7 +280,7 @@ class PresenceHandler(object):
             new_states_dict = {}
             for new_state in new_states:
                 new_states_dict[new_state.user_id] = new_state
-            new_state = new_states_dict.values()
+            new_states = list(new_states_dict.values())
 
             for new_state in new_states:
                 user_id = new_state.user_id
@@ -1298,19 +1298,30 @@ def get_interested_remotes(store, states, state_handler):
         each row the list of UserPresenceState should be sent to each
         destination
     """
-    hosts_and_states = []
-
     # First we look up the rooms each user is in (as well as any explicit
     # subscriptions), then for each distinct room we look up the remote
     # hosts in those rooms.
     room_ids_to_states, users_to_states = yield get_interested_parties(store, states)
 
+    # A user typically shares many rooms with each remote server, so we collect
+    # the states by destination to make sure each state is only queued once
+    # per server, rather than once per shared room.
+    host_to_states = {}
+
     for room_id, states in iteritems(room_ids_to_states):
         hosts = yield state_handler.get_current_hosts_in_room(room_id)
-        hosts_and_states.append((hosts, states))
+        for host in hosts:
+            host_to_states.setdefault(host, {}).update(
+                (state.user_id, state) for state in states
+            )
 
     for user_id, states in iteritems(users_to_states):
         host = get_domain_from_id(user_id)
-        hosts_and_states.append(([host], states))
+        host_to_states.setdefault(host, {}).update(
+            (state.user_id, state) for state in states
+        )
 
-    return hosts_and_states
+    return [
+        ([host], list(itervalues(user_to_state)))
+        for host, user_to_state in iteritems(host_to_states)
+    ]
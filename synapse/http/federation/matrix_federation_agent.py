@@ -17,6 +17,7 @@ import logging
 
 import attr
 from netaddr import IPAddress
+from prometheus_client import Counter
 from zope.interface import implementer
 
 from twisted.internet import defer
@@ -29,10 +30,15 @@ from twisted.web.iweb import IAgent
 from synapse.http.federation.srv_resolver import SrvResolver, pick_server_from_list
 from synapse.http.federation.well_known_resolver import WellKnownResolver
 from synapse.logging.context import make_deferred_yieldable
+from synapse.metrics import LaterGauge
 from synapse.util import Clock
 
 logger = logging.getLogger(__name__)
 
+outbound_connections_counter = Counter(
+    "synapse_http_federation_agent_new_connections", ""
+)
+
 
 @implementer(IAgent)
 class MatrixFederationAgent(object):
@@ -54,6 +60,12 @@ class MatrixFederationAgent(object):
         _well_known_cache (TTLCache|None):
             TTLCache impl for storing cached well-known lookups. None to use a default
             implementation.
+
+        max_idle_connections_per_host (int): the number of idle connections to
+            keep open to each remote server.
+
+        idle_connection_timeout_ms (int): how long to keep idle connections open
+            for.
     """
 
     def __init__(
@@ -62,6 +74,8 @@ class MatrixFederationAgent(object):
         tls_client_options_factory,
         _srv_resolver=None,
         _well_known_cache=None,
+        max_idle_connections_per_host=5,
+        idle_connection_timeout_ms=2 * 60 * 1000,
     ):
         self._reactor = reactor
         self._clock = Clock(reactor)
@@ -73,8 +87,15 @@ class MatrixFederationAgent(object):
 
         self._pool = HTTPConnectionPool(reactor)
         self._pool.retryAutomatically = False
-        self._pool.maxPersistentPerHost = 5
-        self._pool.cachedConnectionTimeout = 2 * 60
+        self._pool.maxPersistentPerHost = max_idle_connections_per_host
+        self._pool.cachedConnectionTimeout = idle_connection_timeout_ms / 1000
+
+        LaterGauge(
+            "synapse_http_federation_agent_idle_connections",
+            "",
+            [],
+            lambda: sum(len(conns) for conns in self._pool._connections.values()),
+        )
 
         self._well_known_resolver = WellKnownResolver(
             self._reactor,
@@ -273,6 +294,7 @@ class LoggingHostnameEndpoint(object):
 
     def connect(self, protocol_factory):
         logger.info("Connecting to %s:%i", self.host.decode("ascii"), self.port)
+        outbound_connections_counter.inc()
         return self.ep.connect(protocol_factory)
 
 
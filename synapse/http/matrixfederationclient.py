@@ -122,8 +122,37 @@ class MatrixFederationRequest(object):
         return self.json
 
 
+class ByteParser(object):
+    """Parses a response body incrementally, as it is received.
+
+    Used to avoid holding the whole of a (possibly huge) response body in memory
+    before processing it.
+    """
+
+    def write(self, data):
+        """Feeds another chunk of the response body to the parser
+
+        Args:
+            data (bytes): the chunk of the body
+
+        Raises:
+            Exception if the body could not be parsed. The rest of the response
+            is discarded.
+        """
+        raise NotImplementedError
+
+    def finish(self):
+        """Called once the whole response body has been received
+
+        Returns:
+            the result of parsing the response, which is returned to the caller
+            of the request.
+        """
+        raise NotImplementedError
+
+
 @defer.inlineCallbacks
-def _handle_json_response(reactor, timeout_sec, request, response):
+def _handle_json_response(reactor, timeout_sec, request, response, parser=None):
     """
     Reads the JSON body of a response, with a timeout
 
@@ -132,14 +161,19 @@ def _handle_json_response(reactor, timeout_sec, request, response):
         timeout_sec (float): number of seconds to wait for response to complete
         request (MatrixFederationRequest): the request that triggered the response
         response (IResponse): response to the request
+        parser (ByteParser|None): parser to feed the body to as it arrives. If
+            None, the whole body is read and then decoded as JSON.
 
     Returns:
-        dict: parsed JSON response
+        dict: parsed JSON response, or the result of parser.finish()
     """
     try:
         check_content_type_is_json(response.headers)
 
-        d = treq.json_content(response)
+        if parser is None:
+            d = treq.json_content(response)
+        else:
+            d = _read_body_with_parser(response, parser)
         d = timeout_deferred(d, timeout=timeout_sec, reactor=reactor)
 
         body = yield make_deferred_yieldable(d)
@@ -193,7 +227,15 @@ class MatrixFederationHttpClient(object):
 
         self.reactor = Reactor()
 
-        self.agent = MatrixFederationAgent(self.reactor, tls_client_options_factory)
+        config = hs.config
+        self.agent = MatrixFederationAgent(
+            self.reactor,
+            tls_client_options_factory,
+            max_idle_connections_per_host=(
+                config.federation_client_max_idle_connections_per_host
+            ),
+            idle_connection_timeout_ms=config.federation_client_idle_connection_timeout,
+        )
 
         # Use a BlacklistingAgentWrapper to prevent circumventing the IP
         # blacklist via IP literals in server names
@@ -577,6 +619,7 @@ class MatrixFederationHttpClient(object):
         ignore_backoff=False,
         backoff_on_404=False,
         try_trailing_slash_on_400=False,
+        parser=None,
     ):
         """ Sends the specifed json data using PUT
 
@@ -607,6 +650,9 @@ class MatrixFederationHttpClient(object):
                 of the request. Workaround for #3622 in Synapse <= v0.99.3. This
                 will be attempted before backing off if backing off has been
                 enabled.
+            parser (ByteParser|None): if given, the response body is fed to this
+                parser as it is received, and the result of the request is the
+                result of the parser, rather than the decoded JSON body.
 
         Returns:
             Deferred[dict|list]: Succeeds when we get a 2xx HTTP response. The
@@ -641,7 +687,7 @@ class MatrixFederationHttpClient(object):
         )
 
         body = yield _handle_json_response(
-            self.reactor, self.default_timeout, request, response
+            self.reactor, self.default_timeout, request, response, parser
         )
 
         return body
@@ -725,6 +771,7 @@ class MatrixFederationHttpClient(object):
         timeout=None,
         ignore_backoff=False,
         try_trailing_slash_on_400=False,
+        parser=None,
     ):
         """ GETs some json from the given host homeserver and path
 
@@ -747,6 +794,10 @@ class MatrixFederationHttpClient(object):
             try_trailing_slash_on_400 (bool): True if on a 400 M_UNRECOGNIZED
                 response we should try appending a trailing slash to the end of
                 the request. Workaround for #3622 in Synapse <= v0.99.3.
+
+            parser (ByteParser|None): if given, the response body is fed to this
+                parser as it is received, and the result of the request is the
+                result of the parser, rather than the decoded JSON body.
         Returns:
             Deferred[dict|list]: Succeeds when we get a 2xx HTTP response. The
             result will be the decoded JSON body.
@@ -775,7 +826,7 @@ class MatrixFederationHttpClient(object):
         )
 
         body = yield _handle_json_response(
-            self.reactor, self.default_timeout, request, response
+            self.reactor, self.default_timeout, request, response, parser
         )
 
         return body
@@ -939,6 +990,44 @@ def _readBodyToFile(response, stream, max_size):
     return d
 
 
+class _ReadBodyWithParserProtocol(protocol.Protocol):
+    def __init__(self, parser, deferred):
+        self.parser = parser
+        self.deferred = deferred
+
+    def dataReceived(self, data):
+        if self.deferred.called:
+            # we've already given up on this response
+            return
+
+        try:
+            self.parser.write(data)
+        except Exception:
+            self.deferred.errback()
+            self.transport.loseConnection()
+
+    def connectionLost(self, reason):
+        if self.deferred.called:
+            return
+
+        if not reason.check(ResponseDone):
+            self.deferred.errback(reason)
+            return
+
+        try:
+            result = self.parser.finish()
+        except Exception:
+            self.deferred.errback()
+        else:
+            self.deferred.callback(result)
+
+
+def _read_body_with_parser(response, parser):
+    d = defer.Deferred()
+    response.deliverBody(_ReadBodyWithParserProtocol(parser, d))
+    return d
+
+
 def _flatten_response_never_received(e):
     if hasattr(e, "reasons"):
         reasons = ", ".join(
@@ -20,27 +20,26 @@ import http.client
 import logging
 import types
 import urllib
-from io import BytesIO
 
-from canonicaljson import encode_canonical_json, encode_pretty_printed_json, json
+from canonicaljson import encode_canonical_json, encode_pretty_printed_json
+from zope.interface import implementer
 
 from twisted.internet import defer
+from twisted.internet.interfaces import IPullProducer
 from twisted.python import failure
 from twisted.web import resource
 from twisted.web.server import NOT_DONE_YET
-from twisted.web.static import NoRangeStaticProducer
 from twisted.web.util import redirectTo
 
-import synapse.events
-import synapse.metrics
 from synapse.api.errors import (
     CodeMessageException,
     Codes,
     SynapseError,
     UnrecognizedRequestError,
 )
-from synapse.logging.context import preserve_fn
+from synapse.logging.context import defer_to_thread, preserve_fn, run_in_background
 from synapse.util.caches import intern_dict
+from synapse.util.frozenutils import compact_json_encoder
 
 logger = logging.getLogger(__name__)
 
@@ -246,7 +245,8 @@ class JsonResource(HttpServer, resource.Resource):
     isLeaf = True
 
     _PathEntry = collections.namedtuple(
-        "_PathEntry", ["pattern", "callback", "servlet_classname"]
+        "_PathEntry",
+        ["pattern", "callback", "servlet_classname", "encode_in_threadpool"],
     )
 
     def __init__(self, hs, canonical_json=True):
@@ -256,8 +256,16 @@ class JsonResource(HttpServer, resource.Resource):
         self.clock = hs.get_clock()
         self.path_regexs = {}
         self.hs = hs
-
-    def register_paths(self, method, path_patterns, callback, servlet_classname):
+        self._encode_in_threadpool = hs.config.encode_large_responses_in_threadpool
+
+    def register_paths(
+        self,
+        method,
+        path_patterns,
+        callback,
+        servlet_classname,
+        encode_in_threadpool=False,
+    ):
         """
         Registers a request handler against a regular expression. Later request URLs are
         checked against these regular expressions in order to identify an appropriate
@@ -273,12 +281,19 @@ class JsonResource(HttpServer, resource.Resource):
 
             servlet_classname (str): The name of the handler to be used in prometheus
                 and opentracing logs.
+
+            encode_in_threadpool (bool): Whether the handler's responses may be
+                large enough to be worth encoding on the reactor's threadpool.
+                If so, and it is enabled in the config, they are. The handler
+                must not change the object it returns after returning it.
         """
         method = method.encode("utf-8")  # method is bytes on py3
         for path_pattern in path_patterns:
             logger.debug("Registering for %s %s", method, path_pattern.pattern)
             self.path_regexs.setdefault(method, []).append(
-                self._PathEntry(path_pattern, callback, servlet_classname)
+                self._PathEntry(
+                    path_pattern, callback, servlet_classname, encode_in_threadpool
+                )
             )
 
     def render(self, request):
@@ -293,7 +308,12 @@ class JsonResource(HttpServer, resource.Resource):
             This checks if anyone has registered a callback for that method and
             path.
         """
-        callback, servlet_classname, group_dict = self._get_handler_for_request(request)
+        (
+            callback,
+            servlet_classname,
+            group_dict,
+            encode_in_threadpool,
+        ) = self._get_handler_for_request(request)
 
         # Make sure we have a name for this handler in prometheus.
         request.request_metrics.name = servlet_classname
@@ -316,7 +336,9 @@ class JsonResource(HttpServer, resource.Resource):
 
         if callback_return is not None:
             code, response = callback_return
-            self._send_response(request, code, response)
+            self._send_response(
+                request, code, response, encode_in_threadpool=encode_in_threadpool
+            )
 
     def _get_handler_for_request(self, request):
         """Finds a callback method to handle the given request
@@ -325,17 +347,18 @@ class JsonResource(HttpServer, resource.Resource):
             request (twisted.web.http.Request):
 
         Returns:
-            Tuple[Callable, str, dict[unicode, unicode]]: callback method, the
-                label to use for that method in prometheus metrics, and the
-                dict mapping keys to path components as specified in the
-                handler's path match regexp.
+            Tuple[Callable, str, dict[unicode, unicode], bool]: callback
+                method, the label to use for that method in prometheus metrics,
+                the dict mapping keys to path components as specified in the
+                handler's path match regexp, and whether its responses may be
+                encoded on the threadpool.
 
                 The callback will normally be a method registered via
                 register_paths, so will return (possibly via Deferred) either
                 None, or a tuple of (http code, response body).
         """
         if request.method == b"OPTIONS":
-            return _options_handler, "options_request_handler", {}
+            return _options_handler, "options_request_handler", {}, False
 
         # Loop through all the registered callbacks to check if the method
         # and path regex match
@@ -343,14 +366,33 @@ class JsonResource(HttpServer, resource.Resource):
             m = path_entry.pattern.match(request.path.decode("ascii"))
             if m:
                 # We found a match!
-                return path_entry.callback, path_entry.servlet_classname, m.groupdict()
+                return (
+                    path_entry.callback,
+                    path_entry.servlet_classname,
+                    m.groupdict(),
+                    path_entry.encode_in_threadpool,
+                )
 
         # Huh. No one wanted to handle that? Fiiiiiine. Send 400.
-        return _unrecognised_request_handler, "unrecognised_request_handler", {}
+        return (
+            _unrecognised_request_handler,
+            "unrecognised_request_handler",
+            {},
+            False,
+        )
 
     def _send_response(
-        self, request, code, response_json_object, response_code_message=None
+        self,
+        request,
+        code,
+        response_json_object,
+        response_code_message=None,
+        encode_in_threadpool=False,
     ):
+        reactor = None
+        if encode_in_threadpool and self._encode_in_threadpool:
+            reactor = self.hs.get_reactor()
+
         # TODO: Only enable CORS for the requests that need it.
         respond_with_json(
             request,
@@ -360,6 +402,7 @@ class JsonResource(HttpServer, resource.Resource):
             response_code_message=response_code_message,
             pretty_print=_request_user_agent_is_curl(request),
             canonical_json=self.canonical_json,
+            reactor=reactor,
         )
 
 
@@ -438,7 +481,30 @@ def respond_with_json(
     response_code_message=None,
     pretty_print=False,
     canonical_json=True,
+    reactor=None,
 ):
+    """Sends a JSON response to the given request.
+
+    Args:
+        request (twisted.web.http.Request): The http request to respond to.
+        code (int): The HTTP response code.
+        json_object (object): The object to encode and send.
+        send_cors (bool): Whether to send Cross-Origin Resource Sharing headers
+            http://www.w3.org/TR/cors/
+        response_code_message (str|None): The HTTP reason phrase to use.
+        pretty_print (bool): Whether to indent the response.
+        canonical_json (bool): Whether to use canonical JSON encoding. If not,
+            a faster, compact (but non-canonical) encoding is used, which is
+            fine for anything which isn't going to be signed or hashed.
+        reactor (twisted.internet.interfaces.IReactorThreads|None): If given,
+            the object is encoded on a thread from this reactor's threadpool,
+            so that encoding a large response (e.g. an initial sync) doesn't
+            stop the reactor from servicing other requests in the meantime.
+            Nothing may change `json_object` while it is being encoded.
+
+    Returns:
+        twisted.web.server.NOT_DONE_YET
+    """
     # could alternatively use request.notifyFinish() and flip a flag when
     # the Deferred fires, but since the flag is RIGHT THERE it seems like
     # a waste.
@@ -449,15 +515,64 @@ def respond_with_json(
         return
 
     if pretty_print:
-        json_bytes = encode_pretty_printed_json(json_object) + b"\n"
+        encoder = _encode_pretty_printed_json
+    elif canonical_json:
+        # canonicaljson already encodes to bytes
+        encoder = encode_canonical_json
     else:
-        if canonical_json or synapse.events.USE_FROZEN_DICTS:
-            # canonicaljson already encodes to bytes
-            json_bytes = encode_canonical_json(json_object)
-        else:
-            json_bytes = json.dumps(json_object).encode("utf-8")
+        encoder = _encode_json_bytes
+
+    if reactor is None:
+        return respond_with_json_bytes(
+            request,
+            code,
+            encoder(json_object),
+            send_cors=send_cors,
+            response_code_message=response_code_message,
+        )
+
+    run_in_background(
+        _respond_with_json_from_thread,
+        reactor,
+        request,
+        code,
+        encoder,
+        json_object,
+        send_cors,
+        response_code_message,
+    )
+    return NOT_DONE_YET
+
+
+def _encode_pretty_printed_json(json_object):
+    return encode_pretty_printed_json(json_object) + b"\n"
+
 
-    return respond_with_json_bytes(
+def _encode_json_bytes(json_object):
+    return compact_json_encoder.encode(json_object).encode("utf-8")
+
+
+@defer.inlineCallbacks
+def _respond_with_json_from_thread(
+    reactor, request, code, encoder, json_object, send_cors, response_code_message
+):
+    try:
+        json_bytes = yield defer_to_thread(reactor, encoder, json_object)
+    except Exception:
+        logger.exception("Failed to encode JSON response to %r", request)
+        code = 500
+        response_code_message = None
+        json_bytes = encode_canonical_json(
+            {"error": "Internal server error", "errcode": Codes.UNKNOWN}
+        )
+
+    if request._disconnected:
+        logger.warn(
+            "Not sending response to request %s, already disconnected.", request
+        )
+        return
+
+    respond_with_json_bytes(
         request,
         code,
         json_bytes,
@@ -488,15 +603,55 @@ def respond_with_json_bytes(
     if send_cors:
         set_cors_headers(request)
 
-    # todo: we can almost certainly avoid this copy and encode the json straight into
-    # the bytesIO, but it would involve faffing around with string->bytes wrappers.
-    bytes_io = BytesIO(json_bytes)
-
-    producer = NoRangeStaticProducer(request, bytes_io)
-    producer.start()
+    _ByteProducer(request, json_bytes).start()
     return NOT_DONE_YET
 
 
+@implementer(IPullProducer)
+class _ByteProducer(object):
+    """Writes a bytes body to a request a chunk at a time, as the transport
+    asks for more, and then finishes the request.
+
+    This stops a large response from being copied into the transport's buffer
+    in one go, and gives the reactor a chance to do other work in between
+    chunks.
+    """
+
+    # the same as NoRangeStaticProducer uses
+    CHUNK_SIZE = 2 ** 16
+
+    def __init__(self, request, body):
+        self._request = request
+        self._body = body
+        self._offset = 0
+
+    def start(self):
+        self._request.registerProducer(self, False)
+
+    def resumeProducing(self):
+        if not self._request:
+            return
+
+        chunk = self._body[self._offset : self._offset + self.CHUNK_SIZE]
+        self._offset += len(chunk)
+        if chunk:
+            self._request.write(chunk)
+
+            # writing may have caused the connection to be closed, and hence
+            # stopProducing to be called.
+            if not self._request:
+                return
+
+        if self._offset >= len(self._body):
+            self._request.unregisterProducer()
+            self._request.finish()
+            self.stopProducing()
+
+    def stopProducing(self):
+        self._request = None
+        self._body = None
+
+
 def set_cors_headers(request):
     """Set the CORs headers so that javascript running in a web browsers can
     use this API
@@ -286,8 +286,15 @@ class RestServlet(object):
 
     Automatically handles turning CodeMessageExceptions thrown by these methods
     into the appropriate HTTP response.
+
+    Servlets whose responses can be very large may set
+    `ENCODE_RESPONSES_IN_THREADPOOL`, so that (if enabled in the config) the
+    responses are encoded on the reactor's threadpool. They must then not
+    change the object they return after returning it.
     """
 
+    ENCODE_RESPONSES_IN_THREADPOOL = False
+
     def register(self, http_server):
         """ Register this servlet with the given HTTP server. """
         if hasattr(self, "PATTERNS"):
@@ -302,6 +309,7 @@ class RestServlet(object):
                         patterns,
                         trace_servlet(servlet_classname, method_handler),
                         servlet_classname,
+                        encode_in_threadpool=self.ENCODE_RESPONSES_IN_THREADPOOL,
                     )
 
         else:
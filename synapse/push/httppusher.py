@@ -17,13 +17,14 @@ import logging
 
 import six
 
-from prometheus_client import Counter
+from prometheus_client import Counter, Histogram
 
 from twisted.internet import defer
 from twisted.internet.error import AlreadyCalled, AlreadyCancelled
 
 from synapse.metrics.background_process_metrics import run_as_background_process
 from synapse.push import PusherConfigException
+from synapse.util.async_helpers import Linearizer
 
 from . import push_rule_evaluator, push_tools
 
@@ -52,6 +53,53 @@ http_badges_failed_counter = Counter(
     "Number of badge updates which failed",
 )
 
+http_push_gateway_request_time = Histogram(
+    "synapse_http_httppusher_gateway_request_seconds",
+    "Time taken for push gateways to respond to requests",
+)
+
+
+class PushGatewayClient(object):
+    """Sends requests to push gateways on behalf of the HTTP pushers.
+
+    This is shared between all the HTTP pushers in the process, so that we can
+    limit the number of requests in flight to each push gateway. Otherwise a
+    message in a large room would send a request for every member to the
+    gateway at once. The requests share the HTTP client's pool of persistent
+    connections.
+    """
+
+    # The maximum number of requests to have in flight to any one push gateway
+    MAX_CONCURRENT_REQUESTS = 20
+
+    def __init__(self, hs):
+        self.clock = hs.get_clock()
+        self.http_client = hs.get_simple_http_client()
+        self._limiter = Linearizer(
+            name="push_gateway",
+            max_count=self.MAX_CONCURRENT_REQUESTS,
+            clock=self.clock,
+        )
+
+    @defer.inlineCallbacks
+    def post(self, url, body):
+        """POST a notification to a push gateway.
+
+        Args:
+            url (str): The URL of the push gateway
+            body (dict): The request to send
+
+        Returns:
+            Deferred[dict]: The gateway's response
+        """
+        with (yield self._limiter.queue(url)):
+            start = self.clock.time()
+            try:
+                resp = yield self.http_client.post_json_get_json(url, body)
+            finally:
+                http_push_gateway_request_time.observe(self.clock.time() - start)
+        return resp
+
 
 class HttpPusher(object):
     INITIAL_BACKOFF_SEC = 1  # in seconds because that's what Twisted takes
@@ -60,7 +108,7 @@ class HttpPusher(object):
     # This one's in ms because we compare it against the clock
     GIVE_UP_AFTER_MS = 24 * 60 * 60 * 1000
 
-    def __init__(self, hs, pusherdict):
+    def __init__(self, hs, pusherdict, gateway_client):
         self.hs = hs
         self.store = self.hs.get_datastore()
         self.clock = self.hs.get_clock()
@@ -85,6 +133,20 @@ class HttpPusher(object):
         # off as None though as we don't know any better.
         self.max_stream_ordering = None
 
+        # The rooms the user has unread notifications in, which we use to
+        # calculate the badge count. This is loaded on demand, added to as we
+        # process push actions, and reloaded when the user's receipts change,
+        # so that we don't have to check every room the user is in each time.
+        self._unread_room_ids = None
+        # Incremented whenever _unread_room_ids is invalidated, so that we
+        # don't cache the results of a lookup which raced with an invalidation.
+        self._unread_room_ids_generation = 0
+
+        # The badge count we last successfully sent to the push gateway.
+        self._last_badge = None
+        self._badge_update_in_progress = False
+        self._badge_update_pending = False
+
         if "data" not in pusherdict:
             raise PusherConfigException("No 'data' key for HTTP pusher")
         self.data = pusherdict["data"]
@@ -101,7 +163,7 @@ class HttpPusher(object):
         if "url" not in self.data:
             raise PusherConfigException("'url' required in data for HTTP pusher")
         self.url = self.data["url"]
-        self.http_client = hs.get_simple_http_client()
+        self.gateway_client = gateway_client
         self.data_minus_url = {}
         self.data_minus_url.update(self.data)
         del self.data_minus_url["url"]
@@ -128,12 +190,80 @@ class HttpPusher(object):
 
         # We could check the receipts are actually m.read receipts here,
         # but currently that's the only type of receipt anyway...
+        self._unread_room_ids = None
+        self._unread_room_ids_generation += 1
+
+        if self._badge_update_in_progress:
+            # receipts tend to arrive in bursts, so rather than sending an
+            # update for each one we let the update in progress go round again
+            # once it's done.
+            self._badge_update_pending = True
+            return
+
         run_as_background_process("http_pusher.on_new_receipts", self._update_badge)
 
     @defer.inlineCallbacks
     def _update_badge(self):
-        badge = yield push_tools.get_badge_count(self.hs.get_datastore(), self.user_id)
-        yield self._send_badge(badge)
+        self._badge_update_in_progress = True
+        try:
+            while True:
+                self._badge_update_pending = False
+                badge = yield self._get_badge_count()
+                if badge != self._last_badge:
+                    yield self._send_badge(badge)
+                if not self._badge_update_pending:
+                    break
+        finally:
+            self._badge_update_in_progress = False
+
+    @defer.inlineCallbacks
+    def _get_badge_count(self):
+        unread_room_ids = self._unread_room_ids
+        if unread_room_ids is None:
+            generation = self._unread_room_ids_generation
+            unread_room_ids = yield self.store.get_rooms_with_unread_notifications_for_user(
+                self.user_id
+            )
+            unread_room_ids = set(unread_room_ids)
+            if generation == self._unread_room_ids_generation:
+                self._unread_room_ids = unread_room_ids
+
+        badge = yield push_tools.get_badge_count(
+            self.store, self.user_id, unread_room_ids
+        )
+        return badge
+
+    @defer.inlineCallbacks
+    def _add_unread_room(self, room_id, stream_ordering):
+        """Record that the user has an unread notification in the given room,
+        unless they have already read past it.
+
+        Args:
+            room_id (str): the room the notification is in
+            stream_ordering (int): the stream ordering of the notified event
+        """
+        if self._unread_room_ids is None:
+            # it'll be picked up when we next load the unread rooms
+            return
+
+        # for consistency with get_rooms_with_unread_notifications_for_user, we
+        # only count rooms the user has a read receipt in.
+        receipts = yield self.store.get_receipts_for_user(self.user_id, "m.read")
+        receipt_event_id = receipts.get(room_id)
+        if receipt_event_id is None:
+            return
+
+        # We may be catching up on actions the user has since read (e.g. after
+        # a backoff or restart), which mustn't count.
+        receipt_event = yield self.store.get_event(receipt_event_id, allow_none=True)
+        if (
+            receipt_event is not None
+            and receipt_event.internal_metadata.stream_ordering >= stream_ordering
+        ):
+            return
+
+        if self._unread_room_ids is not None:
+            self._unread_room_ids.add(room_id)
 
     def on_timer(self):
         self._start_processing()
@@ -274,7 +404,10 @@ class HttpPusher(object):
             return True
 
         tweaks = push_rule_evaluator.tweaks_for_actions(push_action["actions"])
-        badge = yield push_tools.get_badge_count(self.hs.get_datastore(), self.user_id)
+        yield self._add_unread_room(
+            push_action["room_id"], push_action["stream_ordering"]
+        )
+        badge = yield self._get_badge_count()
 
         event = yield self.store.get_event(push_action["event_id"], allow_none=True)
         if event is None:
@@ -283,6 +416,8 @@ class HttpPusher(object):
         if rejected is False:
             return False
 
+        self._last_badge = badge
+
         if isinstance(rejected, list) or isinstance(rejected, tuple):
             for pk in rejected:
                 if pk != self.pushkey:
@@ -366,9 +501,7 @@ class HttpPusher(object):
         if not notification_dict:
             return []
         try:
-            resp = yield self.http_client.post_json_get_json(
-                self.url, notification_dict
-            )
+            resp = yield self.gateway_client.post(self.url, notification_dict)
         except Exception as e:
             logger.warning(
                 "Failed to push event %s to %s: %s %s",
@@ -407,8 +540,9 @@ class HttpPusher(object):
             }
         }
         try:
-            yield self.http_client.post_json_get_json(self.url, d)
+            yield self.gateway_client.post(self.url, d)
             http_badges_processed_counter.inc()
+            self._last_badge = badge
         except Exception as e:
             logger.warning(
                 "Failed to send badge count to %s: %s %s", self.name, type(e), e
@@ -19,27 +19,32 @@ from synapse.push.presentable_names import calculate_room_name, name_from_member
 
 
 @defer.inlineCallbacks
-def get_badge_count(store, user_id):
-    invites = yield store.get_invited_rooms_for_user(user_id)
-    joins = yield store.get_rooms_for_user(user_id)
+def get_badge_count(store, user_id, unread_room_ids=None):
+    """Get the badge count for a user: the number of rooms they have been
+    invited to, plus the number of joined rooms they have unread notifications
+    in.
 
-    my_receipts_by_room = yield store.get_receipts_for_user(user_id, "m.read")
+    Args:
+        store (DataStore)
+        user_id (str)
+        unread_room_ids (Collection[str]|None): the rooms the user has unread
+            notifications in, if already known. Otherwise they are fetched
+            from the database.
 
-    badge = len(invites)
+    Returns:
+        Deferred[int]
+    """
+    if unread_room_ids is None:
+        unread_room_ids = yield store.get_rooms_with_unread_notifications_for_user(
+            user_id
+        )
 
-    for room_id in joins:
-        if room_id in my_receipts_by_room:
-            last_unread_event_id = my_receipts_by_room[room_id]
+    invites = yield store.get_invited_rooms_for_user(user_id)
+    joins = yield store.get_rooms_for_user(user_id)
 
-            notifs = yield (
-                store.get_unread_event_push_actions_by_room_for_user(
-                    room_id, user_id, last_unread_event_id
-                )
-            )
-            # return one badge count per conversation, as count per
-            # message is so noisy as to be almost useless
-            badge += 1 if notifs["notify_count"] else 0
-    return badge
+    # return one badge count per conversation, as count per
+    # message is so noisy as to be almost useless
+    return len(invites) + len(joins.intersection(unread_room_ids))
 
 
 @defer.inlineCallbacks
@@ -15,7 +15,7 @@
 
 import logging
 
-from .httppusher import HttpPusher
+from .httppusher import HttpPusher, PushGatewayClient
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +36,8 @@ class PusherFactory(object):
     def __init__(self, hs):
         self.hs = hs
 
-        self.pusher_types = {"http": HttpPusher}
+        self.gateway_client = PushGatewayClient(hs)
+        self.pusher_types = {"http": self._create_http_pusher}
 
         logger.info("email enable notifs: %r", hs.config.email_enable_notifs)
         if hs.config.email_enable_notifs:
@@ -61,6 +62,9 @@ class PusherFactory(object):
         logger.debug("creating %s pusher for %r", kind, pusherdict)
         return f(self.hs, pusherdict)
 
+    def _create_http_pusher(self, _hs, pusherdict):
+        return HttpPusher(self.hs, pusherdict, self.gateway_client)
+
     def _create_email_pusher(self, _hs, pusherdict):
         app_name = self._app_name_from_pusherdict(pusherdict)
         mailer = self.mailers.get(app_name)
@@ -15,6 +15,7 @@
 # limitations under the License.
 
 import logging
+import zlib
 
 from twisted.internet import defer
 
@@ -45,6 +46,8 @@ class PusherPool:
         self.hs = _hs
         self.pusher_factory = PusherFactory(_hs)
         self._should_start_pushers = _hs.config.start_pushers
+        self._pusher_shards = _hs.config.worker_pusher_shards
+        self._pusher_shard_index = _hs.config.worker_pusher_shard_index
         self.store = self.hs.get_datastore()
         self.clock = self.hs.get_clock()
         self.pushers = {}
@@ -168,9 +171,17 @@ class PusherPool:
             return
 
         try:
-            users_affected = yield self.store.get_push_action_users_in_range(
-                min_stream_id, max_stream_id
+            # Try the stream change cache first, as this gets called for every
+            # new event. It may return users who have had push actions since
+            # max_stream_id too, which is harmless: it just pokes their pushers
+            # a little early.
+            users_affected = self.store.get_push_action_users_changed_since(
+                min_stream_id - 1
             )
+            if users_affected is None:
+                users_affected = yield self.store.get_push_action_users_in_range(
+                    min_stream_id, max_stream_id
+                )
 
             for u in users_affected:
                 if u in self.pushers:
@@ -189,11 +200,15 @@ class PusherPool:
         try:
             # Need to subtract 1 from the minimum because the lower bound here
             # is not inclusive
-            updated_receipts = yield self.store.get_all_updated_receipts(
-                min_stream_id - 1, max_stream_id
+            users_affected = self.store.get_receipt_users_changed_since(
+                min_stream_id - 1
             )
-            # This returns a tuple, user_id is at index 3
-            users_affected = set([r[3] for r in updated_receipts])
+            if users_affected is None:
+                updated_receipts = yield self.store.get_all_updated_receipts(
+                    min_stream_id - 1, max_stream_id
+                )
+                # This returns a tuple, user_id is at index 3
+                users_affected = set([r[3] for r in updated_receipts])
 
             for u in users_affected:
                 if u in self.pushers:
@@ -250,8 +265,11 @@ class PusherPool:
             pusherdict (dict):
 
         Returns:
-            Deferred[EmailPusher|HttpPusher]
+            Deferred[EmailPusher|HttpPusher|None]: The pusher started, if any
         """
+        if not self._is_our_user(pusherdict["user_name"]):
+            return
+
         try:
             p = self.pusher_factory.create_pusher(pusherdict)
         except PusherConfigException as e:
@@ -295,6 +313,17 @@ class PusherPool:
 
         return p
 
+    def _is_our_user(self, user_id):
+        """Whether this process is responsible for sending the given user's
+        notifications, when the pushers are sharded across several workers.
+        """
+        if self._pusher_shards == 1:
+            return True
+
+        # this needs to be stable across processes, so we can't use hash()
+        shard = zlib.crc32(user_id.encode("utf-8")) % self._pusher_shards
+        return shard == self._pusher_shard_index
+
     @defer.inlineCallbacks
     def remove_pusher(self, app_id, pushkey, user_id):
         appid_pushkey = "%s:%s" % (app_id, pushkey)
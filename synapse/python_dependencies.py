@@ -72,6 +72,9 @@ REQUIREMENTS = [
     "netaddr>=0.7.18",
     "Jinja2>=2.9",
     "bleach>=1.4.3",
+    # we pass use_float to ijson.parse_coro, so that numbers are parsed as
+    # floats rather than Decimals; the option arrived in 3.1.
+    "ijson>=3.1",
 ]
 
 CONDITIONAL_REQUIREMENTS = {
@@ -159,6 +159,54 @@ class ReplicationFederationSendEduRestServlet(ReplicationEndpoint):
         return (200, result)
 
 
+class ReplicationFederationSendEdusRestServlet(ReplicationEndpoint):
+    """Handles a batch of EDUs received from federation in a single transaction.
+
+    Request format:
+
+        POST /_synapse/replication/fed_send_edus/:txn_id
+
+        {
+            "origin": ...,
+            "edus": [[edu_type, content], ...]
+        }
+    """
+
+    NAME = "fed_send_edus"
+    PATH_ARGS = ()
+
+    def __init__(self, hs):
+        super(ReplicationFederationSendEdusRestServlet, self).__init__(hs)
+
+        self.clock = hs.get_clock()
+        self.registry = hs.get_federation_registry()
+
+    @staticmethod
+    def _serialize_payload(origin, edus):
+        """
+        Args:
+            origin (str): the server which sent the EDUs
+            edus (list[tuple[str, dict]]): (edu_type, content) for each EDU
+        """
+        return {"origin": origin, "edus": edus}
+
+    @defer.inlineCallbacks
+    def _handle_request(self, request):
+        with Measure(self.clock, "repl_fed_send_edus_parse"):
+            content = parse_json_object_from_request(request)
+
+            origin = content["origin"]
+            edus = [
+                (edu_type, edu_content) for edu_type, edu_content in content["edus"]
+            ]
+
+        logger.info("Got %i edus from %s", len(edus), origin)
+
+        yield self.registry.on_edus(origin, edus)
+
+        return (200, {})
+
+
 class ReplicationGetQueryRestServlet(ReplicationEndpoint):
     """Handle responding to queries from federation.
 
@@ -244,5 +292,6 @@ class ReplicationCleanRoomRestServlet(ReplicationEndpoint):
 def register_servlets(hs, http_server):
     ReplicationFederationSendEventsRestServlet(hs).register(http_server)
     ReplicationFederationSendEduRestServlet(hs).register(http_server)
+    ReplicationFederationSendEdusRestServlet(hs).register(http_server)
     ReplicationGetQueryRestServlet(hs).register(http_server)
     ReplicationCleanRoomRestServlet(hs).register(http_server)
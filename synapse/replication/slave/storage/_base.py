@@ -17,7 +17,7 @@ import logging
 
 import six
 
-from synapse.storage._base import _CURRENT_STATE_CACHE_NAME, SQLBaseStore
+from synapse.storage._base import SQLBaseStore
 from synapse.storage.engines import PostgresEngine
 
 from ._slaved_id_tracker import SlavedIdTracker
@@ -53,17 +53,15 @@ class BaseSlavedStore(SQLBaseStore):
     def process_replication_rows(self, stream_name, token, rows):
         if stream_name == "caches":
             self._cache_id_gen.advance(token)
-            for row in rows:
-                if row.cache_func == _CURRENT_STATE_CACHE_NAME:
-                    room_id = row.keys[0]
-                    members_changed = set(row.keys[1:])
-                    self._invalidate_state_caches(room_id, members_changed)
-                else:
-                    self._attempt_to_invalidate_cache(row.cache_func, tuple(row.keys))
+            self._process_cache_invalidation_rows(rows)
 
     def _invalidate_cache_and_stream(self, txn, cache_func, keys):
         txn.call_after(cache_func.invalidate, keys)
         txn.call_after(self._send_invalidation_poke, cache_func, keys)
 
+    def _invalidate_cache_and_stream_bulk(self, txn, cache_func, key_tuples):
+        for keys in set(tuple(k) for k in key_tuples):
+            self._invalidate_cache_and_stream(txn, cache_func, keys)
+
     def _send_invalidation_poke(self, cache_func, keys):
         self.hs.get_tcp_replication().send_invalidate_cache(cache_func, keys)
@@ -13,7 +13,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from synapse.storage.client_ips import LAST_SEEN_GRANULARITY
 from synapse.util.caches import CACHE_SIZE_FACTOR
 from synapse.util.caches.descriptors import Cache
 
@@ -28,6 +27,8 @@ class SlavedClientIpStore(BaseSlavedStore):
             name="client_ip_last_seen", keylen=4, max_entries=50000 * CACHE_SIZE_FACTOR
         )
 
+        self._last_seen_granularity = hs.config.client_ip_last_seen_granularity
+
     def insert_client_ip(self, user_id, access_token, ip, user_agent, device_id):
         now = int(self._clock.time_msec())
         key = (user_id, access_token, ip)
@@ -38,7 +39,7 @@ class SlavedClientIpStore(BaseSlavedStore):
             last_seen = None
 
         # Rate-limited inserts
-        if last_seen is not None and (now - last_seen) < LAST_SEEN_GRANULARITY:
+        if last_seen is not None and (now - last_seen) < self._last_seen_granularity:
             return
 
         self.client_ip_last_seen.prefill(key, now)
@@ -63,6 +63,7 @@ class SlavedReceiptsStore(ReceiptsWorkerStore, BaseSlavedStore):
                     row.room_id, row.receipt_type, row.user_id
                 )
                 self._receipts_stream_cache.entity_has_changed(row.room_id, token)
+                self._receipts_user_stream_cache.entity_has_changed(row.user_id, token)
 
         return super(SlavedReceiptsStore, self).process_replication_rows(
             stream_name, token, rows
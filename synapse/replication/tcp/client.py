@@ -48,6 +48,10 @@ class ReplicationClientFactory(ReconnectingClientFactory):
         self.server_name = hs.config.server_name
         self._clock = hs.get_clock()  # As self.clock is defined in super class
 
+        self._framing = hs.config.worker_replication_framing
+        if self._framing == "text":
+            self._framing = None
+
         hs.get_reactor().addSystemEventTrigger("before", "shutdown", self.stopTrying)
 
     def startedConnecting(self, connector):
@@ -56,7 +60,11 @@ class ReplicationClientFactory(ReconnectingClientFactory):
     def buildProtocol(self, addr):
         logger.info("Connected to replication: %r", addr)
         return ClientReplicationStreamProtocol(
-            self.client_name, self.server_name, self._clock, self.handler
+            self.client_name,
+            self.server_name,
+            self._clock,
+            self.handler,
+            framing=self._framing,
         )
 
     def clientConnectionLost(self, connector, reason):
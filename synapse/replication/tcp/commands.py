@@ -62,6 +62,16 @@ class Command(object):
         """
         return self.data
 
+    def to_bytes(self):
+        """Serialises the command, including the command prefix, into the
+        UTF-8 encoded line that gets sent over the wire (minus the delimiter).
+        """
+        string = "%s %s" % (self.NAME, self.to_line())
+        if "\n" in string:
+            raise Exception("Unexpected newline in command: %r", string)
+
+        return string.encode("utf-8")
+
     def get_logcontext_id(self):
         """Get a suitable string for the logcontext when processing this command"""
 
@@ -111,6 +121,10 @@ class RdataCommand(Command):
         self.token = token
         self.row = row
 
+        # The encoded line, so that a command sent to many connections only
+        # gets serialised once. See to_bytes.
+        self._encoded = None
+
     @classmethod
     def from_line(cls, line):
         stream_name, token, row_json = line.split(" ", 2)
@@ -127,6 +141,11 @@ class RdataCommand(Command):
             )
         )
 
+    def to_bytes(self):
+        if self._encoded is None:
+            self._encoded = super(RdataCommand, self).to_bytes()
+        return self._encoded
+
     def get_logcontext_id(self):
         return "RDATA-" + self.stream_name
 
@@ -177,6 +196,26 @@ class NameCommand(Command):
     NAME = "NAME"
 
 
+class FramingCommand(Command):
+    """Sent by the client to ask the server to switch to a different framing for
+    the commands that it sends, and by the server to acknowledge the switch.
+
+    Format::
+
+        FRAMING <mode>
+
+    Where `<mode>` is one of FRAMING_MODES. Everything the server sends after
+    its FRAMING command uses the new framing. See
+    `BaseReplicationStreamProtocol` for a description of the framing modes.
+    """
+
+    NAME = "FRAMING"
+
+
+# The framing modes that can be requested with a FRAMING command
+FRAMING_MODES = ("compact", "compressed")
+
+
 class ReplicateCommand(Command):
     """Sent by the client to subscribe to the stream.
 
@@ -396,6 +435,7 @@ COMMAND_MAP = {
         ErrorCommand,
         PingCommand,
         NameCommand,
+        FramingCommand,
         ReplicateCommand,
         UserSyncCommand,
         FederationAckCommand,
@@ -414,6 +454,7 @@ VALID_SERVER_COMMANDS = (
     ErrorCommand.NAME,
     PingCommand.NAME,
     SyncCommand.NAME,
+    FramingCommand.NAME,
 )
 
 # The commands the client is allowed to send
@@ -427,4 +468,5 @@ VALID_CLIENT_COMMANDS = (
     InvalidateCacheCommand.NAME,
     UserIpCommand.NAME,
     ErrorCommand.NAME,
+    FramingCommand.NAME,
 )
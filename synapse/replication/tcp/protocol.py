@@ -47,11 +47,27 @@ indicate which side is sending, these are *not* included on the wire::
     < PING 1490197675618
     > ERROR server stopping
     * connection closed by server *
+
+# Compact framing
+
+A client can ask the server to send its commands in length-prefixed frames
+rather than as lines, by sending `FRAMING compact` or `FRAMING compressed`.
+The server acknowledges with a `FRAMING` line of its own, and everything the
+server sends after that is framed. Each frame is a five byte header (the
+length of the payload as a big-endian unsigned int, followed by a flags byte)
+and then the payload, which is a newline separated list of commands. `RDATA`
+and `POSITION` commands are batched up into a frame until we next return to
+the reactor, and with `compressed` framing larger frames are compressed with a
+zlib stream which lives as long as the connection, so that IDs repeated across
+rows only cost a back-reference. Frames are not limited to `MAX_LENGTH`.
+
+The client always sends line based commands.
 """
 
 import fcntl
 import logging
 import struct
+import zlib
 from collections import defaultdict
 
 from six import iteritems, iterkeys
@@ -69,9 +85,11 @@ from synapse.util.stringutils import random_string
 
 from .commands import (
     COMMAND_MAP,
+    FRAMING_MODES,
     VALID_CLIENT_COMMANDS,
     VALID_SERVER_COMMANDS,
     ErrorCommand,
+    FramingCommand,
     NameCommand,
     PingCommand,
     PositionCommand,
@@ -99,6 +117,23 @@ PING_TIME = 5000
 PING_TIMEOUT_MULTIPLIER = 5
 PING_TIMEOUT_MS = PING_TIME * PING_TIMEOUT_MULTIPLIER
 
+# The header of a frame when using compact framing: the length of the payload
+# and a set of flags.
+FRAME_HEADER = struct.Struct("!IB")
+
+# Flag set on frames whose payload has been compressed.
+FRAME_FLAG_COMPRESSED = 0x01
+
+# The largest frame payload we'll send or accept.
+MAX_FRAME_LENGTH = 64 * 1024 * 1024
+
+# How many bytes of RDATA/POSITION commands we'll batch up before sending a
+# frame without waiting to return to the reactor.
+FRAME_BATCH_BYTES = 64 * 1024
+
+# Frames with payloads smaller than this aren't worth compressing.
+MIN_COMPRESS_LENGTH = 256
+
 
 class ConnectionStates(object):
     CONNECTING = "connecting"
@@ -151,6 +186,20 @@ class BaseReplicationStreamProtocol(LineOnlyReceiver):
         self.inbound_commands_counter = defaultdict(int)
         self.outbound_commands_counter = defaultdict(int)
 
+        # Whether the remote is sending us length-prefixed frames rather than
+        # lines, and the buffer of data received from it if so.
+        self._framed_inbound = False
+        self._frame_buffer = bytearray()
+        self._decompressor = None
+
+        # Whether we're sending length-prefixed frames rather than lines, and
+        # the encoded commands waiting to be sent in the next frame if so.
+        self._framed_outbound = False
+        self._pending_frame = []
+        self._pending_frame_length = 0
+        self._frame_flush_scheduled = False
+        self._compressor = None
+
     def connectionMade(self):
         logger.info("[%s] Connection established", self.id())
 
@@ -196,6 +245,62 @@ class BaseReplicationStreamProtocol(LineOnlyReceiver):
                 )
                 self.send_error("ping timeout")
 
+    def dataReceived(self, data):
+        """Called when we've received some data. Overrides LineOnlyReceiver so
+        that we can switch from lines to frames part way through the data.
+        """
+        if not self._framed_inbound:
+            lines = (self._buffer + data).split(self.delimiter)
+            self._buffer = lines.pop(-1)
+            for idx, line in enumerate(lines):
+                if self.transport.disconnecting:
+                    return
+                if len(line) > self.MAX_LENGTH:
+                    return self.lineLengthExceeded(line)
+
+                self.lineReceived(line)
+
+                if self._framed_inbound:
+                    # Everything after that line is framed.
+                    data = self.delimiter.join(lines[idx + 1 :] + [self._buffer])
+                    self._buffer = b""
+                    break
+            else:
+                if len(self._buffer) > self.MAX_LENGTH:
+                    return self.lineLengthExceeded(self._buffer)
+                return
+
+        self._frame_data_received(data)
+
+    def _frame_data_received(self, data):
+        """Called with data received from the remote once it has switched to
+        compact framing.
+        """
+        buf = self._frame_buffer
+        buf.extend(data)
+
+        while len(buf) >= FRAME_HEADER.size:
+            if self.transport.disconnecting:
+                return
+
+            length, flags = FRAME_HEADER.unpack_from(buf)
+            if length > MAX_FRAME_LENGTH:
+                self.send_error("frame too long (%d > %d)", length, MAX_FRAME_LENGTH)
+                return
+
+            end = FRAME_HEADER.size + length
+            if len(buf) < end:
+                return
+
+            payload = bytes(buf[FRAME_HEADER.size : end])
+            del buf[:end]
+
+            if flags & FRAME_FLAG_COMPRESSED:
+                payload = self._decompressor.decompress(payload)
+
+            for line in payload.split(self.delimiter):
+                self.lineReceived(line)
+
     def lineReceived(self, line):
         """Called when we've received a line
         """
@@ -281,22 +386,83 @@ class BaseReplicationStreamProtocol(LineOnlyReceiver):
         self.outbound_commands_counter[cmd.NAME] = (
             self.outbound_commands_counter[cmd.NAME] + 1
         )
-        string = "%s %s" % (cmd.NAME, cmd.to_line())
-        if "\n" in string:
-            raise Exception("Unexpected newline in command: %r", string)
+        encoded_string = cmd.to_bytes()
 
-        encoded_string = string.encode("utf-8")
-
-        if len(encoded_string) > self.MAX_LENGTH:
+        max_length = MAX_FRAME_LENGTH if self._framed_outbound else self.MAX_LENGTH
+        if len(encoded_string) > max_length:
             raise Exception(
                 "Failed to send command %s as too long (%d > %d)"
-                % (cmd.NAME, len(encoded_string), self.MAX_LENGTH)
+                % (cmd.NAME, len(encoded_string), max_length)
             )
 
-        self.sendLine(encoded_string)
+        if self._framed_outbound:
+            self._add_to_frame(cmd, encoded_string)
+        else:
+            self.sendLine(encoded_string)
 
         self.last_sent_command = self.clock.time_msec()
 
+    def _add_to_frame(self, cmd, encoded_string):
+        """Adds an encoded command to the next frame to be sent.
+
+        RDATA and POSITION commands are batched up until we next return to the
+        reactor; anything else causes the frame to be sent straight away.
+        """
+        self._pending_frame.append(encoded_string)
+        self._pending_frame_length += len(encoded_string) + 1
+
+        if (
+            isinstance(cmd, (RdataCommand, PositionCommand))
+            and self._pending_frame_length < FRAME_BATCH_BYTES
+        ):
+            if not self._frame_flush_scheduled:
+                self._frame_flush_scheduled = True
+                self.clock.call_later(0, self._send_frame)
+            return
+
+        self._send_frame()
+
+    def _send_frame(self):
+        """Sends any commands waiting to go out in a frame
+        """
+        self._frame_flush_scheduled = False
+
+        pending = self._pending_frame
+        self._pending_frame = []
+        self._pending_frame_length = 0
+
+        if not pending or self.state == ConnectionStates.CLOSED:
+            return
+
+        payload = self.delimiter.join(pending)
+        flags = 0
+
+        if self._compressor and len(payload) >= MIN_COMPRESS_LENGTH:
+            payload = self._compressor.compress(payload) + self._compressor.flush(
+                zlib.Z_SYNC_FLUSH
+            )
+            flags |= FRAME_FLAG_COMPRESSED
+
+        self.transport.write(FRAME_HEADER.pack(len(payload), flags) + payload)
+
+    def _start_outbound_framing(self, mode):
+        """Switch to sending frames rather than lines
+
+        Args:
+            mode (str): one of FRAMING_MODES
+        """
+        logger.info("[%s] Switching to %s framing", self.id(), mode)
+        self._framed_outbound = True
+        if mode == "compressed":
+            self._compressor = zlib.compressobj()
+
+    def _start_inbound_framing(self):
+        """Switch to expecting frames rather than lines from the remote
+        """
+        logger.info("[%s] Remote switched to compact framing", self.id())
+        self._framed_inbound = True
+        self._decompressor = zlib.decompressobj()
+
     def _queue_command(self, cmd):
         """Queue the command until the connection is ready to write to again.
         """
@@ -374,6 +540,7 @@ class BaseReplicationStreamProtocol(LineOnlyReceiver):
 
         self.state = ConnectionStates.CLOSED
         self.pending_commands = []
+        self._pending_frame = []
 
         if self.transport:
             self.transport.unregisterProducer()
@@ -448,6 +615,21 @@ class ServerReplicationStreamProtocol(BaseReplicationStreamProtocol):
         else:
             return self.subscribe_to_stream(stream_name, token)
 
+    def on_FRAMING(self, cmd):
+        mode = cmd.data
+        if mode not in FRAMING_MODES:
+            self.send_error("unknown framing mode %s", mode)
+            return
+
+        if self._framed_outbound:
+            self.send_error("framing already changed")
+            return
+
+        # The acknowledgement is the last line we send, so it needs to go out
+        # now rather than being queued up behind any buffered commands.
+        self.send_command(FramingCommand(mode), do_buffer=False)
+        self._start_outbound_framing(mode)
+
     def on_FEDERATION_ACK(self, cmd):
         return self.streamer.federation_ack(cmd.token)
 
@@ -479,15 +661,19 @@ class ServerReplicationStreamProtocol(BaseReplicationStreamProtocol):
         self.connecting_streams.add(stream_name)
 
         try:
-            # Get missing updates
-            updates, current_token = yield self.streamer.get_stream_updates(
-                stream_name, token
-            )
+            # Get missing updates, a page at a time if the client is a long
+            # way behind.
+            limited = True
+            while limited:
+                updates, current_token, limited = yield self.streamer.get_stream_updates(
+                    stream_name, token
+                )
+
+                # Send all the missing updates
+                for update in updates:
+                    self._send_rdata(RdataCommand(stream_name, update[0], update[1]))
 
-            # Send all the missing updates
-            for update in updates:
-                token, row = update[0], update[1]
-                self.send_command(RdataCommand(stream_name, token, row))
+                token = current_token
 
             # We send a POSITION command to ensure that they have an up to
             # date token (especially useful if we didn't send any updates
@@ -521,7 +707,7 @@ class ServerReplicationStreamProtocol(BaseReplicationStreamProtocol):
                 # Send all updates that are part of this batch with the
                 # found token
                 for update in updates:
-                    self.send_command(RdataCommand(stream_name, token, update))
+                    self._send_rdata(RdataCommand(stream_name, token, update))
 
                 # Clear stored updates
                 updates = []
@@ -534,21 +720,36 @@ class ServerReplicationStreamProtocol(BaseReplicationStreamProtocol):
         finally:
             self.connecting_streams.discard(stream_name)
 
-    def stream_update(self, stream_name, token, data):
+    def stream_update(self, cmd):
         """Called when a new update is available to stream to clients.
 
         We need to check if the client is interested in the stream or not
+
+        Args:
+            cmd (RdataCommand): the update. The same command is passed to every
+                connection, so that it only gets serialised once.
         """
+        stream_name = cmd.stream_name
         if stream_name in self.replication_streams:
             # The client is subscribed to the stream
-            self.send_command(RdataCommand(stream_name, token, data))
+            self._send_rdata(cmd)
         elif stream_name in self.connecting_streams:
             # The client is being subscribed to the stream
-            logger.debug("[%s] Queuing RDATA %r %r", self.id(), stream_name, token)
-            self.pending_rdata.setdefault(stream_name, []).append((token, data))
+            logger.debug("[%s] Queuing RDATA %r %r", self.id(), stream_name, cmd.token)
+            self.pending_rdata.setdefault(stream_name, []).append((cmd.token, cmd.row))
         else:
             # The client isn't subscribed
-            logger.debug("[%s] Dropping RDATA %r %r", self.id(), stream_name, token)
+            logger.debug("[%s] Dropping RDATA %r %r", self.id(), stream_name, cmd.token)
+
+    def _send_rdata(self, cmd):
+        """Sends an RDATA command, recording how many bytes were sent for the
+        stream.
+
+        Args:
+            cmd (RdataCommand)
+        """
+        self.send_command(cmd)
+        rdata_bytes_sent_counter.labels(cmd.stream_name).inc(len(cmd.to_bytes()))
 
     def send_sync(self, data):
         self.send_command(SyncCommand(data))
@@ -562,12 +763,23 @@ class ClientReplicationStreamProtocol(BaseReplicationStreamProtocol):
     VALID_INBOUND_COMMANDS = VALID_SERVER_COMMANDS
     VALID_OUTBOUND_COMMANDS = VALID_CLIENT_COMMANDS
 
-    def __init__(self, client_name, server_name, clock, handler):
+    def __init__(self, client_name, server_name, clock, handler, framing=None):
+        """
+        Args:
+            client_name (str): the name we give to the server
+            server_name (str): the server name of the server we expect to be
+                talking to
+            clock (synapse.util.Clock)
+            handler (ReplicationClientHandler)
+            framing (str|None): one of FRAMING_MODES to ask the server to use
+                compact framing, or None to use lines.
+        """
         BaseReplicationStreamProtocol.__init__(self, clock)
 
         self.client_name = client_name
         self.server_name = server_name
         self.handler = handler
+        self.framing = framing
 
         # Set of stream names that have been subscribe to, but haven't yet
         # caught up with. This is used to track when the client has been fully
@@ -580,6 +792,8 @@ class ClientReplicationStreamProtocol(BaseReplicationStreamProtocol):
 
     def connectionMade(self):
         self.send_command(NameCommand(self.client_name))
+        if self.framing:
+            self.send_command(FramingCommand(self.framing))
         BaseReplicationStreamProtocol.connectionMade(self)
 
         # Once we've connected subscribe to the necessary streams
@@ -605,6 +819,18 @@ class ClientReplicationStreamProtocol(BaseReplicationStreamProtocol):
             logger.error("[%s] Connected to wrong remote: %r", self.id(), cmd.data)
             self.send_error("Wrong remote")
 
+    def on_FRAMING(self, cmd):
+        if cmd.data != self.framing:
+            logger.error(
+                "[%s] Remote switched to wrong framing: %r", self.id(), cmd.data
+            )
+            self.send_error("Unexpected framing")
+            return
+
+        # This gets called synchronously from lineReceived, so anything after
+        # this command in the received data will be parsed as frames.
+        self._start_inbound_framing()
+
     def on_RDATA(self, cmd):
         stream_name = cmd.stream_name
         inbound_rdata_count.labels(stream_name).inc()
@@ -663,6 +889,10 @@ class ClientReplicationStreamProtocol(BaseReplicationStreamProtocol):
 
 # The following simply registers metrics for the replication connections
 
+rdata_bytes_sent_counter = Counter(
+    "synapse_replication_tcp_protocol_rdata_bytes_sent", "", ["stream_name"]
+)
+
 pending_commands = LaterGauge(
     "synapse_replication_tcp_protocol_pending_commands",
     "",
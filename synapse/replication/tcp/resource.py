@@ -29,6 +29,7 @@ from synapse.metrics import LaterGauge
 from synapse.metrics.background_process_metrics import run_as_background_process
 from synapse.util.metrics import Measure, measure_func
 
+from .commands import RdataCommand
 from .protocol import ServerReplicationStreamProtocol
 from .streams import STREAMS_MAP
 from .streams.federation import FederationStream
@@ -36,6 +37,9 @@ from .streams.federation import FederationStream
 stream_updates_counter = Counter(
     "synapse_replication_tcp_resource_stream_updates", "", ["stream_name"]
 )
+stream_encode_time_counter = Counter(
+    "synapse_replication_tcp_resource_stream_encode_seconds", "", ["stream_name"]
+)
 user_sync_counter = Counter("synapse_replication_tcp_resource_user_sync", "")
 federation_ack_counter = Counter("synapse_replication_tcp_resource_federation_ack", "")
 remove_pusher_counter = Counter("synapse_replication_tcp_resource_remove_pusher", "")
@@ -195,11 +199,16 @@ class ReplicationStreamer(object):
                             stream.upto_token,
                         )
                         try:
-                            updates, current_token = yield stream.get_updates()
+                            updates, current_token, limited = yield stream.get_updates()
                         except Exception:
                             logger.info("Failed to handle stream %s", stream.NAME)
                             raise
 
+                        if limited:
+                            # There are more updates to fetch, so make sure we
+                            # go round the loop again.
+                            self.pending_updates = True
+
                         logger.debug(
                             "Sending %d updates to %d connections",
                             len(updates),
@@ -219,10 +228,26 @@ class ReplicationStreamer(object):
                         # token. See RdataCommand for more details.
                         batched_updates = _batch_updates(updates)
 
+                        # Each update is serialised once here, and the encoded
+                        # line is then shared between all the connections.
+                        start = self.clock.time()
+                        commands = []
+                        for token, row in batched_updates:
+                            cmd = RdataCommand(stream.NAME, token, row)
+                            try:
+                                cmd.to_bytes()
+                            except Exception:
+                                logger.exception("Failed to encode update")
+                                continue
+                            commands.append(cmd)
+                        stream_encode_time_counter.labels(stream.NAME).inc(
+                            self.clock.time() - start
+                        )
+
                         for conn in self.connections:
-                            for token, row in batched_updates:
+                            for cmd in commands:
                                 try:
-                                    conn.stream_update(stream.NAME, token, row)
+                                    conn.stream_update(cmd)
                                 except Exception:
                                     logger.exception("Failed to replicate")
 
@@ -17,15 +17,29 @@
 
 import itertools
 import logging
-from collections import namedtuple
+from collections import deque, namedtuple
+
+from prometheus_client import Counter
 
 from twisted.internet import defer
 
 logger = logging.getLogger(__name__)
 
 
+# The maximum number of updates we'll fetch from the database at once when a
+# client is catching up. Clients further behind than this get sent the updates
+# in pages.
 MAX_EVENTS_BEHIND = 10000
 
+# The number of recent updates to keep in memory for each stream, so that
+# clients which are only a little behind can catch up without hitting the
+# database.
+RECENT_UPDATES_SIZE = 10000
+
+catchup_counter = Counter(
+    "synapse_replication_tcp_stream_catchup", "", ["stream_name", "source"]
+)
+
 BackfillStreamRow = namedtuple(
     "BackfillStreamRow",
     (
@@ -130,6 +144,11 @@ class Stream(object):
         # The token that we will get updates up to
         self.upto_token = self.current_token()
 
+        # The most recent (token, row) updates returned by get_updates. This
+        # holds every update after `_recent_updates_from` up to `last_token`.
+        self._recent_updates = deque()
+        self._recent_updates_from = self.last_token
+
     def advance_current_token(self):
         """Updates `upto_token` to "now", which updates up until which point
         get_updates[_since] will fetch rows till.
@@ -143,6 +162,9 @@ class Stream(object):
         self.upto_token = self.current_token()
         self.last_token = self.upto_token
 
+        self._recent_updates.clear()
+        self._recent_updates_from = self.last_token
+
     @defer.inlineCallbacks
     def get_updates(self):
         """Gets all updates since the last time this function was called (or
@@ -150,55 +172,124 @@ class Stream(object):
         until the `upto_token`
 
         Returns:
-            Deferred[Tuple[List[Tuple[int, Any]], int]:
-                Resolves to a pair ``(updates, current_token)``, where ``updates`` is a
-                list of ``(token, row)`` entries. ``row`` will be json-serialised and
-                sent over the replication steam.
+            Deferred[Tuple[List[Tuple[int, Any]], int, bool]:
+                Resolves to a tuple ``(updates, current_token, limited)``, where
+                ``updates`` is a list of ``(token, row)`` entries. ``row`` will be
+                json-serialised and sent over the replication steam. If
+                ``limited`` is True then there are more updates to fetch after
+                ``current_token``.
         """
-        updates, current_token = yield self.get_updates_since(self.last_token)
+        updates, current_token, limited = yield self._fetch_updates(
+            self.last_token, self.upto_token
+        )
         self.last_token = current_token
+        self._add_recent_updates(updates)
 
-        return (updates, current_token)
+        return (updates, current_token, limited)
 
     @defer.inlineCallbacks
     def get_updates_since(self, from_token):
         """Like get_updates except allows specifying from when we should
         stream updates
 
+        Recent updates are served from memory. The returned token may then be
+        behind `upto_token`: the rest of the updates will be sent to the client
+        with the next call to `get_updates`.
+
         Returns:
-            Deferred[Tuple[List[Tuple[int, Any]], int]:
-                Resolves to a pair ``(updates, current_token)``, where ``updates`` is a
-                list of ``(token, row)`` entries. ``row`` will be json-serialised and
-                sent over the replication steam.
+            Deferred[Tuple[List[Tuple[int, Any]], int, bool]:
+                Resolves to a tuple ``(updates, current_token, limited)``, where
+                ``updates`` is a list of ``(token, row)`` entries. ``row`` will be
+                json-serialised and sent over the replication steam. If
+                ``limited`` is True then the client is a long way behind and
+                should ask again for the updates after ``current_token``.
         """
         if from_token in ("NOW", "now"):
-            return ([], self.upto_token)
+            return ([], self.upto_token, False)
 
         current_token = self.upto_token
 
         from_token = int(from_token)
 
         if from_token == current_token:
-            return ([], current_token)
+            return ([], current_token, False)
 
-        if self._LIMITED:
-            rows = yield self.update_function(
-                from_token, current_token, limit=MAX_EVENTS_BEHIND + 1
-            )
+        if self._recent_updates_from <= from_token <= self.last_token:
+            catchup_counter.labels(self.NAME, "memory").inc()
+            updates = [u for u in self._recent_updates if u[0] > from_token]
+            return (updates, self.last_token, False)
 
-            # never turn more than MAX_EVENTS_BEHIND + 1 into updates.
-            rows = itertools.islice(rows, MAX_EVENTS_BEHIND + 1)
-        else:
-            rows = yield self.update_function(from_token, current_token)
+        catchup_counter.labels(self.NAME, "db").inc()
+        result = yield self._fetch_updates(from_token, current_token)
+        return result
+
+    def _add_recent_updates(self, updates):
+        """Adds updates returned by get_updates to the in-memory cache of recent
+        updates, evicting the oldest ones if necessary.
+        """
+        recent_updates = self._recent_updates
+        recent_updates.extend(updates)
+
+        if len(recent_updates) > RECENT_UPDATES_SIZE:
+            while len(recent_updates) > RECENT_UPDATES_SIZE:
+                self._recent_updates_from = recent_updates.popleft()[0]
+
+            # Don't keep half of a batch of updates which share a token.
+            while recent_updates and recent_updates[0][0] == self._recent_updates_from:
+                recent_updates.popleft()
+
+        if not recent_updates:
+            self._recent_updates_from = self.last_token
+
+    @defer.inlineCallbacks
+    def _fetch_updates(self, from_token, to_token):
+        """Fetches updates between the two tokens from the underlying store. If
+        the stream is limited then at most MAX_EVENTS_BEHIND updates are
+        returned.
+
+        Returns:
+            Deferred[Tuple[List[Tuple[int, Any]], int, bool]]: as get_updates
+        """
+        if from_token == to_token:
+            return ([], to_token, False)
+
+        if not self._LIMITED:
+            rows = yield self.update_function(from_token, to_token)
+            return ([(row[0], row[1:]) for row in rows], to_token, False)
+
+        rows, upper_token = yield self._get_updates_page(
+            from_token, to_token, MAX_EVENTS_BEHIND
+        )
+        if upper_token < to_token and not rows:
+            # the page was truncated, and every row in it shared a token, so
+            # we can't make any progress.
+            raise Exception("stream %s has fallen behind" % (self.NAME))
 
         updates = [(row[0], row[1:]) for row in rows]
+        return (updates, upper_token, upper_token < to_token)
+
+    @defer.inlineCallbacks
+    def _get_updates_page(self, from_token, to_token, limit):
+        """Gets a page of rows from update_function.
+
+        Assumes that update_function returns rows in token order. If we get
+        `limit` or more rows then we can only be sure that we have all the rows
+        with tokens before that of the `limit`th row, as some streams have many
+        rows per token.
+
+        Returns:
+            Deferred[Tuple[List[tuple], int]]: the rows, and the token up to
+                which they are complete.
+        """
+        rows = yield self.update_function(from_token, to_token, limit=limit)
 
-        # check we didn't get more rows than the limit.
         # doing it like this allows the update_function to be a generator.
-        if self._LIMITED and len(updates) >= MAX_EVENTS_BEHIND:
-            raise Exception("stream %s has fallen behind" % (self.NAME))
+        rows = list(itertools.islice(rows, limit))
+        if len(rows) < limit:
+            return (rows, to_token)
 
-        return (updates, current_token)
+        upper_token = rows[-1][0] - 1
+        return ([row for row in rows if row[0] <= upper_token], upper_token)
 
     def current_token(self):
         """Gets the current token of the underlying streams. Should be provided
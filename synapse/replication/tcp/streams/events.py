@@ -136,6 +136,42 @@ class EventsStream(Stream):
 
         return all_updates
 
+    @defer.inlineCallbacks
+    def _get_updates_page(self, from_token, to_token, limit):
+        """Overrides Stream._get_updates_page, as the rows come from two
+        separately limited queries.
+        """
+        event_rows = yield self._store.get_all_new_forward_event_rows(
+            from_token, to_token, limit
+        )
+        state_rows = yield self._store.get_all_updated_current_state_deltas(
+            from_token, to_token, limit
+        )
+
+        upper_token = to_token
+        if len(event_rows) >= limit:
+            # the first `limit` rows are ordered, and all the events up to the
+            # last of them have been returned. There may be more rows after
+            # that for events which are no longer outliers.
+            upper_token = min(upper_token, event_rows[limit - 1][0])
+        if len(state_rows) >= limit:
+            # there may be more state rows with the same stream ID as the last
+            upper_token = min(upper_token, state_rows[-1][0] - 1)
+
+        rows = [
+            (row[0], EventsStreamEventRow.TypeId, row[1:])
+            for row in event_rows
+            if row[0] <= upper_token
+        ]
+        rows.extend(
+            (row[0], EventsStreamCurrentStateRow.TypeId, row[1:])
+            for row in state_rows
+            if row[0] <= upper_token
+        )
+        rows.sort(key=lambda row: row[0])
+
+        return (rows, upper_token)
+
     @classmethod
     def parse_row(cls, row):
         (typ, data) = row
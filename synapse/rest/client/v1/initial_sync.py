@@ -23,6 +23,7 @@ from synapse.streams.config import PaginationConfig
 # TODO: Needs unit testing
 class InitialSyncRestServlet(RestServlet):
     PATTERNS = client_patterns("/initialSync$", v1=True)
+    ENCODE_RESPONSES_IN_THREADPOOL = True
 
     def __init__(self, hs):
         super(InitialSyncRestServlet, self).__init__()
@@ -537,6 +537,7 @@ class RoomStateRestServlet(RestServlet):
 # TODO: Needs unit testing
 class RoomInitialSyncRestServlet(RestServlet):
     PATTERNS = client_patterns("/rooms/(?P<room_id>[^/]*)/initialSync$", v1=True)
+    ENCODE_RESPONSES_IN_THREADPOOL = True
 
     def __init__(self, hs):
         super(RoomInitialSyncRestServlet, self).__init__()
@@ -20,6 +20,7 @@ import random
 import sys
 import threading
 import time
+from collections import OrderedDict
 
 from six import PY2, iteritems, iterkeys, itervalues
 from six.moves import builtins, intern, range
@@ -82,6 +83,11 @@ UNIQUE_INDEX_BACKGROUND_UPDATES = {
 # based on the current state when notifying workers over replication.
 _CURRENT_STATE_CACHE_NAME = "cs_cache_fake"
 
+# Special cache name used for invalidating many keys of a single cache in one
+# row of the cache invalidation stream. The keys of the row are the name of the
+# cache, the number of parts in each key, and then the flattened key tuples.
+_BULK_CACHE_NAME = "bulk_cache_fake"
+
 
 class LoggingTransaction(object):
     """An object that almost-transparently proxies for the 'txn' object
@@ -1382,6 +1388,41 @@ class SQLBaseStore(object):
         txn.call_after(cache_func.invalidate, keys)
         self._send_invalidation_to_replication(txn, cache_func.__name__, keys)
 
+    def _invalidate_cache_and_stream_bulk(self, txn, cache_func, key_tuples):
+        """Like _invalidate_cache_and_stream, but for invalidating many keys of
+        the same cache.
+
+        Duplicate keys are dropped, and the invalidations are sent down
+        replication in as few rows as possible.
+
+        Args:
+            txn
+            cache_func (func): the cached function
+            key_tuples (iterable[tuple[str]]): the keys to invalidate. Each key
+                must have the same number of parts.
+        """
+        key_tuples = list(OrderedDict.fromkeys(tuple(k) for k in key_tuples))
+        if not key_tuples:
+            return
+
+        for keys in key_tuples:
+            txn.call_after(cache_func.invalidate, keys)
+
+        if len(key_tuples) == 1:
+            self._send_invalidation_to_replication(
+                txn, cache_func.__name__, key_tuples[0]
+            )
+            return
+
+        # As with _invalidate_state_caches_and_stream, we keep to about 50 strings
+        # per row so that the rows fit in a replication line.
+        key_length = len(key_tuples[0])
+        for chunk in batch_iter(key_tuples, max(1, 50 // key_length)):
+            keys = itertools.chain(
+                [cache_func.__name__, str(key_length)], itertools.chain(*chunk)
+            )
+            self._send_invalidation_to_replication(txn, _BULK_CACHE_NAME, keys)
+
     def _invalidate_state_caches_and_stream(self, txn, room_id, members_changed):
         """Special case invalidation of caches based on current state.
 
@@ -1421,6 +1462,41 @@ class SQLBaseStore(object):
         self._attempt_to_invalidate_cache("get_room_summary", (room_id,))
         self._attempt_to_invalidate_cache("get_current_state_ids", (room_id,))
 
+    def _process_cache_invalidation_rows(self, rows):
+        """Invalidates the caches named in a batch of rows from the cache
+        invalidation stream, without streaming the invalidations.
+
+        The rows are merged first, so that each cache key is only invalidated
+        once, and the current state caches for each room are only invalidated
+        once.
+
+        Args:
+            rows (iterable[CachesStreamRow])
+        """
+        # map from room_id to the members which have changed in that room
+        state_changes = OrderedDict()
+        # (cache_name, key) pairs to invalidate
+        invalidations = OrderedDict()
+
+        for row in rows:
+            if row.cache_func == _CURRENT_STATE_CACHE_NAME:
+                room_id = row.keys[0]
+                state_changes.setdefault(room_id, set()).update(row.keys[1:])
+            elif row.cache_func == _BULK_CACHE_NAME:
+                cache_name, key_length = row.keys[0], int(row.keys[1])
+                flattened = row.keys[2:]
+                for i in range(0, len(flattened), key_length):
+                    key = tuple(flattened[i : i + key_length])
+                    invalidations[(cache_name, key)] = None
+            else:
+                invalidations[(row.cache_func, tuple(row.keys))] = None
+
+        for room_id, members_changed in iteritems(state_changes):
+            self._invalidate_state_caches(room_id, members_changed)
+
+        for cache_name, key in invalidations:
+            self._attempt_to_invalidate_cache(cache_name, key)
+
     def _attempt_to_invalidate_cache(self, cache_name, key):
         """Attempts to invalidate the cache of the given name, ignoring if the
         cache doesn't exist. Mainly used for invalidating caches on workers,
@@ -27,10 +27,8 @@ from ._base import Cache
 
 logger = logging.getLogger(__name__)
 
-# Number of msec of granularity to store the user IP 'last seen' time. Smaller
-# times give more inserts into the database even for readonly API hits
-# 120 seconds == 2 minutes
-LAST_SEEN_GRANULARITY = 120 * 1000
+# The maximum number of client IP updates we buffer before writing them out.
+MAX_PENDING_CLIENT_IP_UPDATES = 10000
 
 
 class ClientIpStore(background_updates.BackgroundUpdateStore):
@@ -85,9 +83,14 @@ class ClientIpStore(background_updates.BackgroundUpdateStore):
             "user_ips_drop_nonunique_index", self._remove_user_ip_nonunique
         )
 
+        self._last_seen_granularity = hs.config.client_ip_last_seen_granularity
+
         # (user_id, access_token, ip,) -> (user_agent, device_id, last_seen)
         self._batch_row_update = {}
 
+        # the number of batches which are currently being written out
+        self._client_ip_batches_in_flight = 0
+
         self._client_ip_looper = self._clock.looping_call(
             self._update_client_ips_batch, 5 * 1000
         )
@@ -307,9 +310,22 @@ class ClientIpStore(background_updates.BackgroundUpdateStore):
             last_seen = None
         yield self.populate_monthly_active_users(user_id)
         # Rate-limited inserts
-        if last_seen is not None and (now - last_seen) < LAST_SEEN_GRANULARITY:
+        if last_seen is not None and (now - last_seen) < self._last_seen_granularity:
             return
 
+        if (
+            key not in self._batch_row_update
+            and len(self._batch_row_update) >= MAX_PENDING_CLIENT_IP_UPDATES
+        ):
+            if self._client_ip_batches_in_flight:
+                # the database is falling behind. Rather than buffering without
+                # limit, drop this one: it will be picked up again on the
+                # client's next request.
+                return
+
+            # write out what we have now rather than waiting for the looping call
+            self._update_client_ips_batch()
+
         self.client_ip_last_seen.prefill(key, now)
 
         self._batch_row_update[key] = (user_agent, device_id, now)
@@ -320,43 +336,44 @@ class ClientIpStore(background_updates.BackgroundUpdateStore):
         if not self.hs.get_db_pool().running:
             return
 
+        @defer.inlineCallbacks
         def update():
             to_update = self._batch_row_update
+            if not to_update:
+                return
             self._batch_row_update = {}
-            return self.runInteraction(
-                "_update_client_ips_batch", self._update_client_ips_batch_txn, to_update
-            )
+
+            self._client_ip_batches_in_flight += 1
+            try:
+                yield self.runInteraction(
+                    "_update_client_ips_batch",
+                    self._update_client_ips_batch_txn,
+                    to_update,
+                )
+            finally:
+                self._client_ip_batches_in_flight -= 1
 
         return run_as_background_process("update_client_ips", update)
 
     def _update_client_ips_batch_txn(self, txn, to_update):
-        if "user_ips" in self._unsafe_to_upsert_tables or (
-            not self.database_engine.can_native_upsert
+        # Sorting the rows means that concurrent batches take their row locks
+        # in the same order, so can't deadlock against each other.
+        key_values = []
+        value_values = []
+        for (user_id, access_token, ip), (user_agent, device_id, last_seen) in sorted(
+            to_update.items()
         ):
-            self.database_engine.lock_table(txn, "user_ips")
-
-        for entry in iteritems(to_update):
-            (user_id, access_token, ip), (user_agent, device_id, last_seen) = entry
+            key_values.append((user_id, access_token, ip))
+            value_values.append((user_agent, device_id, last_seen))
 
-            try:
-                self._simple_upsert_txn(
-                    txn,
-                    table="user_ips",
-                    keyvalues={
-                        "user_id": user_id,
-                        "access_token": access_token,
-                        "ip": ip,
-                    },
-                    values={
-                        "user_agent": user_agent,
-                        "device_id": device_id,
-                        "last_seen": last_seen,
-                    },
-                    lock=False,
-                )
-            except Exception as e:
-                # Failed to upsert, log and continue
-                logger.error("Failed to insert client IP %r: %r", entry, e)
+        self._simple_upsert_many_txn(
+            txn,
+            table="user_ips",
+            key_names=("user_id", "access_token", "ip"),
+            key_values=key_values,
+            value_names=("user_agent", "device_id", "last_seen"),
+            value_values=value_values,
+        )
 
     @defer.inlineCallbacks
     def get_last_client_ip_by_device(self, user_id, device_id):
@@ -253,9 +253,11 @@ class EndToEndKeyStore(EndToEndKeyWorkerStore, SQLBaseStore):
             )
             for user_id, device_id, algorithm, key_id in delete:
                 txn.execute(sql, (user_id, device_id, algorithm, key_id))
-                self._invalidate_cache_and_stream(
-                    txn, self.count_e2e_one_time_keys, (user_id, device_id)
-                )
+            self._invalidate_cache_and_stream_bulk(
+                txn,
+                self.count_e2e_one_time_keys,
+                ((user_id, device_id) for user_id, device_id, _, _ in delete),
+            )
             return result
 
         return self.runInteraction("claim_e2e_one_time_keys", _claim_e2e_one_time_keys)
@@ -25,6 +25,7 @@ from twisted.internet import defer
 from synapse.metrics.background_process_metrics import run_as_background_process
 from synapse.storage._base import LoggingTransaction, SQLBaseStore
 from synapse.util.caches.descriptors import cachedInlineCallbacks
+from synapse.util.caches.stream_change_cache import StreamChangeCache
 
 logger = logging.getLogger(__name__)
 
@@ -167,6 +168,64 @@ class EventPushActionsWorkerStore(SQLBaseStore):
 
         return {"notify_count": notify_count, "highlight_count": highlight_count}
 
+    def get_rooms_with_unread_notifications_for_user(self, user_id):
+        """Get the rooms in which the user has had notifications since their
+        last read receipt.
+
+        This is equivalent to calling get_unread_event_push_actions_by_room_for_user
+        for each room the user has a read receipt in, but takes a single query
+        rather than one per room.
+
+        Args:
+            user_id (str)
+
+        Returns:
+            Deferred[list[str]]: the room IDs
+        """
+
+        def _get_rooms_with_unread_notifications_for_user_txn(txn):
+            sql = """
+                SELECT r.room_id FROM receipts_linearized AS r
+                INNER JOIN events AS e USING (room_id, event_id)
+                WHERE r.user_id = ? AND r.receipt_type = 'm.read'
+                AND (
+                    EXISTS (
+                        SELECT 1 FROM event_push_actions AS ea
+                        WHERE ea.user_id = r.user_id AND ea.room_id = r.room_id
+                        AND ea.stream_ordering > e.stream_ordering
+                    )
+                    OR EXISTS (
+                        SELECT 1 FROM event_push_summary AS eps
+                        WHERE eps.user_id = r.user_id AND eps.room_id = r.room_id
+                        AND eps.stream_ordering > e.stream_ordering
+                        AND eps.notif_count > 0
+                    )
+                )
+            """
+            txn.execute(sql, (user_id,))
+            return [r[0] for r in txn]
+
+        return self.runInteraction(
+            "get_rooms_with_unread_notifications_for_user",
+            _get_rooms_with_unread_notifications_for_user_txn,
+        )
+
+    def get_push_action_users_changed_since(self, stream_ordering):
+        """Get the users who may have had push actions added after the given
+        stream ordering, without going to the database.
+
+        Workers don't see individual push actions, so can't answer this and
+        always return None.
+
+        Args:
+            stream_ordering (int)
+
+        Returns:
+            list[str]|None: The users, or None if they aren't known, in which
+            case get_push_action_users_in_range should be used instead.
+        """
+        return None
+
     @defer.inlineCallbacks
     def get_push_action_users_in_range(self, min_stream_ordering, max_stream_ordering):
         def f(txn):
@@ -634,6 +693,17 @@ class EventPushActionsStore(EventPushActionsWorkerStore):
             self._start_rotate_notifs, 30 * 60 * 1000
         )
 
+        # The users who have had push actions added, keyed by stream ordering,
+        # so that the pushers can tell who to poke without hitting the DB.
+        self._push_actions_user_stream_cache = StreamChangeCache(
+            "PushActionsUserChangeCache", self.get_room_max_stream_ordering()
+        )
+
+    def get_push_action_users_changed_since(self, stream_ordering):
+        return self._push_actions_user_stream_cache.get_all_entities_changed(
+            stream_ordering
+        )
+
     def _set_push_actions_for_event_and_users_txn(
         self, txn, events_and_contexts, all_events_and_contexts
     ):
@@ -689,6 +759,11 @@ class EventPushActionsStore(EventPushActionsWorkerStore):
                     self.get_unread_event_push_actions_by_room_for_user.invalidate_many,
                     (event.room_id, uid),
                 )
+                txn.call_after(
+                    self._push_actions_user_stream_cache.entity_has_changed,
+                    uid,
+                    event.internal_metadata.stream_ordering,
+                )
 
         # Now we delete the staging area for *all* events that were being
         # persisted.
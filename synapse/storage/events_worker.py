@@ -33,6 +33,7 @@ from synapse.logging.context import LoggingContext, PreserveLoggingContext
 from synapse.metrics.background_process_metrics import run_as_background_process
 from synapse.types import get_domain_from_id
 from synapse.util import batch_iter
+from synapse.util.caches import intern_string
 from synapse.util.metrics import Measure
 
 from ._base import SQLBaseStore
@@ -495,7 +496,6 @@ class EventsWorkerStore(SQLBaseStore):
             if not allow_rejected and rejected_reason:
                 continue
 
-            d = json.loads(row["json"])
             internal_metadata = json.loads(row["internal_metadata"])
 
             format_version = row["format_version"]
@@ -504,10 +504,16 @@ class EventsWorkerStore(SQLBaseStore):
                 # of a event format version, so it must be a V1 event.
                 format_version = EventFormatVersions.V1
 
-            original_ev = event_type_from_format_version(format_version)(
-                event_dict=d,
+            # We only decode the event JSON once something needs it, as we
+            # often only look at the type, state key or membership.
+            original_ev = event_type_from_format_version(format_version).from_json(
+                row["json"],
+                event_id,
                 internal_metadata_dict=internal_metadata,
                 rejected_reason=rejected_reason,
+                type=row["type"],
+                state_key=row["state_key"],
+                membership=row["membership"],
             )
 
             event_map[event_id] = original_ev
@@ -588,6 +594,14 @@ class EventsWorkerStore(SQLBaseStore):
          * rejected_reason (str|None): if the event was rejected, the reason
            why.
 
+         * type (str|None): the type of the event.
+
+         * state_key (str|None): the state key of the event, if it is a state
+           event.
+
+         * membership (str|None): the membership of the event, if it is a
+           membership event.
+
          * redactions (List[str]): a list of event-ids which (claim to) redact
            this event.
 
@@ -606,22 +620,31 @@ class EventsWorkerStore(SQLBaseStore):
                 " e.internal_metadata,"
                 " e.json,"
                 " e.format_version, "
-                " rej.reason "
+                " rej.reason, "
+                " ev.type,"
+                " s.state_key,"
+                " m.membership"
                 " FROM event_json as e"
+                " LEFT JOIN events as ev USING (event_id)"
                 " LEFT JOIN rejections as rej USING (event_id)"
+                " LEFT JOIN state_events as s USING (event_id)"
+                " LEFT JOIN room_memberships as m USING (event_id)"
                 " WHERE e.event_id IN (%s)"
             ) % (",".join(["?"] * len(evs)),)
 
             txn.execute(sql, evs)
 
             for row in txn:
-                event_id = row[0]
+                event_id = intern_string(row[0])
                 event_dict[event_id] = {
                     "event_id": event_id,
                     "internal_metadata": row[1],
                     "json": row[2],
                     "format_version": row[3],
                     "rejected_reason": row[4],
+                    "type": intern_string(row[5]),
+                    "state_key": intern_string(row[6]),
+                    "membership": intern_string(row[7]),
                     "redactions": [],
                 }
 
@@ -635,7 +658,7 @@ class EventsWorkerStore(SQLBaseStore):
             for (redacter, redacted) in txn:
                 d = event_dict.get(redacted)
                 if d:
-                    d["redactions"].append(redacter)
+                    d["redactions"].append(intern_string(redacter))
 
         return event_dict
 
@@ -654,6 +677,11 @@ class EventsWorkerStore(SQLBaseStore):
             Deferred[EventBase|None]: if the event should be redacted, a pruned
                 event object. Otherwise, None.
         """
+        if not redactions:
+            # Check this first: the type of non-state events isn't known until
+            # their JSON is decoded, which we'd rather put off.
+            return None
+
         if original_ev.type == "m.room.create":
             # we choose to ignore redactions of m.room.create events.
             return None
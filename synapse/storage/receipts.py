@@ -45,6 +45,9 @@ class ReceiptsWorkerStore(SQLBaseStore):
         self._receipts_stream_cache = StreamChangeCache(
             "ReceiptsRoomChangeCache", self.get_max_receipt_stream_id()
         )
+        self._receipts_user_stream_cache = StreamChangeCache(
+            "ReceiptsUserChangeCache", self.get_max_receipt_stream_id()
+        )
 
     @abc.abstractmethod
     def get_max_receipt_stream_id(self):
@@ -285,6 +288,20 @@ class ReceiptsWorkerStore(SQLBaseStore):
             "get_all_updated_receipts", get_all_updated_receipts_txn
         )
 
+    def get_receipt_users_changed_since(self, stream_id):
+        """Get the users who may have sent receipts after the given stream ID,
+        according to the in-memory stream change cache.
+
+        Args:
+            stream_id (int)
+
+        Returns:
+            list[str]|None: The users, or None if the cache doesn't go back far
+            enough, in which case get_all_updated_receipts should be used
+            instead.
+        """
+        return self._receipts_user_stream_cache.get_all_entities_changed(stream_id)
+
     def _invalidate_get_users_with_receipts_in_room(
         self, room_id, receipt_type, user_id
     ):
@@ -381,6 +398,9 @@ class ReceiptsStore(ReceiptsWorkerStore):
         txn.call_after(
             self._receipts_stream_cache.entity_has_changed, room_id, stream_id
         )
+        txn.call_after(
+            self._receipts_user_stream_cache.entity_has_changed, user_id, stream_id
+        )
 
         txn.call_after(
             self.get_last_receipt_event_id_for_user.invalidate,
@@ -82,7 +82,7 @@ class RegistrationWorkerStore(SQLBaseStore):
         is_trial = (now - info["creation_ts"] * 1000) < trial_duration_ms
         return is_trial
 
-    @cached()
+    @cached(max_entries=10000)
     def get_user_by_access_token(self, token):
         """Get a user from the given access token.
 
@@ -945,10 +945,11 @@ class RegistrationStore(
             )
             tokens_and_devices = [(r[0], r[1], r[2]) for r in txn]
 
-            for token, _, _ in tokens_and_devices:
-                self._invalidate_cache_and_stream(
-                    txn, self.get_user_by_access_token, (token,)
-                )
+            self._invalidate_cache_and_stream_bulk(
+                txn,
+                self.get_user_by_access_token,
+                ((token,) for token, _, _ in tokens_and_devices),
+            )
 
             txn.execute("DELETE FROM access_tokens WHERE %s" % where_clause, values)
 
@@ -15,13 +15,16 @@
 
 import logging
 
+from six import iteritems
+
 import attr
 
 from synapse.api.constants import RelationTypes
 from synapse.api.errors import SynapseError
 from synapse.storage._base import SQLBaseStore
 from synapse.storage.stream import generate_pagination_where_clause
-from synapse.util.caches.descriptors import cached, cachedInlineCallbacks
+from synapse.util import batch_iter
+from synapse.util.caches.descriptors import cached, cachedInlineCallbacks, cachedList
 
 logger = logging.getLogger(__name__)
 
@@ -218,6 +221,108 @@ class RelationsWorkerStore(SQLBaseStore):
             "get_recent_references_for_event", _get_recent_references_for_event_txn
         )
 
+    @cachedList(cached_method_name="get_relations_for_event", list_name="event_ids")
+    def get_relations_for_events(
+        self,
+        event_ids,
+        relation_type=None,
+        event_type=None,
+        aggregation_key=None,
+        limit=5,
+        direction="b",
+        from_token=None,
+        to_token=None,
+    ):
+        """Bulk version of `get_relations_for_event`, which takes the same
+        arguments but for a list of event IDs.
+
+        Returns:
+            Deferred[dict[str, PaginationChunk]]: Map from event ID to the
+            relations for that event.
+        """
+
+        where_clause = []
+        where_args = []
+
+        if relation_type is not None:
+            where_clause.append("relation_type = ?")
+            where_args.append(relation_type)
+
+        if event_type is not None:
+            where_clause.append("type = ?")
+            where_args.append(event_type)
+
+        if aggregation_key:
+            where_clause.append("aggregation_key = ?")
+            where_args.append(aggregation_key)
+
+        pagination_clause = generate_pagination_where_clause(
+            direction=direction,
+            column_names=("topological_ordering", "stream_ordering"),
+            from_token=attr.astuple(from_token) if from_token else None,
+            to_token=attr.astuple(to_token) if to_token else None,
+            engine=self.database_engine,
+        )
+
+        if pagination_clause:
+            where_clause.append(pagination_clause)
+
+        if direction == "b":
+            order = "DESC"
+        else:
+            order = "ASC"
+
+        def _get_relations_for_events_txn(txn):
+            # We can't LIMIT per event in SQL (at least, not on all the
+            # databases we support), so we fetch all the rows and only keep
+            # the first `limit + 1` for each event.
+            rows_by_event = {event_id: [] for event_id in event_ids}
+
+            for chunk in batch_iter(event_ids, 100):
+                clauses = ["relates_to_id IN (%s)" % (",".join("?" for _ in chunk),)]
+                clauses.extend(where_clause)
+
+                sql = """
+                    SELECT relates_to_id, event_id, topological_ordering,
+                        stream_ordering
+                    FROM event_relations
+                    INNER JOIN events USING (event_id)
+                    WHERE %s
+                    ORDER BY topological_ordering %s, stream_ordering %s
+                """ % (
+                    " AND ".join(clauses),
+                    order,
+                    order,
+                )
+
+                txn.execute(sql, list(chunk) + where_args)
+                for relates_to_id, event_id, topo, stream in txn:
+                    rows = rows_by_event[relates_to_id]
+                    if len(rows) <= limit:
+                        rows.append((event_id, topo, stream))
+
+            results = {}
+            for event_id, rows in iteritems(rows_by_event):
+                next_batch = None
+                if len(rows) > limit:
+                    _, last_topo_id, last_stream_id = rows[-1]
+                    if last_topo_id and last_stream_id:
+                        next_batch = RelationPaginationToken(
+                            last_topo_id, last_stream_id
+                        )
+
+                results[event_id] = PaginationChunk(
+                    chunk=[{"event_id": row[0]} for row in rows[:limit]],
+                    next_batch=next_batch,
+                    prev_batch=from_token,
+                )
+
+            return results
+
+        return self.runInteraction(
+            "get_relations_for_events", _get_relations_for_events_txn
+        )
+
     @cached(tree=True)
     def get_aggregation_groups_for_event(
         self,
@@ -312,6 +417,103 @@ class RelationsWorkerStore(SQLBaseStore):
             "get_aggregation_groups_for_event", _get_aggregation_groups_for_event_txn
         )
 
+    @cachedList(
+        cached_method_name="get_aggregation_groups_for_event", list_name="event_ids"
+    )
+    def get_aggregation_groups_for_events(
+        self,
+        event_ids,
+        event_type=None,
+        limit=5,
+        direction="b",
+        from_token=None,
+        to_token=None,
+    ):
+        """Bulk version of `get_aggregation_groups_for_event`, which takes the
+        same arguments but for a list of event IDs.
+
+        Returns:
+            Deferred[dict[str, PaginationChunk]]: Map from event ID to the
+            annotation groups for that event.
+        """
+
+        where_clause = ["relation_type = ?"]
+        where_args = [RelationTypes.ANNOTATION]
+
+        if event_type:
+            where_clause.append("type = ?")
+            where_args.append(event_type)
+
+        having_clause = generate_pagination_where_clause(
+            direction=direction,
+            column_names=("COUNT(*)", "MAX(stream_ordering)"),
+            from_token=attr.astuple(from_token) if from_token else None,
+            to_token=attr.astuple(to_token) if to_token else None,
+            engine=self.database_engine,
+        )
+
+        if direction == "b":
+            order = "DESC"
+        else:
+            order = "ASC"
+
+        if having_clause:
+            having_clause = "HAVING " + having_clause
+        else:
+            having_clause = ""
+
+        def _get_aggregation_groups_for_events_txn(txn):
+            # As with `get_relations_for_events`, we apply the limit for each
+            # event as we read the rows.
+            rows_by_event = {event_id: [] for event_id in event_ids}
+
+            for chunk in batch_iter(event_ids, 100):
+                clauses = ["relates_to_id IN (%s)" % (",".join("?" for _ in chunk),)]
+                clauses.extend(where_clause)
+
+                sql = """
+                    SELECT relates_to_id, type, aggregation_key,
+                        COUNT(DISTINCT sender), MAX(stream_ordering)
+                    FROM event_relations
+                    INNER JOIN events USING (event_id)
+                    WHERE {where_clause}
+                    GROUP BY relates_to_id, relation_type, type, aggregation_key
+                    {having_clause}
+                    ORDER BY COUNT(*) {order}, MAX(stream_ordering) {order}
+                """.format(
+                    where_clause=" AND ".join(clauses),
+                    order=order,
+                    having_clause=having_clause,
+                )
+
+                txn.execute(sql, list(chunk) + where_args)
+                for relates_to_id, typ, key, count, stream in txn:
+                    rows = rows_by_event[relates_to_id]
+                    if len(rows) <= limit:
+                        rows.append((typ, key, count, stream))
+
+            results = {}
+            for event_id, rows in iteritems(rows_by_event):
+                next_batch = None
+                if len(rows) > limit:
+                    _, _, count, stream = rows[-1]
+                    next_batch = AggregationPaginationToken(count, stream)
+
+                results[event_id] = PaginationChunk(
+                    chunk=[
+                        {"type": typ, "key": key, "count": count}
+                        for typ, key, count, _ in rows[:limit]
+                    ],
+                    next_batch=next_batch,
+                    prev_batch=from_token,
+                )
+
+            return results
+
+        return self.runInteraction(
+            "get_aggregation_groups_for_events", _get_aggregation_groups_for_events_txn
+        )
+
     @cachedInlineCallbacks()
     def get_applicable_edit(self, event_id):
         """Get the most recent edit (if any) that has happened for the given
@@ -363,6 +565,60 @@ class RelationsWorkerStore(SQLBaseStore):
         edit_event = yield self.get_event(edit_id, allow_none=True)
         return edit_event
 
+    @cachedList(
+        cached_method_name="get_applicable_edit",
+        list_name="event_ids",
+        inlineCallbacks=True,
+    )
+    def get_applicable_edits(self, event_ids):
+        """Bulk version of `get_applicable_edit`.
+
+        Args:
+            event_ids (list[str]): The original event IDs
+
+        Returns:
+            Deferred[dict[str, EventBase|None]]: Map from event ID to the most
+            recent edit of that event, if any.
+        """
+
+        def _get_applicable_edits_txn(txn):
+            edit_ids = {}
+            for chunk in batch_iter(event_ids, 100):
+                # See `get_applicable_edit` for the checks we do here. We read
+                # the edits oldest first, so the last one we see for each
+                # event is the one to use.
+                sql = """
+                    SELECT relates_to_id, edit.event_id FROM events AS edit
+                    INNER JOIN event_relations USING (event_id)
+                    INNER JOIN events AS original ON
+                        original.event_id = relates_to_id
+                        AND edit.type = original.type
+                        AND edit.sender = original.sender
+                    WHERE
+                        relates_to_id IN (%s)
+                        AND relation_type = ?
+                        AND edit.type = 'm.room.message'
+                    ORDER by edit.origin_server_ts ASC, edit.event_id ASC
+                """ % (
+                    ",".join("?" for _ in chunk),
+                )
+
+                txn.execute(sql, list(chunk) + [RelationTypes.REPLACE])
+                edit_ids.update(txn)
+
+            return edit_ids
+
+        edit_ids = yield self.runInteraction(
+            "get_applicable_edits", _get_applicable_edits_txn
+        )
+
+        edits = yield self.get_events(list(edit_ids.values()))
+
+        return {
+            event_id: edits.get(edit_ids[event_id]) if event_id in edit_ids else None
+            for event_id in event_ids
+        }
+
     def has_user_annotated_event(self, parent_id, event_type, aggregation_key, sender):
         """Check if a user has already annotated an event with the same key
         (e.g. already liked an event).
@@ -132,7 +132,7 @@ class RoomMemberWorkerStore(EventsWorkerStore):
                 """
 
             txn.execute(sql, (room_id, Membership.JOIN))
-            return [to_ascii(r[0]) for r in txn]
+            return [intern_string(r[0]) for r in txn]
 
         return self.runInteraction("get_users_in_room", f)
 
@@ -376,7 +376,9 @@ class RoomMemberWorkerStore(EventsWorkerStore):
             user_id, membership_list=[Membership.JOIN]
         )
         return frozenset(
-            GetRoomsForUserWithStreamOrdering(r.room_id, r.stream_ordering)
+            GetRoomsForUserWithStreamOrdering(
+                intern_string(r.room_id), r.stream_ordering
+            )
             for r in rooms
         )
 
@@ -518,7 +520,7 @@ class RoomMemberWorkerStore(EventsWorkerStore):
 
             users_in_room.update(
                 {
-                    to_ascii(row["user_id"]): ProfileInfo(
+                    intern_string(row["user_id"]): ProfileInfo(
                         avatar_url=to_ascii(row["avatar_url"]),
                         display_name=to_ascii(row["display_name"]),
                     )
@@ -20,6 +20,7 @@ from six import iteritems, itervalues
 from six.moves import range
 
 import attr
+from prometheus_client import Counter
 
 from twisted.internet import defer
 
@@ -29,6 +30,7 @@ from synapse.storage._base import SQLBaseStore
 from synapse.storage.background_updates import BackgroundUpdateStore
 from synapse.storage.engines import PostgresEngine
 from synapse.storage.events_worker import EventsWorkerStore
+from synapse.util import batch_iter
 from synapse.util.caches import get_cache_factor_for, intern_string
 from synapse.util.caches.descriptors import cached, cachedList
 from synapse.util.caches.dictionary_cache import DictionaryCache
@@ -39,6 +41,19 @@ logger = logging.getLogger(__name__)
 
 MAX_STATE_DELTA_HOPS = 100
 
+state_group_compaction_groups_counter = Counter(
+    "synapse_storage_state_group_compaction_groups",
+    "Number of state groups checked by the compaction background update",
+)
+state_group_compaction_rows_deleted_counter = Counter(
+    "synapse_storage_state_group_compaction_rows_deleted",
+    "Number of state_groups_state rows deleted by the compaction background update",
+)
+state_group_compaction_rows_inserted_counter = Counter(
+    "synapse_storage_state_group_compaction_rows_inserted",
+    "Number of state_groups_state rows inserted by the compaction background update",
+)
+
 
 class _GetStateGroupDelta(
     namedtuple("_GetStateGroupDelta", ("prev_group", "delta_ids"))
@@ -711,87 +726,124 @@ class StateGroupWorkerStore(EventsWorkerStore, SQLBaseStore):
             # a temporary hack until we can add the right indices in
             txn.execute("SET LOCAL enable_seqscan=off")
 
-            # The below query walks the state_group tree so that the "state"
-            # table includes all state_groups in the tree. It then joins
-            # against `state_groups_state` to fetch the latest state.
+            # The below query walks the state_group tree for all of the given
+            # groups at once, so that the "state" table includes every
+            # state_group in the tree of each of the requested groups (tagged
+            # with the requested group, `origin`). It then joins against
+            # `state_groups_state` to fetch the latest state.
             # It assumes that previous state groups are always numerically
             # lesser.
             # The PARTITION is used to get the event_id in the greatest state
-            # group for the given type, state_key.
-            # This may return multiple rows per (type, state_key), but last_value
-            # should be the same.
+            # group for the given origin, type and state_key.
+            # This may return multiple rows per (origin, type, state_key), but
+            # last_value should be the same.
             sql = """
-                WITH RECURSIVE state(state_group) AS (
-                    VALUES(?::bigint)
+                WITH RECURSIVE state(origin, state_group) AS (
+                    SELECT group_id, group_id FROM unnest(?::bigint[]) AS group_id
                     UNION ALL
-                    SELECT prev_state_group FROM state_group_edges e, state s
+                    SELECT s.origin, e.prev_state_group
+                    FROM state_group_edges e, state s
                     WHERE s.state_group = e.state_group
                 )
-                SELECT DISTINCT type, state_key, last_value(event_id) OVER (
-                    PARTITION BY type, state_key ORDER BY state_group ASC
+                SELECT DISTINCT s.origin, type, state_key, last_value(event_id) OVER (
+                    PARTITION BY s.origin, type, state_key
+                    ORDER BY s.state_group ASC
                     ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
-                ) AS event_id FROM state_groups_state
-                WHERE state_group IN (
-                    SELECT state_group FROM state
-                )
+                ) AS event_id
+                FROM state s, state_groups_state AS sgs
+                WHERE sgs.state_group = s.state_group
             """
 
-            for group in groups:
-                args = [group]
-                args.extend(where_args)
-
-                txn.execute(sql + where_clause, args)
-                for row in txn:
-                    typ, state_key, event_id = row
-                    key = (typ, state_key)
-                    results[group][key] = event_id
+            args = [list(groups)]
+            args.extend(where_args)
+
+            txn.execute(sql + where_clause, args)
+            for origin, typ, state_key, event_id in txn:
+                key = (intern_string(typ), intern_string(state_key))
+                results[origin][key] = intern_string(event_id)
         else:
             max_entries_returned = state_filter.max_entries_returned()
 
             # We don't use WITH RECURSIVE on sqlite3 as there are distributions
             # that ship with an sqlite3 version that doesn't support it (e.g. wheezy)
+            #
+            # Instead we walk down the trees of all the groups in step, fetching
+            # the rows and edges for each step in one query. Groups often share
+            # ancestors, so we only fetch each group's rows once.
+
+            # map from state group to the ((type, state_key), event_id) rows
+            # stored for it
+            rows_by_group = {}
+
+            # map from state group to its prev state group, or None
+            prev_by_group = {}
+
+            # map from the state group we need to look at next, to the
+            # requested groups whose state it is part of
+            pending = {}
             for group in groups:
-                next_group = group
+                pending.setdefault(group, []).append(group)
+
+            while pending:
+                to_fetch = [g for g in pending if g not in rows_by_group]
+                for chunk in batch_iter(to_fetch, 100):
+                    for g in chunk:
+                        rows_by_group[g] = []
+                        prev_by_group[g] = None
 
-                while next_group:
                     # We did this before by getting the list of group ids, and
                     # then passing that list to sqlite to get latest event for
                     # each (type, state_key). However, that was terribly slow
                     # without the right indices (which we can't add until
                     # after we finish deduping state, which requires this func)
-                    args = [next_group]
+                    in_clause = ",".join("?" for _ in chunk)
+                    args = list(chunk)
                     args.extend(where_args)
-
                     txn.execute(
-                        "SELECT type, state_key, event_id FROM state_groups_state"
-                        " WHERE state_group = ? " + where_clause,
+                        "SELECT state_group, type, state_key, event_id"
+                        " FROM state_groups_state"
+                        " WHERE state_group IN (%s) %s" % (in_clause, where_clause),
                         args,
                     )
-                    results[group].update(
-                        ((typ, state_key), event_id)
-                        for typ, state_key, event_id in txn
-                        if (typ, state_key) not in results[group]
-                    )
+                    for state_group, typ, state_key, event_id in txn:
+                        key = (intern_string(typ), intern_string(state_key))
+                        rows_by_group[state_group].append(
+                            (key, intern_string(event_id))
+                        )
 
-                    # If the number of entries in the (type,state_key)->event_id dict
-                    # matches the number of (type,state_keys) types we were searching
-                    # for, then we must have found them all, so no need to go walk
-                    # further down the tree... UNLESS our types filter contained
-                    # wildcards (i.e. Nones) in which case we have to do an exhaustive
-                    # search
-                    if (
-                        max_entries_returned is not None
-                        and len(results[group]) == max_entries_returned
-                    ):
-                        break
-
-                    next_group = self._simple_select_one_onecol_txn(
-                        txn,
-                        table="state_group_edges",
-                        keyvalues={"state_group": next_group},
-                        retcol="prev_state_group",
-                        allow_none=True,
+                    txn.execute(
+                        "SELECT state_group, prev_state_group FROM state_group_edges"
+                        " WHERE state_group IN (%s)" % (in_clause,),
+                        chunk,
                     )
+                    prev_by_group.update(txn)
+
+                next_pending = {}
+                for state_group, origins in iteritems(pending):
+                    rows = rows_by_group[state_group]
+                    prev_group = prev_by_group[state_group]
+
+                    for origin in origins:
+                        state = results[origin]
+                        for key, event_id in rows:
+                            state.setdefault(key, event_id)
+
+                        # If the number of entries in the (type,state_key)->event_id
+                        # dict matches the number of (type,state_keys) types we were
+                        # searching for, then we must have found them all, so no
+                        # need to go walk further down the tree... UNLESS our types
+                        # filter contained wildcards (i.e. Nones) in which case we
+                        # have to do an exhaustive search
+                        if (
+                            max_entries_returned is not None
+                            and len(state) == max_entries_returned
+                        ):
+                            continue
+
+                        if prev_group:
+                            next_pending.setdefault(prev_group, []).append(origin)
+
+                pending = next_pending
 
         return results
 
@@ -1215,24 +1267,56 @@ class StateGroupWorkerStore(EventsWorkerStore, SQLBaseStore):
                 for (s, ev) in iteritems(current_state_ids)
                 if s[0] == EventTypes.Member
             }
-            txn.call_after(
-                self._state_group_members_cache.update,
-                self._state_group_members_cache.sequence,
-                key=state_group,
-                value=dict(current_member_state_ids),
-            )
-
             current_non_member_state_ids = {
                 s: ev
                 for (s, ev) in iteritems(current_state_ids)
                 if s[0] != EventTypes.Member
             }
-            txn.call_after(
-                self._state_group_cache.update,
-                self._state_group_cache.sequence,
-                key=state_group,
-                value=dict(current_non_member_state_ids),
-            )
+
+            if prev_group and delta_ids is not None:
+                # If the previous group is cached then the new entries can
+                # share its storage, as they usually only differ by a few
+                # events.
+                delta_member_ids = {
+                    s: ev
+                    for (s, ev) in iteritems(delta_ids)
+                    if s[0] == EventTypes.Member
+                }
+                delta_non_member_ids = {
+                    s: ev
+                    for (s, ev) in iteritems(delta_ids)
+                    if s[0] != EventTypes.Member
+                }
+
+                txn.call_after(
+                    self._state_group_members_cache.update_from_delta,
+                    self._state_group_members_cache.sequence,
+                    key=state_group,
+                    value=current_member_state_ids,
+                    base_key=prev_group,
+                    delta=delta_member_ids,
+                )
+                txn.call_after(
+                    self._state_group_cache.update_from_delta,
+                    self._state_group_cache.sequence,
+                    key=state_group,
+                    value=current_non_member_state_ids,
+                    base_key=prev_group,
+                    delta=delta_non_member_ids,
+                )
+            else:
+                txn.call_after(
+                    self._state_group_members_cache.update,
+                    self._state_group_members_cache.sequence,
+                    key=state_group,
+                    value=current_member_state_ids,
+                )
+                txn.call_after(
+                    self._state_group_cache.update,
+                    self._state_group_cache.sequence,
+                    key=state_group,
+                    value=current_non_member_state_ids,
+                )
 
             return state_group
 
@@ -1303,6 +1387,7 @@ class StateStore(StateGroupWorkerStore, BackgroundUpdateStore):
     STATE_GROUP_INDEX_UPDATE_NAME = "state_group_state_type_index"
     CURRENT_STATE_INDEX_UPDATE_NAME = "current_state_members_idx"
     EVENT_STATE_GROUP_INDEX_UPDATE_NAME = "event_to_state_groups_sg_index"
+    STATE_GROUP_COMPACTION_UPDATE_NAME = "state_group_compaction"
 
     def __init__(self, db_conn, hs):
         super(StateStore, self).__init__(db_conn, hs)
@@ -1310,6 +1395,9 @@ class StateStore(StateGroupWorkerStore, BackgroundUpdateStore):
             self.STATE_GROUP_DEDUPLICATION_UPDATE_NAME,
             self._background_deduplicate_state,
         )
+        self.register_background_update_handler(
+            self.STATE_GROUP_COMPACTION_UPDATE_NAME, self._background_compact_state
+        )
         self.register_background_update_handler(
             self.STATE_GROUP_INDEX_UPDATE_NAME, self._background_index_state
         )
@@ -1498,6 +1586,153 @@ class StateStore(StateGroupWorkerStore, BackgroundUpdateStore):
 
         return result * BATCH_SIZE_SCALE_FACTOR
 
+    @defer.inlineCallbacks
+    def _background_compact_state(self, progress, batch_size):
+        """This background update walks through the state groups, removing rows
+        from deltas which don't change the state of the previous group, and
+        replacing deltas with the full state where the chain of deltas is too
+        long.
+        """
+        last_state_group = progress.get("last_state_group", 0)
+        max_group = progress.get("max_group", None)
+
+        # Each state group can involve loading the full state of a group, so we
+        # process far fewer groups than the batch size.
+        BATCH_SIZE_SCALE_FACTOR = 100
+
+        batch_size = max(1, int(batch_size / BATCH_SIZE_SCALE_FACTOR))
+
+        if max_group is None:
+            rows = yield self._execute(
+                "_background_compact_state",
+                None,
+                "SELECT coalesce(max(id), 0) FROM state_groups",
+            )
+            max_group = rows[0][0]
+
+        def compact_txn(txn):
+            txn.execute(
+                "SELECT id, room_id FROM state_groups"
+                " WHERE ? < id AND id <= ?"
+                " ORDER BY id ASC"
+                " LIMIT ?",
+                (last_state_group, max_group, batch_size),
+            )
+            groups = txn.fetchall()
+            if not groups:
+                return True, 0
+
+            changed_groups = []
+            for state_group, room_id in groups:
+                if self._compact_state_group_txn(txn, state_group, room_id):
+                    changed_groups.append(state_group)
+
+            # The deltas have changed, even though the state they describe
+            # hasn't.
+            self._invalidate_cache_and_stream_bulk(
+                txn, self.get_state_group_delta, ((g,) for g in changed_groups)
+            )
+
+            state_group_compaction_groups_counter.inc(len(groups))
+
+            progress = {"last_state_group": groups[-1][0], "max_group": max_group}
+            self._background_update_progress_txn(
+                txn, self.STATE_GROUP_COMPACTION_UPDATE_NAME, progress
+            )
+
+            return False, len(groups)
+
+        finished, result = yield self.runInteraction(
+            self.STATE_GROUP_COMPACTION_UPDATE_NAME, compact_txn
+        )
+
+        if finished:
+            yield self._end_background_update(self.STATE_GROUP_COMPACTION_UPDATE_NAME)
+
+        return result * BATCH_SIZE_SCALE_FACTOR
+
+    def _compact_state_group_txn(self, txn, state_group, room_id):
+        """Compacts the stored state for a single state group.
+
+        If the group is a delta on a chain of MAX_STATE_DELTA_HOPS or more
+        groups, it is rewritten to store its full state. Otherwise, any rows of
+        the delta which match the state of the previous group are deleted.
+
+        Returns:
+            bool: whether the stored rows for the group were changed
+        """
+        prev_group = self._simple_select_one_onecol_txn(
+            txn,
+            table="state_group_edges",
+            keyvalues={"state_group": state_group},
+            retcol="prev_state_group",
+            allow_none=True,
+        )
+        if not prev_group:
+            # not a delta, so there's nothing to do.
+            return False
+
+        potential_hops = self._count_state_group_hops_txn(txn, prev_group)
+        if potential_hops >= MAX_STATE_DELTA_HOPS:
+            curr_state = self._get_state_groups_from_groups_txn(txn, [state_group])
+            curr_state = curr_state[state_group]
+
+            self._simple_delete_txn(
+                txn, table="state_group_edges", keyvalues={"state_group": state_group}
+            )
+            deleted = self._simple_delete_txn(
+                txn, table="state_groups_state", keyvalues={"state_group": state_group}
+            )
+            self._simple_insert_many_txn(
+                txn,
+                table="state_groups_state",
+                values=[
+                    {
+                        "state_group": state_group,
+                        "room_id": room_id,
+                        "type": key[0],
+                        "state_key": key[1],
+                        "event_id": state_id,
+                    }
+                    for key, state_id in iteritems(curr_state)
+                ],
+            )
+
+            state_group_compaction_rows_deleted_counter.inc(deleted)
+            state_group_compaction_rows_inserted_counter.inc(len(curr_state))
+            return True
+
+        txn.execute(
+            "SELECT type, state_key, event_id FROM state_groups_state"
+            " WHERE state_group = ?",
+            (state_group,),
+        )
+        delta = {(typ, state_key): event_id for typ, state_key, event_id in txn}
+
+        # We only need the state of the previous group for the keys in the
+        # delta, rather than its full state.
+        redundant = []
+        for keys in batch_iter(delta, 100):
+            prev_state = self._get_state_groups_from_groups_txn(
+                txn, [prev_group], state_filter=StateFilter.from_types(keys)
+            )
+            redundant.extend(
+                (state_group, typ, state_key)
+                for (typ, state_key), event_id in iteritems(prev_state[prev_group])
+                if delta.get((typ, state_key)) == event_id
+            )
+        if not redundant:
+            return False
+
+        txn.executemany(
+            "DELETE FROM state_groups_state"
+            " WHERE state_group = ? AND type = ? AND state_key = ?",
+            redundant,
+        )
+
+        state_group_compaction_rows_deleted_counter.inc(len(redundant))
+        return True
+
     @defer.inlineCallbacks
     def _background_index_state(self, progress, batch_size):
         def reindex_txn(conn):
@@ -16,11 +16,17 @@
 
 import logging
 import os
+import sys
 
 import six
 from six.moves import intern
 
-from prometheus_client.core import REGISTRY, Gauge, GaugeMetricFamily
+from prometheus_client.core import (
+    REGISTRY,
+    CounterMetricFamily,
+    Gauge,
+    GaugeMetricFamily,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -140,6 +146,42 @@ KNOWN_KEYS = {
 }
 
 
+class _InternMetrics(object):
+    """Counts the strings passed to `intern_string`, and how many of them were
+    duplicates of a string we already held (and so could be freed).
+    """
+
+    def __init__(self):
+        self.strings = 0
+        self.duplicates = 0
+        self.duplicate_bytes = 0
+
+    def collect(self):
+        strings = CounterMetricFamily(
+            "synapse_util_caches_interned_strings", "Strings passed to intern_string"
+        )
+        strings.add_metric([], self.strings)
+        yield strings
+
+        duplicates = CounterMetricFamily(
+            "synapse_util_caches_interned_duplicates",
+            "Interned strings which were replaced by an existing copy",
+        )
+        duplicates.add_metric([], self.duplicates)
+        yield duplicates
+
+        duplicate_bytes = CounterMetricFamily(
+            "synapse_util_caches_interned_duplicate_bytes",
+            "Size of the interned strings which were replaced by an existing copy",
+        )
+        duplicate_bytes.add_metric([], self.duplicate_bytes)
+        yield duplicate_bytes
+
+
+intern_metrics = _InternMetrics()
+REGISTRY.register(intern_metrics)
+
+
 def intern_string(string):
     """Takes a (potentially) unicode string and interns it if it's ascii
     """
@@ -150,10 +192,17 @@ def intern_string(string):
         if six.PY2:
             string = string.encode("ascii")
 
-        return intern(string)
+        interned = intern(string)
     except UnicodeEncodeError:
         return string
 
+    intern_metrics.strings += 1
+    if interned is not string:
+        intern_metrics.duplicates += 1
+        intern_metrics.duplicate_bytes += sys.getsizeof(string)
+
+    return interned
+
 
 def intern_dict(dictionary):
     """Takes a dictionary and interns well known keys and their values
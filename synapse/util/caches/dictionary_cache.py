@@ -16,6 +16,8 @@
 import logging
 import threading
 from collections import namedtuple
+from collections.abc import Mapping
+from functools import partial
 
 from synapse.util.caches.lrucache import LruCache
 
@@ -37,9 +39,106 @@ class DictionaryEntry(namedtuple("DictionaryEntry", ("full", "known_absent", "va
     """
 
     def __len__(self):
+        if isinstance(self.value, DictionaryOverlay):
+            # The rest of the overlay is shared with (and accounted to) the
+            # entry it was layered on. DictionaryCache evicts the overlay if
+            # that entry leaves the cache.
+            return max(1, len(self.value.delta))
         return len(self.value)
 
 
+# The maximum number of overlays we stack on top of each other before
+# flattening. Lookups have to walk the layers, so this bounds their cost.
+MAX_OVERLAY_DEPTH = 16
+
+
+class DictionaryOverlay(Mapping):
+    """A mapping made up of a dict of changes layered on top of another
+    mapping.
+
+    This allows a dict that only differs a little from one we already hold
+    (e.g. the state at consecutive state groups) to share its storage, rather
+    than being a full copy.
+
+    Neither the base mapping nor the overlay may be changed once the overlay
+    has been created.
+
+    Args:
+        base (Mapping): the mapping to layer on top of
+        delta (dict): the entries to add to or replace in `base`. Takes
+            ownership of the dict.
+    """
+
+    __slots__ = ("_base", "_delta", "_depth", "_len")
+
+    def __init__(self, base, delta):
+        self._base = base
+        self._delta = delta
+        self._depth = getattr(base, "depth", 0) + 1
+        self._len = len(base) + sum(1 for k in delta if k not in base)
+
+    @property
+    def depth(self):
+        """The number of overlays in this stack, including this one"""
+        return self._depth
+
+    @property
+    def delta(self):
+        """The entries this overlay adds to or replaces in its base"""
+        return self._delta
+
+    def to_dict(self):
+        """Returns a copy of this mapping as a plain dict.
+
+        This is much quicker than `dict(overlay)`, which has to look up each
+        key through the layers.
+        """
+        layers = []
+        layer = self
+        while isinstance(layer, DictionaryOverlay):
+            layers.append(layer._delta)
+            layer = layer._base
+
+        result = dict(layer)
+        for delta in reversed(layers):
+            result.update(delta)
+        return result
+
+    def __getitem__(self, key):
+        layer = self
+        while isinstance(layer, DictionaryOverlay):
+            if key in layer._delta:
+                return layer._delta[key]
+            layer = layer._base
+        return layer[key]
+
+    def __contains__(self, key):
+        layer = self
+        while isinstance(layer, DictionaryOverlay):
+            if key in layer._delta:
+                return True
+            layer = layer._base
+        return key in layer
+
+    def __iter__(self):
+        # Rather than looking up every key in every layer we track the keys
+        # that have been yielded by the deltas, which are small.
+        seen = set()
+        layer = self
+        while isinstance(layer, DictionaryOverlay):
+            for key in layer._delta:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+            layer = layer._base
+        for key in layer:
+            if key not in seen:
+                yield key
+
+    def __len__(self):
+        return self._len
+
+
 class DictionaryCache(object):
     """Caches key -> dictionary lookups, supporting caching partial dicts, i.e.
     fetching a subset of dictionary keys for a particular key.
@@ -57,6 +156,10 @@ class DictionaryCache(object):
             __slots__ = []
 
         self.sentinel = Sentinel()
+
+        # (key, overlay) pairs for overlays whose base entry has left the cache
+        self._orphaned_overlays = []
+
         self.metrics = register_cache("dictionary", name, self.cache)
 
     def check_thread(self):
@@ -85,9 +188,11 @@ class DictionaryCache(object):
             self.metrics.inc_hits()
 
             if dict_keys is None:
-                return DictionaryEntry(
-                    entry.full, entry.known_absent, dict(entry.value)
-                )
+                if isinstance(entry.value, DictionaryOverlay):
+                    value = entry.value.to_dict()
+                else:
+                    value = dict(entry.value)
+                return DictionaryEntry(entry.full, entry.known_absent, value)
             else:
                 return DictionaryEntry(
                     entry.full,
@@ -105,11 +210,13 @@ class DictionaryCache(object):
         # raced with the INSERT don't update the cache (SYN-369)
         self.sequence += 1
         self.cache.pop(key, None)
+        self._evict_orphaned_overlays()
 
     def invalidate_all(self):
         self.check_thread()
         self.sequence += 1
         self.cache.clear()
+        del self._orphaned_overlays[:]
 
     def update(self, sequence, key, value, fetched_keys=None):
         """Updates the entry in the cache
@@ -134,14 +241,78 @@ class DictionaryCache(object):
             else:
                 self._update_or_insert(key, value, fetched_keys)
 
+    def update_from_delta(self, sequence, key, value, base_key, delta):
+        """Inserts the complete value for a key, which is known to differ from
+        the value for `base_key` by `delta`.
+
+        If we have the complete value for `base_key` cached then the new entry
+        shares its storage, rather than holding a copy of `value`.
+
+        Args:
+            sequence
+            key (K)
+            value (dict[X,Y]): The complete value for key K.
+            base_key (K)
+            delta (dict[X,Y]): The entries of `value` which are not in, or
+                differ from, the complete value for `base_key`.
+        """
+        self.check_thread()
+        if self.sequence != sequence:
+            return
+
+        base_entry = self.cache.get(base_key, self.sentinel)
+        if base_entry is self.sentinel or not base_entry.full:
+            self._insert(key, value, set())
+            return
+
+        base = base_entry.value
+        if getattr(base, "depth", 0) >= MAX_OVERLAY_DEPTH:
+            # Lookups would get too slow, so start a new stack from a copy.
+            self._insert(key, value, set())
+            return
+
+        overlay = DictionaryOverlay(base, dict(delta))
+
+        # The overlay is only charged for its delta, so it mustn't outlive the
+        # base entry which is charged for the rest.
+        self.cache.get(
+            base_key,
+            callbacks=[partial(self._orphaned_overlays.append, (key, overlay))],
+        )
+        self._insert(key, overlay, set())
+
     def _update_or_insert(self, key, value, known_absent):
+        # A full entry already has everything, and may be shared with the
+        # overlays stacked on it, so must not be changed.
+        entry = self.cache.get(key, self.sentinel)
+        if entry is not self.sentinel and entry.full:
+            return
+
         # We pop and reinsert as we need to tell the cache the size may have
         # changed
-
         entry = self.cache.pop(key, DictionaryEntry(False, set(), {}))
         entry.value.update(value)
         entry.known_absent.update(known_absent)
         self.cache[key] = entry
+        self._evict_orphaned_overlays()
 
     def _insert(self, key, value, known_absent):
         self.cache[key] = DictionaryEntry(True, known_absent, value)
+        self._evict_orphaned_overlays()
+
+    def _evict_orphaned_overlays(self):
+        """Evicts any overlays whose base entry has been evicted, invalidated
+        or replaced.
+
+        Such an overlay would keep the base alive without being charged for
+        it, so the cache would no longer be bounded by its size.
+        """
+        while self._orphaned_overlays:
+            key, overlay = self._orphaned_overlays.pop()
+
+            # the overlay may already have gone, in which case the key may
+            # now hold something else.
+            entry = self.cache.get(key, self.sentinel)
+            if entry is not self.sentinel and entry.value is overlay:
+                # this may orphan overlays stacked on this one in turn.
+                self.cache.pop(key, None)
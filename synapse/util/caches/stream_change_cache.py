@@ -37,6 +37,10 @@ class StreamChangeCache(object):
     def __init__(self, name, current_stream_pos, max_size=10000, prefilled_cache=None):
         self._max_size = int(max_size * caches.CACHE_SIZE_FACTOR)
         self._entity_to_key = {}
+
+        # map from stream position to the set of entities which last changed
+        # at that position. Several entities can change at the same position,
+        # e.g. all the users notified about a single event.
         self._cache = SortedDict()
         self._earliest_known_stream_pos = current_stream_pos
         self.name = name
@@ -76,10 +80,9 @@ class StreamChangeCache(object):
         assert type(stream_pos) is int
 
         if stream_pos >= self._earliest_known_stream_pos:
-            changed_entities = {
-                self._cache[k]
-                for k in self._cache.islice(start=self._cache.bisect_right(stream_pos))
-            }
+            changed_entities = set()
+            for k in self._cache.islice(start=self._cache.bisect_right(stream_pos)):
+                changed_entities.update(self._cache[k])
 
             result = changed_entities.intersection(entities)
 
@@ -113,10 +116,10 @@ class StreamChangeCache(object):
         assert type(stream_pos) is int
 
         if stream_pos >= self._earliest_known_stream_pos:
-            return [
-                self._cache[k]
-                for k in self._cache.islice(start=self._cache.bisect_right(stream_pos))
-            ]
+            changed_entities = []
+            for k in self._cache.islice(start=self._cache.bisect_right(stream_pos)):
+                changed_entities.extend(self._cache[k])
+            return changed_entities
         else:
             return None
 
@@ -127,19 +130,32 @@ class StreamChangeCache(object):
         assert type(stream_pos) is int
 
         if stream_pos > self._earliest_known_stream_pos:
+            # The same IDs turn up in lots of caches, so we intern them
+            entity = caches.intern_string(entity)
+
             old_pos = self._entity_to_key.get(entity, None)
             if old_pos is not None:
-                stream_pos = max(stream_pos, old_pos)
-                self._cache.pop(old_pos, None)
-            self._cache[stream_pos] = entity
+                if old_pos >= stream_pos:
+                    # we already know about a later change
+                    return
+                old_entities = self._cache[old_pos]
+                old_entities.discard(entity)
+                if not old_entities:
+                    del self._cache[old_pos]
+
+            entities = self._cache.get(stream_pos)
+            if entities is None:
+                entities = self._cache[stream_pos] = set()
+            entities.add(entity)
             self._entity_to_key[entity] = stream_pos
 
-            while len(self._cache) > self._max_size:
+            while len(self._entity_to_key) > self._max_size:
                 k, r = self._cache.popitem(0)
                 self._earliest_known_stream_pos = max(
                     k, self._earliest_known_stream_pos
                 )
-                self._entity_to_key.pop(r, None)
+                for evicted in r:
+                    self._entity_to_key.pop(evicted, None)
 
     def get_max_pos_of_last_change(self, entity):
         """Returns an upper bound of the stream id of the last change to an
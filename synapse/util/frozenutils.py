@@ -67,3 +67,18 @@ def _handle_frozendict(obj):
 
 # A JSONEncoder which is capable of encoding frozendics without barfing
 frozendict_json_encoder = json.JSONEncoder(default=_handle_frozendict)
+
+# A JSONEncoder which also produces compact output. This is much faster than
+# canonical JSON, as it doesn't need to sort keys or decode non-ASCII
+# characters, so is used for responses where canonical JSON isn't needed.
+#
+# Where the JSON library supports it (simplejson), objects may provide their
+# own representation via a `for_json` method, which lets serialized events
+# use their cached encoding.
+_compact_json_encoder_args = {}
+if hasattr(json, "RawJSON"):
+    _compact_json_encoder_args["for_json"] = True
+
+compact_json_encoder = json.JSONEncoder(
+    default=_handle_frozendict, separators=(",", ":"), **_compact_json_encoder_args
+)
@@ -21,12 +21,16 @@ class _Entry(object):
 
     def __init__(self, end_key):
         self.end_key = end_key
-        self.queue = []
+        self.queue = set()
 
 
 class WheelTimer(object):
-    """Stores arbitrary objects that will be returned after their timers have
-    expired.
+    """Stores arbitrary hashable objects that will be returned after their
+    timers have expired.
+
+    Inserting an object which is already due to be returned from the same
+    bucket is a no-op, so objects whose timers are re-armed frequently don't
+    build up duplicate entries.
     """
 
     def __init__(self, bucket_size=5000):
@@ -44,7 +48,7 @@ class WheelTimer(object):
 
         Args:
             now (int): Current time in msec
-            obj (object): Object to be inserted
+            obj (object): Object to be inserted. Must be hashable.
             then (int): When to return the object strictly after.
         """
         then_key = int(then / self.bucket_size) + 1
@@ -55,7 +59,7 @@ class WheelTimer(object):
 
             if then_key <= max_key:
                 # The max here is to protect against inserts for times in the past
-                self.entries[max(min_key, then_key) - min_key].queue.append(obj)
+                self.entries[max(min_key, then_key) - min_key].queue.add(obj)
                 return
 
         next_key = int(now / self.bucket_size) + 1
@@ -71,7 +75,7 @@ class WheelTimer(object):
         # to insert. This ensures there are no gaps.
         self.entries.extend(_Entry(key) for key in range(last_key, then_key + 1))
 
-        self.entries[-1].queue.append(obj)
+        self.entries[-1].queue.add(obj)
 
     def fetch(self, now):
         """Fetch any objects that have timed out
@@ -81,6 +81,25 @@ class AuthTestCase(unittest.TestCase):
         self.assertEqual(f.code, 401)
         self.assertEqual(f.errcode, "M_UNKNOWN_TOKEN")
 
+    def test_get_user_by_req_user_bad_token_is_cached(self):
+        self.store.get_user_by_access_token = Mock(return_value=None)
+
+        for _ in range(3):
+            request = Mock(args={})
+            request.args[b"access_token"] = [self.test_token]
+            request.requestHeaders.getRawHeaders = mock_getRawHeaders()
+            d = self.auth.get_user_by_req(request)
+            self.failureResultOf(d, InvalidClientTokenError)
+
+        # only the first request should have gone to the store, and its cached
+        # miss should have been dropped again.
+        self.store.get_user_by_access_token.assert_called_once_with(
+            self.test_token.decode("ascii")
+        )
+        self.store.get_user_by_access_token.invalidate.assert_called_once_with(
+            (self.test_token.decode("ascii"),)
+        )
+
     def test_get_user_by_req_user_missing_token(self):
         user_info = {"name": self.test_user, "token_id": "ditto"}
         self.store.get_user_by_access_token = Mock(return_value=user_info)
@@ -278,7 +297,7 @@ class AuthTestCase(unittest.TestCase):
                 "device_id": "DEVICE",
             }
 
-        self.store.get_user_by_access_token = get_user
+        self.store.get_user_by_access_token = Mock(side_effect=get_user)
         self.store.get_user_by_id = Mock(return_value={"is_guest": False})
 
         # check the token works
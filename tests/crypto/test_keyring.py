@@ -324,6 +324,86 @@ class KeyringTestCase(unittest.HomeserverTestCase):
         mock_fetcher1.get_keys.assert_called_once()
         mock_fetcher2.get_keys.assert_called_once()
 
+    def test_verify_json_uses_cached_keys(self):
+        """Keys we have already fetched should be used without another lookup"""
+        key1 = signedjson.key.generate_signing_key(1)
+
+        def get_keys(keys_to_fetch):
+            return defer.succeed(
+                {
+                    "server1": {
+                        get_key_id(key1): FetchKeyResult(get_verify_key(key1), 1200)
+                    }
+                }
+            )
+
+        mock_fetcher = keyring.KeyFetcher()
+        mock_fetcher.get_keys = Mock(side_effect=get_keys)
+        kr = keyring.Keyring(self.hs, key_fetchers=(mock_fetcher,))
+
+        json1 = {}
+        signedjson.sign.sign_json(json1, "server1", key1)
+
+        d = _verify_json_for_server(kr, "server1", json1, 500, "test1")
+        self.get_success(d)
+        mock_fetcher.get_keys.assert_called_once()
+
+        # the key is now cached, so a batch of requests within its validity period
+        # should be verified immediately.
+        mock_fetcher.get_keys.reset_mock()
+        results = kr.verify_json_objects_for_server(
+            [("server1", json1, 1000, "test2"), ("server1", {}, 1000, "test3")]
+        )
+        self.assertEqual(len(results), 2)
+        self.assertTrue(results[0].called)
+        self.get_success(results[0])
+        self.get_failure(results[1], SynapseError)
+
+        # a bad signature is still rejected
+        json2 = {"signatures": {"server1": dict(json1["signatures"]["server1"])}}
+        json2["foo"] = "bar"
+        d = _verify_json_for_server(kr, "server1", json2, 1000, "test4")
+        e = self.get_failure(d, SynapseError).value
+        self.assertEqual(e.code, 401)
+        mock_fetcher.get_keys.assert_not_called()
+
+        # a request which needs the key to be valid for longer should trigger
+        # another fetch
+        d = _verify_json_for_server(kr, "server1", json1, 1500, "test5")
+        self.get_failure(d, SynapseError)
+        mock_fetcher.get_keys.assert_called_once()
+
+    @unittest.override_config({"verify_signatures_in_threadpool": True})
+    def test_verify_json_in_threadpool(self):
+        """Signature checks should still work when done in the threadpool"""
+        key1 = signedjson.key.generate_signing_key(1)
+
+        mock_fetcher = keyring.KeyFetcher()
+        mock_fetcher.get_keys = Mock(
+            return_value=defer.succeed(
+                {
+                    "server1": {
+                        get_key_id(key1): FetchKeyResult(get_verify_key(key1), 1200)
+                    }
+                }
+            )
+        )
+        kr = keyring.Keyring(self.hs, key_fetchers=(mock_fetcher,))
+
+        json1 = {}
+        signedjson.sign.sign_json(json1, "server1", key1)
+        json2 = dict(json1, foo="bar")
+
+        # once with a key lookup, and once with the cached key
+        for i in range(2):
+            results = kr.verify_json_objects_for_server(
+                [("server1", json1, 500, "test1"), ("server1", json2, 500, "test2")]
+            )
+            self.get_success(results[0])
+            self.get_failure(results[1], SynapseError)
+
+        mock_fetcher.get_keys.assert_called_once()
+
 
 class ServerKeyFetcherTestCase(unittest.HomeserverTestCase):
     def make_homeserver(self, reactor, clock):
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# Copyright 2019 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from canonicaljson import encode_canonical_json, json
+
+from synapse.events import FrozenEvent, FrozenEventV3
+from synapse.util.caches import intern_string
+
+from tests import unittest
+
+
+class FrozenEventTestCase(unittest.TestCase):
+    def test_v1_event_refs(self):
+        event = FrozenEvent(
+            {
+                "event_id": "$event:test",
+                "type": "m.room.message",
+                "room_id": "!room:test",
+                "sender": "@user:test",
+                "content": {},
+                "prev_events": [["$prev:test", {"sha256": "abc"}]],
+                "auth_events": [["$auth1:test", {}], ["$auth2:test", {}]],
+            }
+        )
+
+        self.assertFalse(hasattr(event, "__dict__"))
+        self.assertFalse(hasattr(event, "state_key"))
+
+        self.assertEqual(event.prev_event_ids(), ["$prev:test"])
+        self.assertEqual(event.auth_event_ids(), ["$auth1:test", "$auth2:test"])
+
+        # the references still serialise as lists
+        self.assertIn(
+            b'"prev_events":[["$prev:test",{"sha256":"abc"}]]',
+            encode_canonical_json(event.get_pdu_json()),
+        )
+
+    def test_v3_event_refs(self):
+        event = FrozenEventV3(
+            {
+                "type": "m.room.member",
+                "state_key": "@user:test",
+                "room_id": "!room:test",
+                "sender": "@user:test",
+                "content": {"membership": "join"},
+                "prev_events": ["$prev"],
+                "auth_events": ["$auth1", "$auth2"],
+            }
+        )
+
+        self.assertFalse(hasattr(event, "__dict__"))
+        self.assertEqual(event.state_key, "@user:test")
+        self.assertEqual(event.membership, "join")
+
+        self.assertEqual(event.prev_event_ids(), ["$prev"])
+        self.assertEqual(event.auth_event_ids(), ["$auth1", "$auth2"])
+
+    def test_event_ids_interned(self):
+        # build the ID at runtime so that it isn't a constant
+        prev_event_id = "".join(["$", "test_event_ids_interned"])
+
+        event = FrozenEventV3(
+            {
+                "type": "m.room.message",
+                "room_id": "!room:test",
+                "sender": "@user:test",
+                "content": {},
+                "prev_events": [prev_event_id],
+                "auth_events": [],
+            }
+        )
+
+        self.assertIs(
+            event.prev_events[0], intern_string("$" + "test_event_ids_interned")
+        )
+
+    def test_malformed_refs(self):
+        # events which haven't been validated yet may have bad references,
+        # which should be left alone
+        event = FrozenEventV3(
+            {
+                "type": "m.room.message",
+                "room_id": "!room:test",
+                "sender": "@user:test",
+                "content": {},
+                "prev_events": "$prev",
+                "auth_events": [1, None],
+            }
+        )
+
+        self.assertEqual(event.prev_events, "$prev")
+        self.assertEqual(event.auth_events, (1, None))
+
+
+class LazyEventTestCase(unittest.TestCase):
+    def test_known_fields_not_decoded(self):
+        event_dict = {
+            "type": "m.room.member",
+            "state_key": "@user:test",
+            "room_id": "!room:test",
+            "sender": "@user:test",
+            "content": {"membership": "join", "displayname": "User"},
+            "prev_events": ["$prev"],
+            "auth_events": [],
+            "signatures": {"test": {"ed25519:a": "sig"}},
+            "unsigned": {"age_ts": 1000},
+        }
+        event = FrozenEventV3.from_json(
+            json.dumps(event_dict),
+            "$event",
+            internal_metadata_dict={"outlier": True},
+            type="m.room.member",
+            state_key="@user:test",
+            membership="join",
+        )
+
+        self.assertEqual(event.event_id, "$event")
+        self.assertEqual(event.type, "m.room.member")
+        self.assertTrue(event.is_state())
+        self.assertEqual(event.membership, "join")
+        self.assertTrue(event.internal_metadata.is_outlier())
+        self.assertIsNotNone(event._json)
+
+        self.assertEqual(event.content, {"membership": "join", "displayname": "User"})
+        self.assertIsNone(event._json)
+
+        self.assertEqual(event.signatures, {"test": {"ed25519:a": "sig"}})
+        self.assertEqual(json.loads(json.dumps(event.get_pdu_json())), event_dict)
+
+    def test_unknown_fields_decoded(self):
+        event = FrozenEvent.from_json(
+            json.dumps(
+                {
+                    "event_id": "$event:test",
+                    "type": "m.room.message",
+                    "room_id": "!room:test",
+                    "sender": "@user:test",
+                    "content": {"body": "hello"},
+                    "prev_events": [],
+                    "auth_events": [],
+                }
+            ),
+            "$event:test",
+        )
+
+        self.assertEqual(event.type, "m.room.message")
+        self.assertIsNone(event._json)
+        self.assertEqual(event.sender, "@user:test")
+        self.assertRaises(AttributeError, lambda: event.redacts)
+
+    def test_is_state_not_decoded(self):
+        event_dict = {
+            "type": "m.room.message",
+            "room_id": "!room:test",
+            "sender": "@user:test",
+            "content": {"body": "hello"},
+            "prev_events": [],
+            "auth_events": [],
+        }
+        event = FrozenEventV3.from_json(
+            json.dumps(event_dict), "$event", type="m.room.message"
+        )
+
+        self.assertFalse(event.is_state())
+        self.assertIsNotNone(event._json)
+
+        # and it should still be right once decoded
+        self.assertEqual(event.content, {"body": "hello"})
+        self.assertFalse(event.is_state())
+
+    def test_bad_json_kept(self):
+        event = FrozenEvent.from_json("{not json", "$event:test")
+
+        # a failure to decode should be reported each time, rather than
+        # leaving an event with no fields
+        self.assertRaises(ValueError, lambda: event.type)
+        self.assertRaises(ValueError, lambda: event.content)
+        self.assertEqual(event._json, "{not json")
@@ -14,8 +14,13 @@
 # limitations under the License.
 
 
+from canonicaljson import encode_canonical_json, json
+
+from twisted.trial.unittest import SkipTest
+
 from synapse.events import FrozenEvent
-from synapse.events.utils import prune_event, serialize_event
+from synapse.events.utils import format_event_raw, prune_event, serialize_event
+from synapse.util.frozenutils import compact_json_encoder
 
 from .. import unittest
 
@@ -241,3 +246,67 @@ class SerializeEventTestCase(unittest.TestCase):
             self.serialize(
                 MockEvent(room_id="!foo:bar", content={"foo": "bar"}), ["room_id", 4]
             )
+
+
+class EventClientSerializerTestCase(unittest.HomeserverTestCase):
+    def prepare(self, reactor, clock, hs):
+        self.serializer = hs.get_event_client_serializer()
+
+    def _make_event(self):
+        event = MockEvent(
+            type="m.room.message",
+            event_id="$test:domain",
+            room_id="!foo:bar",
+            sender="@alice:bar",
+            content={"body": "hello"},
+            unsigned={"age_ts": 1000},
+        )
+        event.internal_metadata.token_id = 5
+        event.internal_metadata.txn_id = "txn"
+        return event
+
+    def _serialize(self, event, time_now, **kwargs):
+        d = self.get_success(self.serializer.serialize_event(event, time_now, **kwargs))
+        return json.loads(compact_json_encoder.encode(d))
+
+    def test_cached_matches_uncached(self):
+        event = self._make_event()
+        for kwargs in ({}, {"event_format": format_event_raw}):
+            expected = serialize_event(event, 2000, **kwargs)
+
+            # Once to populate the cache and once to read from it.
+            self.assertEqual(self._serialize(event, 2000, **kwargs), expected)
+            self.assertEqual(self._serialize(event, 2000, **kwargs), expected)
+
+            # the serialized event should also be usable as a plain dict, and
+            # with other encoders.
+            d = self.get_success(self.serializer.serialize_event(event, 2000, **kwargs))
+            self.assertEqual(d, expected)
+            self.assertEqual(d["content"].get("body"), "hello")
+            self.assertEqual(json.loads(encode_canonical_json(d)), expected)
+
+    def test_cached_encoding_used(self):
+        if self.serializer._encoded_event_cache is None:
+            raise SkipTest("JSON library does not support RawJSON")
+
+        event = self._make_event()
+        d = self.get_success(self.serializer.serialize_event(event, 2000))
+        self.assertIsInstance(d.for_json()["content"], json.RawJSON)
+
+        # fields which have been replaced since should be encoded afresh
+        d["content"] = {"body": "goodbye"}
+        self.assertEqual(
+            json.loads(compact_json_encoder.encode(d))["content"], {"body": "goodbye"}
+        )
+
+    def test_per_request_fields(self):
+        event = self._make_event()
+
+        d = self._serialize(event, 2000, token_id=5)
+        self.assertEqual(d["age"], 1000)
+        self.assertEqual(d["unsigned"], {"age": 1000, "transaction_id": "txn"})
+
+        d = self._serialize(event, 5000)
+        self.assertEqual(d["age"], 4000)
+        self.assertEqual(d["unsigned"], {"age": 4000})
+        self.assertEqual(d["content"], {"body": "hello"})
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright 2019 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from mock import Mock
+
+import signedjson.key
+
+from twisted.internet import defer
+
+from synapse.api.room_versions import RoomVersions
+from synapse.crypto.event_signing import add_hashes_and_signatures
+from synapse.events import FrozenEvent
+from synapse.federation.federation_base import FederationBase
+
+from tests import unittest
+
+
+class CheckSigsAndHashTestCase(unittest.HomeserverTestCase):
+    def make_homeserver(self, reactor, clock):
+        keyring = Mock()
+        keyring.verify_json_objects_for_server.side_effect = lambda requests: [
+            defer.succeed(None) for _ in requests
+        ]
+        return self.setup_test_homeserver(keyring=keyring)
+
+    def prepare(self, reactor, clock, hs):
+        threadpool = reactor.getThreadPool()
+        threadpool.callInThreadWithCallback = Mock(
+            wraps=threadpool.callInThreadWithCallback
+        )
+        self.threadpool = threadpool
+
+    @unittest.override_config({"verify_signatures_in_threadpool": True})
+    def test_bad_hash_redacted_in_threadpool(self):
+        """An event whose content hash doesn't match should be redacted when the
+        hash is checked in the threadpool"""
+        event = self._make_event(tamper=True)
+        result = self._check(event)
+
+        self.threadpool.callInThreadWithCallback.assert_called()
+        self.assertEqual(result.event_id, event.event_id)
+        self.assertEqual(result.content, {})
+
+    @unittest.override_config({"verify_signatures_in_threadpool": True})
+    def test_good_hash_in_threadpool(self):
+        """An event whose content hash matches should be returned unchanged when
+        the hash is checked in the threadpool"""
+        event = self._make_event(tamper=False)
+        result = self._check(event)
+
+        self.threadpool.callInThreadWithCallback.assert_called()
+        self.assertIs(result, event)
+
+    def _check(self, event):
+        federation_base = FederationBase(self.hs)
+        return self.get_success(
+            federation_base._check_sigs_and_hash(RoomVersions.V1.identifier, event)
+        )
+
+    def _make_event(self, tamper):
+        event_dict = {
+            "event_id": "$event:remote",
+            "type": "m.room.message",
+            "room_id": "!room:remote",
+            "sender": "@user:remote",
+            "origin": "remote",
+            "origin_server_ts": 1000,
+            "content": {"body": "hello", "msgtype": "m.text"},
+            "depth": 1,
+            "prev_events": [],
+            "auth_events": [],
+        }
+        add_hashes_and_signatures(
+            event_dict, "remote", signedjson.key.generate_signing_key("1")
+        )
+        if tamper:
+            event_dict["content"]["body"] = "goodbye"
+        return FrozenEvent(event_dict)
@@ -15,7 +15,7 @@
 import logging
 
 from synapse.events import FrozenEvent
-from synapse.federation.federation_server import server_matches_acl_event
+from synapse.federation.federation_server import coalesce_edus, server_matches_acl_event
 
 from tests import unittest
 
@@ -42,6 +42,83 @@ class ServerACLsTestCase(unittest.TestCase):
         self.assertTrue(server_matches_acl_event("1:2:3:4", e))
 
 
+class CoalesceEdusTestCase(unittest.TestCase):
+    def test_typing_keeps_latest_per_user(self):
+        edus = [
+            ("m.typing", {"room_id": "!r:a", "user_id": "@u:a", "typing": True}),
+            ("m.typing", {"room_id": "!r:a", "user_id": "@v:a", "typing": True}),
+            ("m.typing", {"room_id": "!r:a", "user_id": "@u:a", "typing": False}),
+        ]
+        self.assertEqual(
+            coalesce_edus(edus),
+            [
+                ("m.typing", {"room_id": "!r:a", "user_id": "@v:a", "typing": True}),
+                ("m.typing", {"room_id": "!r:a", "user_id": "@u:a", "typing": False}),
+            ],
+        )
+
+    def test_presence_merged(self):
+        edus = [
+            ("m.presence", {"push": [{"user_id": "@u:a", "presence": "online"}]}),
+            ("m.presence", {"push": [{"user_id": "@v:a", "presence": "online"}]}),
+            ("m.presence", {"push": [{"user_id": "@u:a", "presence": "offline"}]}),
+        ]
+        self.assertEqual(
+            coalesce_edus(edus),
+            [
+                (
+                    "m.presence",
+                    {
+                        "push": [
+                            {"user_id": "@v:a", "presence": "online"},
+                            {"user_id": "@u:a", "presence": "offline"},
+                        ]
+                    },
+                )
+            ],
+        )
+
+    def test_receipts_merged(self):
+        edus = [
+            ("m.receipt", {"!r:a": {"m.read": {"@u:a": {"event_ids": ["$1"]}}}}),
+            ("m.receipt", {"!r:a": {"m.read": {"@v:a": {"event_ids": ["$1"]}}}}),
+            ("m.receipt", {"!r:a": {"m.read": {"@u:a": {"event_ids": ["$2"]}}}}),
+        ]
+        self.assertEqual(
+            coalesce_edus(edus),
+            [
+                (
+                    "m.receipt",
+                    {
+                        "!r:a": {
+                            "m.read": {
+                                "@u:a": {"event_ids": ["$2"]},
+                                "@v:a": {"event_ids": ["$1"]},
+                            }
+                        }
+                    },
+                )
+            ],
+        )
+
+    def test_unknown_and_malformed_edus_kept(self):
+        edus = [
+            ("m.direct_to_device", {"a": 1}),
+            ("m.typing", {"room_id": "!r:a"}),
+            ("m.direct_to_device", {"a": 2}),
+            ("m.typing", {"room_id": "!r:a"}),
+        ]
+        self.assertEqual(
+            coalesce_edus(edus),
+            [
+                ("m.direct_to_device", {"a": 1}),
+                ("m.direct_to_device", {"a": 2}),
+                ("m.typing", {"room_id": "!r:a"}),
+                ("m.typing", {"room_id": "!r:a"}),
+            ],
+        )
+
+
 def _create_acl_event(content):
     return FrozenEvent(
         {
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# Copyright 2019 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from synapse.api.errors import SynapseError
+from synapse.api.room_versions import EventFormatVersions
+from synapse.federation.transport.client import EventListsParser
+
+from tests import unittest
+
+
+def _make_event(event_id, depth=1):
+    return {
+        "event_id": event_id,
+        "type": "m.room.member",
+        "state_key": "@user:test",
+        "room_id": "!room:test",
+        "sender": "@user:test",
+        "content": {"membership": "join"},
+        "depth": depth,
+        "prev_events": [],
+        "auth_events": [],
+    }
+
+
+class EventListsParserTestCase(unittest.TestCase):
+    def _parse(self, parser, body, chunk_size=7):
+        body = json.dumps(body).encode("utf-8")
+        for i in range(0, len(body), chunk_size):
+            parser.write(body[i : i + chunk_size])
+        return parser.finish()
+
+    def test_send_join_response(self):
+        """The events in a v1 send_join response should be parsed"""
+        parser = EventListsParser(
+            EventFormatVersions.V1, ("state", "auth_chain"), prefix="item."
+        )
+        result = self._parse(
+            parser,
+            [
+                200,
+                {
+                    "origin": "test",
+                    "state": [_make_event("$a:test"), _make_event("$b:test")],
+                    "auth_chain": [_make_event("$c:test")],
+                },
+            ],
+        )
+
+        self.assertEqual([e.event_id for e in result["state"]], ["$a:test", "$b:test"])
+        self.assertEqual([e.event_id for e in result["auth_chain"]], ["$c:test"])
+        for e in result["state"] + result["auth_chain"]:
+            self.assertTrue(e.internal_metadata.is_outlier())
+        self.assertEqual(result["state"][0].content, {"membership": "join"})
+
+    def test_missing_lists(self):
+        """Lists which are missing from the response should come back empty"""
+        parser = EventListsParser(EventFormatVersions.V1, ("pdus", "auth_chain"))
+        result = self._parse(parser, {"pdus": [_make_event("$a:test")]})
+
+        self.assertEqual([e.event_id for e in result["pdus"]], ["$a:test"])
+        self.assertEqual(result["auth_chain"], [])
+
+    def test_invalid_event(self):
+        """An invalid event should cause parsing to fail"""
+        parser = EventListsParser(EventFormatVersions.V1, ("pdus", "auth_chain"))
+        with self.assertRaises(SynapseError):
+            self._parse(parser, {"pdus": [_make_event("$a:test", depth=-1)]})
+
+    def test_lists_parsed_in_one_pass(self):
+        """Items of every list should be picked out of a single pass over the
+        body, ignoring lists of the same name at other paths"""
+        parser = EventListsParser(EventFormatVersions.V1, ("pdus", "auth_chain"))
+        event = _make_event("$b:test")
+        event["prev_events"] = [["$a:test", {"sha256": "abc"}]]
+        result = self._parse(
+            parser,
+            {
+                "auth_chain": [_make_event("$a:test")],
+                "unsigned": {"pdus": [_make_event("$x:test")]},
+                "pdus": [event],
+            },
+            chunk_size=1,
+        )
+
+        self.assertEqual([e.event_id for e in result["pdus"]], ["$b:test"])
+        self.assertEqual(result["pdus"][0].prev_event_ids(), ["$a:test"])
+        self.assertEqual([e.event_id for e in result["auth_chain"]], ["$a:test"])
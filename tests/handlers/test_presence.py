@@ -18,6 +18,8 @@ from mock import Mock, call
 
 from signedjson.key import generate_signing_key
 
+from twisted.internet import defer
+
 from synapse.api.constants import EventTypes, Membership, PresenceState
 from synapse.events import room_version_to_event_format
 from synapse.events.builder import EventBuilder
@@ -27,6 +29,7 @@ from synapse.handlers.presence import (
     IDLE_TIMER,
     LAST_ACTIVE_GRANULARITY,
     SYNC_ONLINE_TIMEOUT,
+    get_interested_remotes,
     handle_timeout,
     handle_update,
 )
@@ -413,6 +416,52 @@ class PresenceTimeoutTestCase(unittest.TestCase):
         self.assertEquals(state, new_state)
 
 
+class InterestedRemotesTestCase(unittest.TestCase):
+    @defer.inlineCallbacks
+    def test_states_grouped_by_host(self):
+        rooms_for_user = {
+            "@alice:test": ["!room1:test", "!room2:test"],
+            "@bob:test": ["!room2:test"],
+        }
+        hosts_in_room = {
+            "!room1:test": ["test", "remote1"],
+            "!room2:test": ["test", "remote1", "remote2"],
+        }
+
+        store = Mock()
+        store.get_rooms_for_user.side_effect = lambda user_id: defer.succeed(
+            rooms_for_user[user_id]
+        )
+        state_handler = Mock()
+        state_handler.get_current_hosts_in_room.side_effect = lambda room_id: (
+            defer.succeed(hosts_in_room[room_id])
+        )
+
+        alice = UserPresenceState.default("@alice:test")
+        bob = UserPresenceState.default("@bob:test")
+
+        hosts_and_states = yield get_interested_remotes(
+            store, [alice, bob], state_handler
+        )
+
+        # each host gets one row, with each state at most once, even though
+        # alice shares two rooms with remote1.
+        result = {}
+        for hosts, states in hosts_and_states:
+            self.assertEqual(len(hosts), 1)
+            self.assertNotIn(hosts[0], result)
+            result[hosts[0]] = sorted(state.user_id for state in states)
+
+        self.assertEqual(
+            result,
+            {
+                "test": ["@alice:test", "@bob:test"],
+                "remote1": ["@alice:test", "@bob:test"],
+                "remote2": ["@alice:test", "@bob:test"],
+            },
+        )
+
+
 class PresenceJoinTestCase(unittest.HomeserverTestCase):
     """Tests remote servers get told about presence of users in the room when
     they join and when new local users join.
@@ -14,12 +14,13 @@
 # limitations under the License.
 import logging
 
-from mock import Mock
+from mock import ANY, Mock, patch
 
 import treq
 from service_identity import VerificationError
 from zope.interface import implementer
 
+from OpenSSL import SSL
 from twisted.internet import defer
 from twisted.internet._sslverify import ClientTLSOptions, OpenSSLCertificateOptions
 from twisted.internet.protocol import Factory
@@ -245,6 +246,87 @@ class MatrixFederationAgentTests(TestCase):
         json = self.successResultOf(treq.json_content(response))
         self.assertEqual(json, {"a": 1})
 
+    def test_tls_session_is_cached(self):
+        """
+        The TLS session should be stored after a successful handshake, so that it can
+        be resumed by the next connection to the same server
+        """
+        self.reactor.lookups["testserv"] = "1.2.3.4"
+        test_d = self._make_get_request(b"matrix://testserv:8448/foo/bar")
+
+        clients = self.reactor.tcpClients
+        self.assertEqual(len(clients), 1)
+        (host, port, client_factory, _timeout, _bindAddress) = clients[0]
+        http_server = self._make_connection(client_factory, expected_sni=b"testserv")
+
+        self.assertIsNotNone(self.tls_factory._tls_sessions.get(("testserv", True)))
+        self.assertIsNone(self.tls_factory._tls_sessions.get(("otherserv", True)))
+
+        # finish off the request
+        request = http_server.requests[0]
+        request.finish()
+        self.reactor.pump((0.1,))
+        response = self.successResultOf(test_d)
+        self.assertEqual(response.code, 200)
+
+    def test_tls_session_resumed_after_disconnect(self):
+        """
+        If the connection to a server is lost, the next connection to it should offer
+        the stored TLS session
+        """
+        self.reactor.lookups["testserv"] = "1.2.3.4"
+        test_d = self._make_get_request(b"matrix://testserv:8448/foo/bar")
+
+        clients = self.reactor.tcpClients
+        self.assertEqual(len(clients), 1)
+        (host, port, client_factory, _timeout, _bindAddress) = clients[0]
+        http_server = self._make_connection(client_factory, expected_sni=b"testserv")
+
+        session = self.tls_factory._tls_sessions.get(("testserv", True))
+        self.assertIsNotNone(session)
+
+        # finish off the request, then drop the connection
+        request = http_server.requests[0]
+        request.finish()
+        self.reactor.pump((0.1,))
+        self.assertEqual(self.successResultOf(test_d).code, 200)
+        http_server.loseConnection()
+        self.reactor.pump((0.1,))
+
+        # the next request needs a new connection, which should resume the session
+        test_d = self._make_get_request(b"matrix://testserv:8448/foo/bar")
+
+        self.assertEqual(len(clients), 2)
+        (host, port, client_factory, _timeout, _bindAddress) = clients[1]
+        with patch.object(
+            SSL.Connection,
+            "set_session",
+            autospec=True,
+            side_effect=SSL.Connection.set_session,
+        ) as mock_set_session:
+            http_server = self._make_connection(
+                client_factory, expected_sni=b"testserv"
+            )
+        mock_set_session.assert_called_once_with(ANY, session)
+
+        request = http_server.requests[0]
+        request.finish()
+        self.reactor.pump((0.1,))
+        self.assertEqual(self.successResultOf(test_d).code, 200)
+
+    def test_connection_pool_config(self):
+        """
+        The connection pool should be configured with the given limits
+        """
+        agent = MatrixFederationAgent(
+            reactor=self.reactor,
+            tls_client_options_factory=self.tls_factory,
+            max_idle_connections_per_host=10,
+            idle_connection_timeout_ms=5 * 60 * 1000,
+        )
+        self.assertEqual(agent._pool.maxPersistentPerHost, 10)
+        self.assertEqual(agent._pool.cachedConnectionTimeout, 5 * 60)
+
     def test_get_ip_address(self):
         """
         Test the behaviour when the server name contains an explicit IP (with no port)
@@ -26,13 +26,14 @@ from twisted.web.http import HTTPChannel
 
 from synapse.api.errors import RequestSendFailed
 from synapse.http.matrixfederationclient import (
+    ByteParser,
     MatrixFederationHttpClient,
     MatrixFederationRequest,
 )
 from synapse.logging.context import LoggingContext
 
 from tests.server import FakeTransport
-from tests.unittest import HomeserverTestCase
+from tests.unittest import HomeserverTestCase, override_config
 
 
 def check_logcontext(context):
@@ -50,6 +51,20 @@ class FederationClientTests(HomeserverTestCase):
         self.cl = MatrixFederationHttpClient(self.hs, None)
         self.reactor.lookups["testserv"] = "1.2.3.4"
 
+    @override_config(
+        {
+            "federation_client_max_idle_connections_per_host": 10,
+            "federation_client_idle_connection_timeout": "5m",
+        }
+    )
+    def test_connection_pool_config(self):
+        """
+        The connection pool limits should be taken from the config
+        """
+        pool = self.cl.agent._agent._pool
+        self.assertEqual(pool.maxPersistentPerHost, 10)
+        self.assertEqual(pool.cachedConnectionTimeout, 5 * 60)
+
     def test_client_get(self):
         """
         happy-path test of a GET request
@@ -116,6 +131,52 @@ class FederationClientTests(HomeserverTestCase):
         # check the response is as expected
         self.assertEqual(res, {"a": 1})
 
+    def test_client_get_with_parser(self):
+        """
+        The response body should be fed to the parser, if one is given
+        """
+
+        class TestParser(ByteParser):
+            def __init__(self):
+                self.chunks = []
+
+            def write(self, data):
+                self.chunks.append(data)
+
+            def finish(self):
+                return b"".join(self.chunks)
+
+        parser = TestParser()
+        test_d = self.cl.get_json("testserv:8008", "foo/bar", parser=parser)
+
+        self.pump()
+
+        clients = self.reactor.tcpClients
+        self.assertEqual(len(clients), 1)
+        (host, port, factory, _timeout, _bindAddress) = clients[0]
+
+        protocol = factory.buildProtocol(None)
+        transport = StringTransport()
+        protocol.makeConnection(transport)
+
+        protocol.dataReceived(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Server: Fake\r\n"
+            b"Content-Type: application/json\r\n"
+            b"Content-Length: 10\r\n"
+            b"\r\n"
+            b'{ "a": '
+        )
+        self.pump()
+        self.assertNoResult(test_d)
+        self.assertEqual(parser.chunks, [b'{ "a": '])
+
+        protocol.dataReceived(b"1 }")
+        self.pump()
+
+        res = self.successResultOf(test_d)
+        self.assertEqual(res, b'{ "a": 1 }')
+
     def test_dns_error(self):
         """
         If the DNS lookup returns an error, it will bubble up.
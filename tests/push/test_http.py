@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import zlib
+
 from mock import Mock
 
 from twisted.internet.defer import Deferred
@@ -20,8 +22,9 @@ from twisted.internet.defer import Deferred
 import synapse.rest.admin
 from synapse.logging.context import make_deferred_yieldable
 from synapse.rest.client.v1 import login, room
+from synapse.rest.client.v2_alpha import receipts
 
-from tests.unittest import HomeserverTestCase
+from tests.unittest import HomeserverTestCase, override_config
 
 
 class HTTPPusherTests(HomeserverTestCase):
@@ -30,6 +33,7 @@ class HTTPPusherTests(HomeserverTestCase):
         synapse.rest.admin.register_servlets_for_client_rest_resource,
         room.register_servlets,
         login.register_servlets,
+        receipts.register_servlets,
     ]
     user_id = True
     hijack_auth = False
@@ -153,3 +157,202 @@ class HTTPPusherTests(HomeserverTestCase):
         )
         self.assertEqual(len(pushers), 1)
         self.assertTrue(pushers[0]["last_stream_ordering"] > last_stream_ordering)
+
+    def test_badge_count(self):
+        """
+        The badge count counts the rooms with unread notifications, and is
+        sent to the push gateway when the user's read receipts change it.
+        """
+        user_id = self.register_user("user", "pass")
+        access_token = self.login("user", "pass")
+
+        other_user_id = self.register_user("otheruser", "pass")
+        other_access_token = self.login("otheruser", "pass")
+
+        user_tuple = self.get_success(
+            self.hs.get_datastore().get_user_by_access_token(access_token)
+        )
+        self.get_success(
+            self.hs.get_pusherpool().add_pusher(
+                user_id=user_id,
+                access_token=user_tuple["token_id"],
+                kind="http",
+                app_id="m.http",
+                app_display_name="HTTP Push Notifications",
+                device_display_name="pushy push",
+                pushkey="a@example.com",
+                lang=None,
+                data={"url": "example.com"},
+            )
+        )
+
+        room = self.helper.create_room_as(user_id, tok=access_token)
+        self.helper.invite(room=room, src=user_id, tok=access_token, targ=other_user_id)
+        self.helper.join(room=room, user=other_user_id, tok=other_access_token)
+
+        # Only rooms the user has a read receipt in count towards the badge.
+        event_id = self.helper.send(room, body="Hello", tok=access_token)["event_id"]
+        self._send_read_receipt(room, event_id, access_token)
+
+        # The user has nothing unread, which is sent to the push gateway.
+        self.assertEqual(len(self.push_attempts), 1)
+        self.assertEqual(
+            self.push_attempts[0][2]["notification"]["counts"]["unread"], 0
+        )
+        self.push_attempts[0][0].callback({})
+        self.pump()
+
+        # A message from the other user makes the room unread.
+        event_id = self.helper.send(room, body="Hi!", tok=other_access_token)[
+            "event_id"
+        ]
+        self.pump()
+        self.assertEqual(len(self.push_attempts), 2)
+        self.assertEqual(
+            self.push_attempts[1][2]["notification"]["content"]["body"], "Hi!"
+        )
+        self.assertEqual(
+            self.push_attempts[1][2]["notification"]["counts"]["unread"], 1
+        )
+        self.push_attempts[1][0].callback({})
+        self.pump()
+
+        # Reading it sends an updated badge count.
+        self._send_read_receipt(room, event_id, access_token)
+        self.assertEqual(len(self.push_attempts), 3)
+        self.assertEqual(
+            self.push_attempts[2][2]["notification"]["counts"]["unread"], 0
+        )
+        self.push_attempts[2][0].callback({})
+        self.pump()
+
+        # Another receipt which doesn't change the badge count doesn't get sent.
+        event_id = self.helper.send(room, body="Hello again", tok=access_token)[
+            "event_id"
+        ]
+        self._send_read_receipt(room, event_id, access_token)
+        self.assertEqual(len(self.push_attempts), 3)
+
+    def test_badge_count_replayed_push_action(self):
+        """
+        Replaying a push action which the user has already read (e.g. when
+        catching up after a backoff) doesn't make its room count as unread.
+        """
+        user_id = self.register_user("user", "pass")
+        access_token = self.login("user", "pass")
+
+        other_user_id = self.register_user("otheruser", "pass")
+        other_access_token = self.login("otheruser", "pass")
+
+        user_tuple = self.get_success(
+            self.hs.get_datastore().get_user_by_access_token(access_token)
+        )
+        self.get_success(
+            self.hs.get_pusherpool().add_pusher(
+                user_id=user_id,
+                access_token=user_tuple["token_id"],
+                kind="http",
+                app_id="m.http",
+                app_display_name="HTTP Push Notifications",
+                device_display_name="pushy push",
+                pushkey="a@example.com",
+                lang=None,
+                data={"url": "example.com"},
+            )
+        )
+
+        room = self.helper.create_room_as(user_id, tok=access_token)
+        self.helper.invite(room=room, src=user_id, tok=access_token, targ=other_user_id)
+        self.helper.join(room=room, user=other_user_id, tok=other_access_token)
+
+        event_id = self.helper.send(room, body="Hello", tok=access_token)["event_id"]
+        self._send_read_receipt(room, event_id, access_token)
+        self.push_attempts[0][0].callback({})
+        self.pump()
+
+        # A message from the other user is pushed, and then read.
+        event_id = self.helper.send(room, body="Hi!", tok=other_access_token)[
+            "event_id"
+        ]
+        self.pump()
+        self.push_attempts[1][0].callback({})
+        self.pump()
+        self._send_read_receipt(room, event_id, access_token)
+        self.assertEqual(
+            self.push_attempts[2][2]["notification"]["counts"]["unread"], 0
+        )
+        self.push_attempts[2][0].callback({})
+        self.pump()
+
+        # Now process its push action again.
+        pusher = list(self.hs.get_pusherpool().pushers[user_id].values())[0]
+        self.assertIsNotNone(pusher._unread_room_ids)
+
+        event = self.get_success(self.hs.get_datastore().get_event(event_id))
+        d = pusher._process_one(
+            {
+                "event_id": event_id,
+                "room_id": room,
+                "stream_ordering": event.internal_metadata.stream_ordering,
+                "actions": ["notify"],
+            }
+        )
+        self.pump()
+
+        self.assertEqual(len(self.push_attempts), 4)
+        self.assertEqual(
+            self.push_attempts[3][2]["notification"]["counts"]["unread"], 0
+        )
+        self.push_attempts[3][0].callback({})
+        self.assertTrue(self.get_success(d))
+        self.assertEqual(pusher._unread_room_ids, set())
+
+    @override_config({"worker_pusher_shards": 2, "worker_pusher_shard_index": 1})
+    def test_sharded_pushers(self):
+        """
+        When the pushers are sharded, we only start the pushers for users in
+        our shard.
+        """
+        pusher_pool = self.hs.get_pusherpool()
+
+        expected_user_ids = set()
+        for i in range(10):
+            user_id = self.register_user("user%d" % (i,), "pass")
+            access_token = self.login("user%d" % (i,), "pass")
+            if zlib.crc32(user_id.encode("utf-8")) % 2 == 1:
+                expected_user_ids.add(user_id)
+
+            user_tuple = self.get_success(
+                self.hs.get_datastore().get_user_by_access_token(access_token)
+            )
+            self.get_success(
+                pusher_pool.add_pusher(
+                    user_id=user_id,
+                    access_token=user_tuple["token_id"],
+                    kind="http",
+                    app_id="m.http",
+                    app_display_name="HTTP Push Notifications",
+                    device_display_name="pushy push",
+                    pushkey="a@example.com",
+                    lang=None,
+                    data={"url": "example.com"},
+                )
+            )
+
+        # the users should be split between the shards
+        self.assertTrue(0 < len(expected_user_ids) < 10)
+        started_user_ids = {
+            user_id for user_id, pushers in pusher_pool.pushers.items() if pushers
+        }
+        self.assertEqual(started_user_ids, expected_user_ids)
+
+    def _send_read_receipt(self, room_id, event_id, access_token):
+        request, channel = self.make_request(
+            "POST",
+            "/rooms/%s/receipt/m.read/%s" % (room_id, event_id),
+            {},
+            access_token=access_token,
+        )
+        self.render(request)
+        self.assertEqual(channel.code, 200, channel.json_body)
+        self.pump()
@@ -32,3 +32,9 @@ class SlavedReceiptTestCase(BaseSlavedStoreTestCase):
         )
         self.replicate()
         self.check("get_receipts_for_user", [USER_ID, "m.read"], {ROOM_ID: EVENT_ID})
+        self.assertEqual(
+            self.slaved_store.get_receipt_users_changed_since(
+                self.slaved_store.get_max_receipt_stream_id() - 1
+            ),
+            [USER_ID],
+        )
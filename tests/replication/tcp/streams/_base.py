@@ -23,6 +23,9 @@ from tests.server import FakeTransport
 class BaseStreamTestCase(unittest.HomeserverTestCase):
     """Base class for tests of the replication streams"""
 
+    # the framing the client should ask the server to use
+    framing = None
+
     def prepare(self, reactor, clock, hs):
         # build a replication server
         server_factory = ReplicationStreamProtocolFactory(self.hs)
@@ -32,7 +35,7 @@ class BaseStreamTestCase(unittest.HomeserverTestCase):
         # build a replication client, with a dummy handler
         self.test_handler = TestReplicationClientHandler()
         self.client = ClientReplicationStreamProtocol(
-            "client", "test", clock, self.test_handler
+            "client", "test", clock, self.test_handler, framing=self.framing
         )
 
         # wire them together
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Copyright 2019 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from mock import Mock, patch
+
+from twisted.internet import defer
+
+from synapse.replication.tcp.streams._base import Stream
+
+from tests.replication.tcp.streams._base import BaseStreamTestCase
+
+ROOM_ID = "!room:blue"
+
+
+class StreamCatchupTestCase(BaseStreamTestCase):
+    def test_catchup_from_memory(self):
+        store = self.hs.get_datastore()
+        start_token = store.get_max_receipt_stream_id()
+
+        self._send_receipts(3)
+        self.replicate()
+
+        # the updates should now be served without going to the database
+        store.get_all_updated_receipts = Mock(side_effect=Exception("no db"))
+
+        updates, token, limited = self.get_success(
+            self.streamer.get_stream_updates("receipts", start_token)
+        )
+        self.assertFalse(limited)
+        self.assertEqual(token, start_token + 3)
+        self.assertEqual(
+            ["@user%i:blue" % (i,) for i in range(3)], [u[1][2] for u in updates]
+        )
+
+        updates, token, limited = self.get_success(
+            self.streamer.get_stream_updates("receipts", start_token + 2)
+        )
+        self.assertEqual(["@user2:blue"], [u[1][2] for u in updates])
+
+    @patch("synapse.replication.tcp.streams._base.RECENT_UPDATES_SIZE", 2)
+    @patch("synapse.replication.tcp.streams._base.MAX_EVENTS_BEHIND", 2)
+    def test_catchup_paged(self):
+        store = self.hs.get_datastore()
+        start_token = store.get_max_receipt_stream_id()
+
+        self._send_receipts(5)
+        self.replicate()
+
+        # the client is now further behind than we keep in memory, and than
+        # we'll fetch from the database in one go.
+        self.replicate_stream("receipts", start_token)
+        self.pump(0.1)
+
+        rdata_rows = self.test_handler.received_rdata_rows
+        self.assertEqual(
+            ["@user%i:blue" % (i,) for i in range(5)],
+            [row.user_id for _, _, row in rdata_rows],
+        )
+        self.assertEqual(
+            list(range(start_token + 1, start_token + 6)),
+            [token for _, token, _ in rdata_rows],
+        )
+
+    def test_catchup_after_stream_reset(self):
+        """If the stream position has gone backwards (e.g. the federation stream
+        after a restart), the client should still be sent the updates"""
+
+        class ResetStream(Stream):
+            NAME = "reset"
+
+            def current_token(self):
+                return 2
+
+            def update_function(self, from_token, to_token, limit):
+                return defer.succeed([(1, "a"), (2, "b")])
+
+        stream = ResetStream(self.hs)
+        updates, token, limited = self.get_success(stream.get_updates_since(5))
+        self.assertEqual(updates, [(1, ("a",)), (2, ("b",))])
+        self.assertEqual(token, 2)
+        self.assertFalse(limited)
+
+    @patch("synapse.replication.tcp.streams._base.MAX_EVENTS_BEHIND", 2)
+    def test_catchup_too_many_rows_at_one_token(self):
+        """If a full page of rows share a token, we can't make progress"""
+
+        class StuckStream(Stream):
+            NAME = "stuck"
+
+            def current_token(self):
+                return 3
+
+            def update_function(self, from_token, to_token, limit):
+                return defer.succeed([(2, "a"), (2, "b"), (2, "c")])
+
+        stream = StuckStream(self.hs)
+        self.get_failure(stream.get_updates_since(1), Exception)
+
+    def _send_receipts(self, count):
+        store = self.hs.get_datastore()
+        for i in range(count):
+            self.get_success(
+                store.insert_receipt(
+                    ROOM_ID,
+                    "m.read",
+                    "@user%i:blue" % (i,),
+                    ["$event%i:blue" % (i,)],
+                    {},
+                )
+            )
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Copyright 2019 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from mock import patch
+
+import synapse.rest.admin
+from synapse.rest.client.v1 import login, room
+
+from tests.replication.tcp.streams._base import BaseStreamTestCase
+
+NUM_NOTIFIED_USERS = 3
+
+
+class EventsStreamTestCase(BaseStreamTestCase):
+
+    servlets = [
+        synapse.rest.admin.register_servlets_for_client_rest_resource,
+        room.register_servlets,
+        login.register_servlets,
+    ]
+
+    @patch("synapse.replication.tcp.streams._base.MAX_EVENTS_BEHIND", 2)
+    def test_event_notifying_many_users(self):
+        """An event which notifies more users than we send down replication in
+        one go should still be a single update.
+        """
+        store = self.hs.get_datastore()
+
+        sender_id = self.register_user("sender", "pass")
+        sender_token = self.login("sender", "pass")
+        room_id = self.helper.create_room_as(sender_id, tok=sender_token)
+        event_id = self.helper.send(room_id, body="Hello", tok=sender_token)["event_id"]
+
+        # push actions are only calculated for users with pushers or read
+        # receipts in the room
+        user_ids = []
+        for i in range(NUM_NOTIFIED_USERS):
+            user_id = self.register_user("user%i" % (i,), "pass")
+            access_token = self.login("user%i" % (i,), "pass")
+            self.helper.join(room_id, user_id, tok=access_token)
+            self.get_success(
+                store.insert_receipt(room_id, "m.read", user_id, [event_id], {})
+            )
+            user_ids.append(user_id)
+
+        self.replicate_stream("events", "NOW")
+
+        event_id = self.helper.send(room_id, body="Hi!", tok=sender_token)["event_id"]
+        self.replicate()
+
+        event = self.get_success(store.get_event(event_id))
+        stream_ordering = event.internal_metadata.stream_ordering
+
+        # there should be a single row for the event, however many users it
+        # notified
+        rdata_rows = self.test_handler.received_rdata_rows
+        self.assertEqual(1, len(rdata_rows))
+        self.assertEqual(rdata_rows[0][0], "events")
+        self.assertEqual(rdata_rows[0][1], stream_ordering)
+        self.assertEqual(rdata_rows[0][2].data.event_id, event_id)
+
+        # and the master can tell who to poke without going to the database
+        self.assertCountEqual(
+            store.get_push_action_users_changed_since(stream_ordering - 1), user_ids
+        )
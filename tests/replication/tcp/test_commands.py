@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Copyright 2019 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from synapse.replication.tcp.commands import RdataCommand
+
+from tests import unittest
+
+
+class RdataCommandTestCase(unittest.TestCase):
+    def test_to_bytes(self):
+        cmd = RdataCommand("events", 12, ["$event:test", "!room:test"])
+        self.assertEqual(
+            cmd.to_bytes(), b'RDATA events 12 ["$event:test", "!room:test"]'
+        )
+
+        # parsing the line back should give us the same command
+        parsed = RdataCommand.from_line(cmd.to_line())
+        self.assertEqual(parsed.stream_name, "events")
+        self.assertEqual(parsed.token, 12)
+        self.assertEqual(parsed.row, ["$event:test", "!room:test"])
+
+    def test_batch_token(self):
+        cmd = RdataCommand("presence", None, ["@user:test"])
+        self.assertEqual(cmd.to_bytes(), b'RDATA presence batch ["@user:test"]')
+        self.assertIsNone(RdataCommand.from_line(cmd.to_line()).token)
+
+    def test_to_bytes_is_cached(self):
+        cmd = RdataCommand("events", 12, ["$event:test"])
+        self.assertIs(cmd.to_bytes(), cmd.to_bytes())
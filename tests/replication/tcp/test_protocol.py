@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Copyright 2019 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from tests.replication.tcp.streams._base import BaseStreamTestCase
+
+ROOM_ID = "!room:blue"
+
+
+class CompactFramingTestCase(BaseStreamTestCase):
+    framing = "compact"
+
+    def test_framing_negotiated(self):
+        self.pump(0.1)
+        self.assertTrue(self.client._framed_inbound)
+
+    def test_rdata(self):
+        self.replicate_stream("receipts", "NOW")
+
+        self._send_receipts(20)
+        self.replicate()
+        self.assertTrue(self.client._framed_inbound)
+
+        rdata_rows = self.test_handler.received_rdata_rows
+        self.assertEqual(
+            ["@user%i:blue" % (i,) for i in range(20)],
+            [row.user_id for _, _, row in rdata_rows],
+        )
+        self.assertEqual(
+            ["$event%i:blue" % (i,) for i in range(20)],
+            [row.event_id for _, _, row in rdata_rows],
+        )
+
+        # and again, to check the connection is still in a good state
+        self.test_handler.received_rdata_rows = []
+        self._send_receipts(5, offset=20)
+        self.replicate()
+
+        self.assertEqual(5, len(self.test_handler.received_rdata_rows))
+
+    def _send_receipts(self, count, offset=0):
+        store = self.hs.get_datastore()
+        for i in range(offset, offset + count):
+            self.get_success(
+                store.insert_receipt(
+                    ROOM_ID,
+                    "m.read",
+                    "@user%i:blue" % (i,),
+                    ["$event%i:blue" % (i,)],
+                    {},
+                )
+            )
+
+
+class CompressedFramingTestCase(CompactFramingTestCase):
+    framing = "compressed"
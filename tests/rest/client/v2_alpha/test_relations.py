@@ -447,6 +447,70 @@ class RelationsTestCase(unittest.HomeserverTestCase):
             },
         )
 
+    def test_aggregation_messages(self):
+        """Test that relations are bundled correctly when serializing a page
+        of events at once.
+        """
+        res = self.helper.send(self.room, body="Hi again!", tok=self.user_token)
+        parent_2 = res["event_id"]
+
+        channel = self._send_relation(RelationTypes.ANNOTATION, "m.reaction", "a")
+        self.assertEquals(200, channel.code, channel.json_body)
+
+        channel = self._send_relation(
+            RelationTypes.ANNOTATION, "m.reaction", "b", parent_id=parent_2
+        )
+        self.assertEquals(200, channel.code, channel.json_body)
+
+        channel = self._send_relation(RelationTypes.REFERENCE, "m.room.test")
+        self.assertEquals(200, channel.code, channel.json_body)
+        reply = channel.json_body["event_id"]
+
+        new_body = {"msgtype": "m.text", "body": "I've been edited!"}
+        channel = self._send_relation(
+            RelationTypes.REPLACE,
+            "m.room.message",
+            content={"msgtype": "m.text", "body": "foo", "m.new_content": new_body},
+            parent_id=parent_2,
+        )
+        self.assertEquals(200, channel.code, channel.json_body)
+        edit_event_id = channel.json_body["event_id"]
+
+        request, channel = self.make_request(
+            "GET",
+            "/rooms/%s/messages?dir=b&limit=20" % (self.room,),
+            access_token=self.user_token,
+        )
+        self.render(request)
+        self.assertEquals(200, channel.code, channel.json_body)
+
+        events = {e["event_id"]: e for e in channel.json_body["chunk"]}
+
+        self.assertEquals(
+            events[self.parent_id]["unsigned"].get("m.relations"),
+            {
+                RelationTypes.ANNOTATION: {
+                    "chunk": [{"type": "m.reaction", "key": "a", "count": 1}]
+                },
+                RelationTypes.REFERENCE: {"chunk": [{"event_id": reply}]},
+            },
+        )
+
+        self.assertEquals(events[parent_2]["content"], new_body)
+        relations = events[parent_2]["unsigned"].get("m.relations")
+        self.assertEquals(
+            relations[RelationTypes.ANNOTATION],
+            {"chunk": [{"type": "m.reaction", "key": "b", "count": 1}]},
+        )
+        self.assertNotIn(RelationTypes.REFERENCE, relations)
+        self.assert_dict(
+            {"event_id": edit_event_id, "sender": self.user_id},
+            relations[RelationTypes.REPLACE],
+        )
+
+        # events without relations don't get any bundled
+        self.assertNotIn("m.relations", events[reply]["unsigned"])
+
     def test_edit(self):
         """Test that a simple edit works.
         """
@@ -15,10 +15,12 @@
 # limitations under the License.
 
 
-from mock import Mock
+from mock import Mock, call
 
 from twisted.internet import defer
 
+from synapse.replication.tcp.streams._base import CachesStreamRow
+from synapse.storage._base import SQLBaseStore
 from synapse.util.async_helpers import ObservableDeferred
 from synapse.util.caches.descriptors import Cache, cached
 
@@ -317,6 +319,36 @@ class CacheDecoratorTestCase(unittest.TestCase):
         self.assertEquals(callcount2[0], 3)
 
 
+class ProcessCacheInvalidationRowsTestCase(unittest.TestCase):
+    def test_rows_merged(self):
+        store = Mock()
+        rows = [
+            CachesStreamRow("get_user_by_id", ["@a:test"], 0),
+            CachesStreamRow("cs_cache_fake", ["!r:test", "@a:test"], 0),
+            CachesStreamRow(
+                "bulk_cache_fake",
+                ["count_e2e_one_time_keys", "2", "@a:test", "D1", "@b:test", "D2"],
+                0,
+            ),
+            CachesStreamRow("cs_cache_fake", ["!r:test", "@b:test"], 0),
+            CachesStreamRow("get_user_by_id", ["@a:test"], 0),
+        ]
+
+        SQLBaseStore._process_cache_invalidation_rows(store, rows)
+
+        store._invalidate_state_caches.assert_called_once_with(
+            "!r:test", {"@a:test", "@b:test"}
+        )
+        self.assertEqual(
+            store._attempt_to_invalidate_cache.call_args_list,
+            [
+                call("get_user_by_id", ("@a:test",)),
+                call("count_e2e_one_time_keys", ("@a:test", "D1")),
+                call("count_e2e_one_time_keys", ("@b:test", "D2")),
+            ],
+        )
+
+
 class UpsertManyTests(unittest.HomeserverTestCase):
     def prepare(self, reactor, clock, hs):
         self.storage = hs.get_datastore()
@@ -14,7 +14,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from mock import Mock
+from mock import Mock, patch
 
 from twisted.internet import defer
 
@@ -134,6 +134,72 @@ class ClientIpStoreTestCase(unittest.HomeserverTestCase):
             ],
         )
 
+    @unittest.override_config({"client_ip_last_seen_granularity": "10m"})
+    def test_last_seen_granularity(self):
+        self.reactor.advance(12345678)
+
+        user_id = "@user:id"
+        self.get_success(
+            self.store.insert_client_ip(
+                user_id, "access_token", "ip", "user_agent", "device_id"
+            )
+        )
+        self.reactor.advance(5 * 60)
+
+        # this is outside the default granularity of 2m, but within the
+        # configured one, so shouldn't be recorded
+        self.get_success(
+            self.store.insert_client_ip(
+                user_id, "access_token", "ip", "user_agent", "device_id"
+            )
+        )
+        self.reactor.advance(10)
+
+        result = self.get_success(
+            self.store.get_last_client_ip_by_device(user_id, "device_id")
+        )
+        self.assertEqual(result[(user_id, "device_id")]["last_seen"], 12345678000)
+
+        # once the configured granularity has passed, it should be recorded
+        self.reactor.advance(5 * 60)
+        self.get_success(
+            self.store.insert_client_ip(
+                user_id, "access_token", "ip", "user_agent", "device_id"
+            )
+        )
+        self.reactor.advance(10)
+
+        result = self.get_success(
+            self.store.get_last_client_ip_by_device(user_id, "device_id")
+        )
+        self.assertEqual(result[(user_id, "device_id")]["last_seen"], 12346288000)
+
+    @patch("synapse.storage.client_ips.MAX_PENDING_CLIENT_IP_UPDATES", 2)
+    def test_full_buffer_is_written_out(self):
+        user_id = "@user:id"
+        for ip in ("ip1", "ip2", "ip3"):
+            self.get_success(
+                self.store.insert_client_ip(
+                    user_id, "access_token", ip, "user_agent", "device_id"
+                )
+            )
+
+        # the first two should have been written out when the third arrived,
+        # without waiting for the storage loop.
+        self.pump(0)
+        result = self.get_success(
+            self.store._simple_select_onecol(
+                table="user_ips",
+                keyvalues={"user_id": user_id},
+                retcol="ip",
+                desc="get_user_ips",
+            )
+        )
+        self.assertCountEqual(result, ["ip1", "ip2"])
+        self.assertEqual(
+            list(self.store._batch_row_update), [(user_id, "access_token", "ip3")]
+        )
+
     def test_disabled_monthly_active_user(self):
         self.hs.config.limit_usage_by_mau = False
         self.hs.config.max_mau_value = 50
@@ -165,6 +165,38 @@ class RedactionTestCase(unittest.HomeserverTestCase):
             event.unsigned["redacted_because"],
         )
 
+    def test_unredacted_event_not_decoded(self):
+        """Loading a non-state event which hasn't been redacted shouldn't need
+        its JSON to be decoded.
+        """
+        self.get_success(
+            self.inject_room_member(self.room1, self.u_alice, Membership.JOIN)
+        )
+
+        # inject_message gives its events a state key, so build our own
+        builder = self.event_builder_factory.for_room_version(
+            RoomVersions.V1,
+            {
+                "type": EventTypes.Message,
+                "sender": self.u_alice.to_string(),
+                "room_id": self.room1.to_string(),
+                "content": {"body": "t", "msgtype": "message"},
+            },
+        )
+        msg_event, context = self.get_success(
+            self.event_creation_handler.create_new_client_event(builder)
+        )
+        self.get_success(self.store.persist_event(msg_event, context))
+
+        self.store._get_event_cache.invalidate_all()
+        event = self.get_success(self.store.get_event(msg_event.event_id))
+
+        self.assertEqual(event.type, EventTypes.Message)
+        self.assertIsNotNone(event._json)
+
+        self.assertEqual(event.content, {"body": "t", "msgtype": "message"})
+        self.assertIsNone(event._json)
+
     def test_redact_join(self):
         self.get_success(
             self.inject_room_member(self.room1, self.u_alice, Membership.JOIN)
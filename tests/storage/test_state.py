@@ -15,12 +15,15 @@
 
 import logging
 
+from mock import patch
+
 from twisted.internet import defer
 
 from synapse.api.constants import EventTypes, Membership
 from synapse.api.room_versions import RoomVersions
 from synapse.storage.state import StateFilter
 from synapse.types import RoomID, UserID
+from synapse.util.caches.dictionary_cache import DictionaryOverlay
 
 import tests.unittest
 import tests.utils
@@ -469,3 +472,224 @@ class StateStoreTestCase(tests.unittest.TestCase):
 
         self.assertEqual(is_all, True)
         self.assertDictEqual({(e5.type, e5.state_key): e5.event_id}, state_dict)
+
+
+class GetStateGroupsFromGroupsTestCase(tests.unittest.HomeserverTestCase):
+    def prepare(self, reactor, clock, hs):
+        self.store = hs.get_datastore()
+
+    def test_multiple_groups(self):
+        room_id = "!room:test"
+        base_state = {
+            ("m.room.create", ""): "$create",
+            ("m.room.member", "@a:test"): "$a",
+        }
+        base = self._store_state_group(room_id, None, None, base_state)
+
+        # two branches off the same base group, one two deltas long
+        b1_state = dict(base_state)
+        b1_state[("m.room.member", "@b:test")] = "$b"
+        b1 = self._store_state_group(
+            room_id, base, {("m.room.member", "@b:test"): "$b"}, b1_state
+        )
+        b2_state = dict(b1_state)
+        b2_state[("m.room.member", "@a:test")] = "$a2"
+        b2 = self._store_state_group(
+            room_id, b1, {("m.room.member", "@a:test"): "$a2"}, b2_state
+        )
+        c1_state = dict(base_state)
+        c1_state[("m.room.name", "")] = "$name"
+        c1 = self._store_state_group(
+            room_id, base, {("m.room.name", ""): "$name"}, c1_state
+        )
+
+        # and a group in another room
+        other = self._store_state_group(
+            "!other:test", None, None, {("m.room.create", ""): "$other"}
+        )
+
+        groups = [base, b1, b2, c1, other]
+        results = self.get_success(
+            self.store._get_state_groups_from_groups(groups, StateFilter.all())
+        )
+        self.assertEqual(
+            results,
+            {
+                base: base_state,
+                b1: b1_state,
+                b2: b2_state,
+                c1: c1_state,
+                other: {("m.room.create", ""): "$other"},
+            },
+        )
+
+        # now with a filter
+        state_filter = StateFilter.from_types(
+            [("m.room.member", "@a:test"), ("m.room.name", None)]
+        )
+        results = self.get_success(
+            self.store._get_state_groups_from_groups(groups, state_filter)
+        )
+        self.assertEqual(
+            results,
+            {
+                base: {("m.room.member", "@a:test"): "$a"},
+                b1: {("m.room.member", "@a:test"): "$a"},
+                b2: {("m.room.member", "@a:test"): "$a2"},
+                c1: {("m.room.member", "@a:test"): "$a", ("m.room.name", ""): "$name"},
+                other: {},
+            },
+        )
+
+    def _store_state_group(self, room_id, prev_group, delta_ids, current_state_ids):
+        return self.get_success(
+            self.store.store_state_group(
+                "$event", room_id, prev_group, delta_ids, current_state_ids
+            )
+        )
+
+
+class StateGroupCacheTestCase(tests.unittest.HomeserverTestCase):
+    def prepare(self, reactor, clock, hs):
+        self.store = hs.get_datastore()
+
+    def test_prefill_shares_prev_group(self):
+        room_id = "!room:test"
+        base_state = {
+            ("m.room.create", ""): "$create",
+            ("m.room.member", "@a:test"): "$a",
+        }
+        base = self._store_state_group(room_id, None, None, base_state)
+
+        state = dict(base_state)
+        state[("m.room.member", "@b:test")] = "$b"
+        group = self._store_state_group(
+            room_id, base, {("m.room.member", "@b:test"): "$b"}, state
+        )
+
+        members_entry = self.store._state_group_members_cache.cache[group]
+        self.assertIsInstance(members_entry.value, DictionaryOverlay)
+        self.assertEqual(
+            dict(members_entry.value),
+            {("m.room.member", "@a:test"): "$a", ("m.room.member", "@b:test"): "$b"},
+        )
+
+        non_members_entry = self.store._state_group_cache.cache[group]
+        self.assertEqual(
+            dict(non_members_entry.value), {("m.room.create", ""): "$create"}
+        )
+
+        results = self.get_success(
+            self.store._get_state_for_groups([group], StateFilter.all())
+        )
+        self.assertEqual(results, {group: state})
+
+    def _store_state_group(self, room_id, prev_group, delta_ids, current_state_ids):
+        return self.get_success(
+            self.store.store_state_group(
+                "$event", room_id, prev_group, delta_ids, current_state_ids
+            )
+        )
+
+
+class StateGroupCompactionTestCase(tests.unittest.HomeserverTestCase):
+    def prepare(self, reactor, clock, hs):
+        self.store = hs.get_datastore()
+        self.room_id = "!room:test"
+
+        # get the background updates from the schema out of the way
+        self._run_background_updates()
+
+    def test_redundant_rows_removed(self):
+        g1 = self._store_state_group(None, None, {("a", ""): "$1", ("b", ""): "$2"})
+        g2 = self._store_state_group(
+            g1,
+            {("a", ""): "$1", ("c", ""): "$3"},
+            {("a", ""): "$1", ("b", ""): "$2", ("c", ""): "$3"},
+        )
+
+        self._compact()
+
+        prev_group, delta = self.get_success(self.store.get_state_group_delta(g2))
+        self.assertEqual(prev_group, g1)
+        self.assertEqual(delta, {("c", ""): "$3"})
+
+        self.store._state_group_cache.invalidate_all()
+        state = self.get_success(self.store.get_state_ids_for_group(g2))
+        self.assertEqual(state, {("a", ""): "$1", ("b", ""): "$2", ("c", ""): "$3"})
+
+    def test_only_delta_keys_of_prev_group_loaded(self):
+        g1 = self._store_state_group(None, None, {("a", ""): "$1", ("b", ""): "$2"})
+        g2 = self._store_state_group(
+            g1, {("c", ""): "$3"}, {("a", ""): "$1", ("b", ""): "$2", ("c", ""): "$3"}
+        )
+        g3 = self._store_state_group(
+            g2,
+            {("a", ""): "$1", ("b", ""): "$4"},
+            {("a", ""): "$1", ("b", ""): "$4", ("c", ""): "$3"},
+        )
+
+        get_state = self.store._get_state_groups_from_groups_txn
+        with patch.object(
+            self.store, "_get_state_groups_from_groups_txn", side_effect=get_state
+        ) as mock_get_state:
+            self._compact()
+
+        # the state of the previous group should only have been looked up for
+        # the keys in the delta.
+        for call in mock_get_state.call_args_list:
+            self.assertFalse(call[1]["state_filter"].is_full())
+
+        prev_group, delta = self.get_success(self.store.get_state_group_delta(g3))
+        self.assertEqual(prev_group, g2)
+        self.assertEqual(delta, {("b", ""): "$4"})
+
+    def test_long_chains_broken(self):
+        state = {("a", ""): "$0"}
+        groups = [self._store_state_group(None, None, state)]
+        for i in range(1, 5):
+            delta = {("k%i" % (i,), ""): "$%i" % (i,)}
+            state = dict(state)
+            state.update(delta)
+            groups.append(self._store_state_group(groups[-1], delta, state))
+
+        with patch("synapse.storage.state.MAX_STATE_DELTA_HOPS", 2):
+            self._compact()
+
+        # every chain of deltas should now be at most two long
+        prev_groups = {
+            g: self.get_success(self.store.get_state_group_delta(g)).prev_group
+            for g in groups
+        }
+        for group in groups:
+            hops = 0
+            while prev_groups[group]:
+                group = prev_groups[group]
+                hops += 1
+            self.assertLessEqual(hops, 2)
+
+        self.store._state_group_cache.invalidate_all()
+        self.assertEqual(
+            self.get_success(self.store.get_state_ids_for_group(groups[-1])), state
+        )
+
+    def _store_state_group(self, prev_group, delta_ids, current_state_ids):
+        return self.get_success(
+            self.store.store_state_group(
+                "$event", self.room_id, prev_group, delta_ids, current_state_ids
+            )
+        )
+
+    def _compact(self):
+        self.get_success(
+            self.store._simple_insert(
+                "background_updates",
+                {"update_name": "state_group_compaction", "progress_json": "{}"},
+            )
+        )
+        self.store._all_done = False
+        self._run_background_updates()
+
+    def _run_background_updates(self):
+        while not self.get_success(self.store.has_completed_background_updates()):
+            self.get_success(self.store.do_next_background_update(100), by=0.1)
@@ -15,6 +15,7 @@
 import logging
 import re
 
+from mock import Mock
 from six import StringIO
 
 from twisted.internet.defer import Deferred
@@ -24,10 +25,11 @@ from twisted.web.resource import Resource
 from twisted.web.server import NOT_DONE_YET
 
 from synapse.api.errors import Codes, SynapseError
-from synapse.http.server import JsonResource
+from synapse.http.server import JsonResource, _ByteProducer
 from synapse.http.site import SynapseSite, logger
 from synapse.logging.context import make_deferred_yieldable
 from synapse.util import Clock
+from synapse.util.frozenutils import freeze
 
 from tests import unittest
 from tests.server import (
@@ -140,6 +142,136 @@ class JsonResourceTests(unittest.TestCase):
         self.assertEqual(channel.json_body["error"], "Forbidden!!one!")
         self.assertEqual(channel.json_body["errcode"], "M_FORBIDDEN")
 
+    def test_large_response(self):
+        """
+        A response bigger than a chunk is written out in full, with the right
+        Content-Length.
+        """
+        body = {"foo": ["x" * 1000] * 200}
+
+        def _callback(request, **kwargs):
+            return (200, body)
+
+        res = JsonResource(self.homeserver)
+        res.register_paths(
+            "GET", [re.compile("^/_matrix/foo$")], _callback, "test_servlet"
+        )
+
+        request, channel = make_request(self.reactor, b"GET", b"/_matrix/foo")
+        render(request, res, self.reactor)
+
+        self.assertEqual(channel.result["code"], b"200")
+        self.assertEqual(channel.json_body, body)
+        self.assertEqual(
+            channel.headers.getRawHeaders(b"Content-Length"),
+            [b"%d" % (len(channel.result["body"]),)],
+        )
+
+    def test_encode_in_threadpool(self):
+        """
+        Responses are only encoded on the threadpool for handlers which ask for
+        it, and only if it is enabled in the config.
+        """
+        body = {"foo": ["x" * 1000] * 200}
+        threadpool = self.reactor.getThreadPool()
+        threadpool.callInThreadWithCallback = Mock(
+            wraps=threadpool.callInThreadWithCallback
+        )
+
+        def _callback(request, **kwargs):
+            return (200, body)
+
+        for enabled, encode_in_threadpool in (
+            (False, True),
+            (True, False),
+            (True, True),
+        ):
+            self.homeserver.config.encode_large_responses_in_threadpool = enabled
+            threadpool.callInThreadWithCallback.reset_mock()
+
+            res = JsonResource(self.homeserver)
+            res.register_paths(
+                "GET",
+                [re.compile("^/_matrix/foo$")],
+                _callback,
+                "test_servlet",
+                encode_in_threadpool=encode_in_threadpool,
+            )
+
+            request, channel = make_request(self.reactor, b"GET", b"/_matrix/foo")
+            render(request, res, self.reactor)
+
+            self.assertEqual(channel.result["code"], b"200")
+            self.assertEqual(channel.json_body, body)
+            self.assertEqual(
+                threadpool.callInThreadWithCallback.called,
+                enabled and encode_in_threadpool,
+            )
+
+    def test_unencodable_response_in_threadpool(self):
+        """
+        If the response can't be encoded as JSON on the threadpool, we return a
+        500.
+        """
+        self.homeserver.config.encode_large_responses_in_threadpool = True
+
+        def _callback(request, **kwargs):
+            return (200, {"foo": object()})
+
+        res = JsonResource(self.homeserver)
+        res.register_paths(
+            "GET",
+            [re.compile("^/_matrix/foo$")],
+            _callback,
+            "test_servlet",
+            encode_in_threadpool=True,
+        )
+
+        request, channel = make_request(self.reactor, b"GET", b"/_matrix/foo")
+        render(request, res, self.reactor)
+
+        self.assertEqual(channel.result["code"], b"500")
+        self.assertEqual(channel.json_body["errcode"], "M_UNKNOWN")
+
+    def test_non_canonical_frozendict_response(self):
+        """
+        Non-canonical responses are encoded compactly, and can contain
+        frozendicts.
+        """
+
+        def _callback(request, **kwargs):
+            return (200, freeze({"foo": {"bar": [1, "\N{SNOWMAN}"]}}))
+
+        res = JsonResource(self.homeserver, canonical_json=False)
+        res.register_paths(
+            "GET", [re.compile("^/_matrix/foo$")], _callback, "test_servlet"
+        )
+
+        request, channel = make_request(self.reactor, b"GET", b"/_matrix/foo")
+        render(request, res, self.reactor)
+
+        self.assertEqual(channel.result["code"], b"200")
+        self.assertEqual(channel.result["body"], b'{"foo":{"bar":[1,"\\u2603"]}}')
+
+    def test_unencodable_response(self):
+        """
+        If the response can't be encoded as JSON, we return a 500.
+        """
+
+        def _callback(request, **kwargs):
+            return (200, {"foo": object()})
+
+        res = JsonResource(self.homeserver)
+        res.register_paths(
+            "GET", [re.compile("^/_matrix/foo$")], _callback, "test_servlet"
+        )
+
+        request, channel = make_request(self.reactor, b"GET", b"/_matrix/foo")
+        render(request, res, self.reactor)
+
+        self.assertEqual(channel.result["code"], b"500")
+        self.assertEqual(channel.json_body["errcode"], "M_UNKNOWN")
+
     def test_no_handler(self):
         """
         If there is no handler to process the request, Synapse will return 400.
@@ -164,6 +296,28 @@ class JsonResourceTests(unittest.TestCase):
         self.assertEqual(channel.json_body["errcode"], "M_UNRECOGNIZED")
 
 
+class ByteProducerTestCase(unittest.TestCase):
+    def test_connection_closed_during_write(self):
+        """
+        If writing a chunk closes the connection, the producer stops without
+        finishing the request.
+        """
+        request = Mock()
+        producer = _ByteProducer(request, b"x" * (_ByteProducer.CHUNK_SIZE + 1))
+        request.write.side_effect = lambda data: producer.stopProducing()
+
+        producer.start()
+        producer.resumeProducing()
+
+        request.write.assert_called_once()
+        request.unregisterProducer.assert_not_called()
+        request.finish.assert_not_called()
+
+        # further calls do nothing
+        producer.resumeProducing()
+        request.write.assert_called_once()
+
+
 class SiteTestCase(unittest.HomeserverTestCase):
     def test_lose_connection(self):
         """
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Copyright 2019 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from synapse.util.caches import intern_metrics, intern_string
+
+from tests import unittest
+
+
+class InternStringTestCase(unittest.TestCase):
+    def test_duplicates_collapse(self):
+        # build the strings at runtime so that they aren't constants
+        first = intern_string("".join(["$event", ":test_duplicates_collapse"]))
+
+        duplicates = intern_metrics.duplicates
+        duplicate_bytes = intern_metrics.duplicate_bytes
+
+        second = "".join(["$event", ":test_duplicates_collapse"])
+        self.assertIsNot(first, second)
+        self.assertIs(intern_string(second), first)
+
+        self.assertEqual(intern_metrics.duplicates, duplicates + 1)
+        self.assertGreater(intern_metrics.duplicate_bytes, duplicate_bytes)
+
+        # interning the interned copy again isn't a duplicate
+        self.assertIs(intern_string(first), first)
+        self.assertEqual(intern_metrics.duplicates, duplicates + 1)
+
+    def test_none(self):
+        self.assertIsNone(intern_string(None))
@@ -14,7 +14,11 @@
 # limitations under the License.
 
 
-from synapse.util.caches.dictionary_cache import DictionaryCache
+from synapse.util.caches.dictionary_cache import (
+    MAX_OVERLAY_DEPTH,
+    DictionaryCache,
+    DictionaryOverlay,
+)
 
 from tests import unittest
 
@@ -89,3 +93,137 @@ class DictCacheTestCase(unittest.TestCase):
             },
             c.value,
         )
+
+    def test_update_from_delta(self):
+        seq = self.cache.sequence
+        base_value = {"a": "1", "b": "2"}
+        self.cache.update(seq, "base", base_value)
+        self.cache.update_from_delta(
+            seq, "key", {"a": "1", "b": "3", "c": "4"}, "base", {"b": "3", "c": "4"}
+        )
+
+        entry = self.cache.cache["key"]
+        self.assertIsInstance(entry.value, DictionaryOverlay)
+        self.assertEqual(len(entry.value), 3)
+
+        # the entry is only charged for its delta
+        self.assertEqual(len(entry), 2)
+
+        c = self.cache.get("key")
+        self.assertTrue(c.full)
+        self.assertEqual({"a": "1", "b": "3", "c": "4"}, c.value)
+
+        c = self.cache.get("key", ["b", "d"])
+        self.assertEqual({"b": "3"}, c.value)
+
+        # the base entry is unchanged
+        self.assertEqual(base_value, self.cache.get("base").value)
+
+    def test_update_from_delta_uncached_base(self):
+        seq = self.cache.sequence
+        value = {"a": "1", "b": "2"}
+        self.cache.update_from_delta(seq, "key", value, "base", {"b": "2"})
+
+        self.assertIs(self.cache.cache["key"].value, value)
+
+    def test_update_from_delta_flattens(self):
+        seq = self.cache.sequence
+        value = {"a": 0}
+        self.cache.update(seq, 0, dict(value))
+        for i in range(1, MAX_OVERLAY_DEPTH + 2):
+            value[i] = i
+            self.cache.update_from_delta(seq, i, dict(value), i - 1, {i: i})
+
+        self.assertEqual(
+            self.cache.cache[MAX_OVERLAY_DEPTH].value.depth, MAX_OVERLAY_DEPTH
+        )
+        self.assertIsInstance(self.cache.cache[MAX_OVERLAY_DEPTH + 1].value, dict)
+        self.assertEqual(value, self.cache.get(MAX_OVERLAY_DEPTH + 1).value)
+
+    def test_overlays_evicted_with_base(self):
+        """Overlays shouldn't keep their base alive once it has been evicted,
+        as they are not charged for it"""
+        self.cache = DictionaryCache("foobar", max_entries=200)
+        seq = self.cache.sequence
+
+        for root in range(10):
+            value = {("k", i): i for i in range(100)}
+            self.cache.update(seq, (root, 0), dict(value))
+            for i in range(1, 6):
+                value[("k", i)] = -i
+                self.cache.update_from_delta(
+                    seq, (root, i), dict(value), (root, i - 1), {("k", i): -i}
+                )
+                # keep the newest overlay hot, so that its base is evicted
+                # first.
+                self.cache.get((root, i))
+
+        # every dict which is still reachable from the cache should be
+        # accounted for.
+        retained = {}
+        for root in range(10):
+            for i in range(6):
+                entry = self.cache.cache.get((root, i))
+                layer = entry.value if entry else None
+                while isinstance(layer, DictionaryOverlay):
+                    retained[id(layer.delta)] = len(layer.delta)
+                    layer = layer._base
+                if layer is not None:
+                    retained[id(layer)] = len(layer)
+
+        self.assertLessEqual(sum(retained.values()), 200)
+        self.assertLessEqual(self.cache.cache.len(), 200)
+
+    def test_overlays_evicted_on_invalidation(self):
+        seq = self.cache.sequence
+        self.cache.update(seq, "base", {"a": "1", "b": "2"})
+        self.cache.update_from_delta(
+            seq, "key", {"a": "1", "b": "3"}, "base", {"b": "3"}
+        )
+        self.cache.update_from_delta(
+            seq, "key2", {"a": "1", "b": "4"}, "key", {"b": "4"}
+        )
+
+        self.cache.invalidate("base")
+        self.assertNotIn("key", self.cache.cache)
+        self.assertNotIn("key2", self.cache.cache)
+
+
+class DictionaryOverlayTestCase(unittest.TestCase):
+    def test_overlay(self):
+        base = {"a": 1, "b": 2}
+        overlay = DictionaryOverlay(base, {"b": 3})
+        overlay = DictionaryOverlay(overlay, {"c": 4})
+
+        self.assertEqual(overlay.depth, 2)
+        self.assertEqual(len(overlay), 3)
+        self.assertEqual(sorted(overlay), ["a", "b", "c"])
+        self.assertEqual(dict(overlay), {"a": 1, "b": 3, "c": 4})
+        self.assertIn("a", overlay)
+        self.assertNotIn("d", overlay)
+        self.assertEqual(overlay.get("d"), None)
+
+    def test_to_dict(self):
+        base = {"a": 1, "b": 2}
+        overlay = DictionaryOverlay(base, {"b": 3})
+        overlay = DictionaryOverlay(overlay, {"b": 4, "c": 5})
+
+        d = overlay.to_dict()
+        self.assertIs(type(d), dict)
+        self.assertEqual(d, {"a": 1, "b": 4, "c": 5})
+        self.assertEqual(d, dict(overlay))
+        self.assertEqual(base, {"a": 1, "b": 2})
+
+    def test_full_base_not_changed_by_partial_update(self):
+        cache = DictionaryCache("foobar")
+        seq = cache.sequence
+        cache.update(seq, "base", {"a": "1"})
+        cache.update_from_delta(seq, "key", {"a": "1", "b": "2"}, "base", {"b": "2"})
+
+        # a racing partial fetch of the base must not change the mapping that
+        # the overlay is built on
+        cache.update(seq, "base", {"c": "3"}, fetched_keys={"c"})
+
+        self.assertEqual(cache.get("base").value, {"a": "1"})
+        self.assertEqual(cache.get("key").value, {"a": "1", "b": "2"})
+        self.assertEqual(len(cache.cache["key"].value), 2)
@@ -92,6 +92,36 @@ class StreamChangeCacheTests(unittest.TestCase):
         self.assertEqual(cache.get_all_entities_changed(3), ["user@elsewhere.org"])
         self.assertEqual(cache.get_all_entities_changed(0), None)
 
+    def test_multiple_entities_at_same_position(self):
+        """
+        Several entities can change at the same stream position, and moving
+        one of them on doesn't lose the others.
+        """
+        cache = StreamChangeCache("#test", 1)
+
+        cache.entity_has_changed("user@foo.com", 2)
+        cache.entity_has_changed("bar@baz.net", 2)
+        cache.entity_has_changed("user@elsewhere.org", 2)
+
+        self.assertCountEqual(
+            cache.get_all_entities_changed(1),
+            ["user@foo.com", "bar@baz.net", "user@elsewhere.org"],
+        )
+
+        cache.entity_has_changed("bar@baz.net", 3)
+
+        self.assertCountEqual(
+            cache.get_all_entities_changed(1),
+            ["user@foo.com", "bar@baz.net", "user@elsewhere.org"],
+        )
+        self.assertEqual(cache.get_all_entities_changed(2), ["bar@baz.net"])
+        self.assertEqual(
+            cache.get_entities_changed(["user@foo.com", "bar@baz.net"], 1),
+            {"user@foo.com", "bar@baz.net"},
+        )
+        self.assertTrue(cache.has_entity_changed("user@foo.com", 1))
+        self.assertFalse(cache.has_entity_changed("user@foo.com", 2))
+
     def test_has_any_entity_changed(self):
         """
         StreamChangeCache.has_any_entity_changed will return True if any
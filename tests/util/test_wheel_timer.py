@@ -72,3 +72,16 @@ class WheelTimerTestCase(unittest.TestCase):
         self.assertListEqual(wheel.fetch(147), [obj2])
         self.assertListEqual(wheel.fetch(200), [obj1])
         self.assertListEqual(wheel.fetch(240), [])
+
+    def test_insert_duplicate(self):
+        wheel = WheelTimer(bucket_size=5)
+
+        obj = object()
+        wheel.insert(100, obj, 150)
+        wheel.insert(101, obj, 151)
+        wheel.insert(102, obj, 170)
+
+        self.assertEqual(len(wheel), 2)
+        self.assertListEqual(wheel.fetch(160), [obj])
+        self.assertListEqual(wheel.fetch(180), [obj])
+        self.assertListEqual(wheel.fetch(200), [])